@@ -1,44 +1,364 @@
-import pandas as pd
-import matplotlib.pyplot as plt
-import seaborn as sns
-from typing import Dict, Any
+import csv
+import hashlib
+import json
+import os
+import sys
+from concurrent.futures import ProcessPoolExecutor
+from typing import TYPE_CHECKING, Dict, Any, List, Callable, Union, Tuple, Iterator
 import numpy as np
+from xeet_columnar import read_stats_table
+from xeet_join_index import CrossTournamentIndex
+from xeet_snapshot_store import SnapshotStore
+from xeet_stats import LeaderboardStats, STATS_COLUMNS
+from xeet_online_stats import StreamingLeaderboardStats
+from xeet_metrics import Metrics, JsonLinesSink
+
+if TYPE_CHECKING:
+    import pandas as pd
+
+# pandas, matplotlib и seaborn импортируются внутри функций, которым они нужны:
+# текстовому отчету (--text-only) хватает NumPy и готовых сводных показателей
+
+# Меняется при изменении кода графиков, чтобы кэш не отдавал устаревшие картинки
+FIGURE_CACHE_VERSION = 2
+
+def format_table(columns: Dict[str, Any], index: List[str] = None) -> str:
+    """
+    Таблица колонок как DataFrame.to_string(index=False): значения выровнены вправо,
+    у float общее число знаков после запятой. С index - подписи строк слева, как to_string().
+    """
+    cells = {}
+    for name, values in columns.items():
+        values = np.asarray(values)
+        if values.dtype.kind == 'f':
+            # Как pandas: 6 знаков, затем общие нули в конце отбрасываются (минимум один знак)
+            finite = ~np.isnan(values)
+            texts = [f'{value:.6f}' for value in values[finite]]
+            while texts and all(text.endswith('0') and not text.endswith('.0') for text in texts):
+                texts = [text[:-1] for text in texts]
+            column = np.full(len(values), 'NaN', dtype=object)
+            column[finite] = texts
+            if index is not None:
+                # С подписями строк pandas оставляет место под знак и у значений float
+                column = [text if text.startswith('-') else ' ' + text for text in column]
+            cells[name] = [' ' + name] + list(column)
+        elif values.dtype.kind in 'iu':
+            # Неотрицательным целым pandas оставляет место под знак
+            sign = ' ' if (values >= 0).all() else ''
+            cells[name] = [sign + name] + [sign + str(value) for value in values]
+        else:
+            cells[name] = [name] + [str(value) for value in values]
+    
+    widths = [max(len(text) for text in texts) for texts in cells.values()]
+    lines = [' '.join(text.rjust(width) for text, width in zip(row, widths)) for row in zip(*cells.values())]
+    if index is not None:
+        labels = [''] + [str(label) for label in index]
+        label_width = max(len(label) for label in labels)
+        lines = [label.ljust(label_width) + ' ' + line for label, line in zip(labels, lines)]
+    return '\n'.join(lines)
+
+def read_csv_columns(path: str, columns: List[str] = None) -> Dict[str, np.ndarray]:
+    """
+    Колонки CSV как NumPy массивы без pandas, с теми же типами, что у read_csv:
+    целые - int64, дробные или с пропусками - float64 (пропуск = NaN), username и
+    прочий текст - строки.
+    """
+    with open(path, 'r', newline='', encoding='utf-8') as f:
+        reader = csv.reader(f)
+        header = next(reader)
+        names = columns or header
+        positions = [header.index(name) for name in names]
+        data = list(zip(*reader)) or [()] * len(header)
+    
+    result = {}
+    for name, position in zip(names, positions):
+        texts = data[position]
+        if name != 'username':
+            try:
+                result[name] = np.fromiter(map(int, texts), dtype=np.int64, count=len(texts))
+                continue
+            except ValueError:
+                pass
+            try:
+                result[name] = np.fromiter((float(text) if text else np.nan for text in texts),
+                                           dtype=np.float64, count=len(texts))
+                continue
+            except ValueError:
+                pass
+        result[name] = np.array(texts, dtype=object)
+    return result
+
+def plot_correlation_heatmap(correlation: np.ndarray, columns: List[str], filename: str):
+    """Тепловая карта корреляций"""
+    import matplotlib.pyplot as plt
+    import seaborn as sns
+    
+    plt.figure(figsize=(10, 8))
+    sns.heatmap(correlation, xticklabels=columns, yticklabels=columns, annot=True, cmap='coolwarm',
+               center=0, square=True, fmt='.3f')
+    plt.title('Корреляционная матрица метрик крипто-инфлюенсеров')
+    plt.tight_layout()
+    plt.savefig(filename, dpi=300, bbox_inches='tight')
+
+def _plot_histogram(axis, histogram: Tuple[np.ndarray, np.ndarray], **kwargs):
+    """Рисует готовую гистограмму (counts, edges) так же, как axis.hist по исходным значениям"""
+    counts, edges = histogram
+    axis.hist(edges[:-1], bins=edges, weights=counts, **kwargs)
+
+def plot_distributions(histograms: Dict[str, Tuple[np.ndarray, np.ndarray]], filename: str):
+    """Гистограммы подписчиков, баллов, signal score и noise points (см. LeaderboardStats.histograms)"""
+    import matplotlib.pyplot as plt
+    
+    fig, axes = plt.subplots(2, 2, figsize=(15, 12))
+    
+    # Распределение подписчиков (логарифмическая шкала)
+    _plot_histogram(axes[0, 0], histograms['followerCount'], alpha=0.7, color='skyblue')
+    axes[0, 0].set_xlabel('log10(Количество подписчиков + 1)')
+    axes[0, 0].set_ylabel('Частота')
+    axes[0, 0].set_title('Распределение количества подписчиков')
+    axes[0, 0].grid(True, alpha=0.3)
+    
+    # Распределение баллов
+    _plot_histogram(axes[0, 1], histograms['score'], alpha=0.7, color='lightgreen')
+    axes[0, 1].set_xlabel('Балл')
+    axes[0, 1].set_ylabel('Частота')
+    axes[0, 1].set_title('Распределение баллов')
+    axes[0, 1].grid(True, alpha=0.3)
+    
+    # Распределение signal score
+    _plot_histogram(axes[1, 0], histograms['signalScore'], alpha=0.7, color='salmon')
+    axes[1, 0].set_xlabel('Signal Score')
+    axes[1, 0].set_ylabel('Частота')
+    axes[1, 0].set_title('Распределение Signal Score')
+    axes[1, 0].grid(True, alpha=0.3)
+    
+    # Распределение noise points
+    _plot_histogram(axes[1, 1], histograms['noisePoints'], alpha=0.7, color='gold')
+    axes[1, 1].set_xlabel('Noise Points')
+    axes[1, 1].set_ylabel('Частота')
+    axes[1, 1].set_title('Распределение Noise Points')
+    axes[1, 1].grid(True, alpha=0.3)
+    
+    plt.tight_layout()
+    plt.savefig(filename, dpi=300, bbox_inches='tight')
+
+def plot_top_performers(usernames: List[str], scores: np.ndarray, filename: str):
+    """Горизонтальная диаграмма топ-N по баллу"""
+    import matplotlib.pyplot as plt
+    
+    plt.figure(figsize=(14, 8))
+    bars = plt.barh(range(len(scores)), scores, color='steelblue', alpha=0.7)
+    plt.yticks(range(len(scores)), usernames)
+    plt.xlabel('Общий балл')
+    plt.title('Топ-20 крипто-инфлюенсеров по баллу')
+    plt.gca().invert_yaxis()
+    
+    # Добавляем значения на бары
+    for i, bar in enumerate(bars):
+        width = bar.get_width()
+        plt.text(width + 1, bar.get_y() + bar.get_height()/2, 
+                f'{width:.1f}', ha='left', va='center', fontsize=9)
+    
+    plt.tight_layout()
+    plt.savefig(filename, dpi=300, bbox_inches='tight')
+
+def figure_hash(plot_func: Callable, filename: str, args: tuple) -> str:
+    """Хэш содержимого входных данных и параметров графика"""
+    digest = hashlib.sha256(f"{FIGURE_CACHE_VERSION}:{plot_func.__name__}:{filename}".encode('utf-8'))
+    # DataFrame мог прийти, только если pandas уже импортирован
+    pd = sys.modules.get('pandas')
+    for value in args:
+        if pd is not None and isinstance(value, (pd.DataFrame, pd.Series)):
+            labels = value.columns if isinstance(value, pd.DataFrame) else [value.name]
+            digest.update(repr(list(labels)).encode('utf-8'))
+            digest.update(pd.util.hash_pandas_object(value, index=True).values.tobytes())
+        elif isinstance(value, np.ndarray):
+            digest.update(f"{value.dtype}{value.shape}".encode('utf-8'))
+            digest.update(np.ascontiguousarray(value).tobytes())
+        elif isinstance(value, dict):
+            digest.update(figure_hash(plot_func, filename, tuple(value.items())).encode('utf-8'))
+        elif isinstance(value, tuple):
+            digest.update(figure_hash(plot_func, filename, value).encode('utf-8'))
+        else:
+            digest.update(repr(value).encode('utf-8'))
+    return digest.hexdigest()
+
+def _init_headless_worker():
+    """Agg вместо GUI и заранее загруженный pyplot (в воркерах и перед их запуском)"""
+    import importlib
+    import matplotlib
+    
+    matplotlib.use('Agg')
+    importlib.import_module('matplotlib.pyplot')
+
+def _render_figure(plot_func: Callable, args: tuple, filename: str) -> str:
+    """Рисует график в процессе-воркере без GUI"""
+    import matplotlib.pyplot as plt
+    
+    plot_func(*args, filename)
+    plt.close('all')
+    return filename
 
 class XeetDataAnalyzer:
-    def __init__(self, csv_file: str = "xeet_crypto_creators_stats.csv"):
-        self.csv_file = csv_file
+    def __init__(self, csv_file: Union[str, Dict[str, str]] = "xeet_crypto_creators_stats.csv",
+                 history_file: str = "xeet_history.sqlite",
+                 avatars_files: Dict[str, str] = None, metrics: Metrics = None,
+                 streaming: bool = False, chunk_size: int = 100000, text_only: bool = False):
+        """
+        csv_file: путь к CSV файлу или к Arrow файлу (.arrow) со статистикой,
+                  либо словарь турнир -> файл для сравнения нескольких турниров
+                  (отчет по одному турниру строится по первому источнику)
+        history_file: SQLite история снимков (см. xeet_snapshot_store.py)
+        avatars_files: турнир -> avatars CSV; по умолчанию xeet_<турнир>_avatars.csv рядом со статистикой
+        metrics: время загрузки, каждого раздела отчета и отрисовки графиков (см. xeet_metrics.py)
+        streaming: не загружать таблицу целиком, а считать отчет по порциям по chunk_size строк
+                   (см. xeet_online_stats.py); квартили в этом режиме приближенные
+        text_only: только текстовый отчет, без графиков; CSV читается в NumPy массивы
+                   (read_csv_columns), так что pandas и matplotlib не импортируются
+
+        """
+        if isinstance(csv_file, dict):
+            self.sources = dict(csv_file)
+        else:
+            self.sources = {self.source_name(csv_file): csv_file}
+        self.csv_file = next(iter(self.sources.values()))
+        self.avatars_files = avatars_files or {}
+        self._cross_index = None
+        self.history_file = history_file
         self.df = None
+        self.table = None
+        self.arrays = None
+        self._history = None
+        self._stats = None
+        # Неинтерактивный режим: графики без plt.show(), с кэшем и параллельной отрисовкой
+        self.headless = False
+        self.figure_cache_file = '.xeet_figure_cache.json'
+        self._pending_figures = []
+        self.metrics = metrics or Metrics()
+        self.streaming = streaming
+        self.chunk_size = chunk_size
+        self.text_only = text_only
         self.load_data()
     
     def load_data(self):
-        """Загружает данные из CSV файла"""
+        """Загружает данные из CSV файла или открывает Arrow файл через memory map"""
+        self._stats = None
         try:
-            self.df = pd.read_csv(self.csv_file)
-            print(f"Данные успешно загружены: {len(self.df)} записей")
-            print(f"Колонки: {list(self.df.columns)}")
+            with self.metrics.phase('load', source=self.csv_file):
+                if self.streaming:
+                    # Таблица не загружается: сводные показатели считаются по порциям
+                    self._stats = StreamingLeaderboardStats(
+                        lambda: self.iter_stats_chunks(self.csv_file, self.chunk_size))
+                    print(f"Данные обработаны потоково: {self._stats.total} записей "
+                          f"(порциями по {self.chunk_size} строк)")
+                elif self.csv_file.endswith('.arrow'):
+                    # Колонки не читаются целиком: каждый анализ берет только нужные
+                    self.table = read_stats_table(self.csv_file)
+                    print(f"Данные успешно загружены: {self.table.num_rows} записей")
+                    print(f"Колонки: {self.table.column_names}")
+                elif self.text_only:
+                    # Текстовому отчету DataFrame не нужен: хватает NumPy колонок
+                    self.arrays = read_csv_columns(self.csv_file)
+                    print(f"Данные успешно загружены: {len(self.arrays['rank'])} записей")
+                    print(f"Колонки: {list(self.arrays)}")
+                else:
+                    import pandas as pd
+                    
+                    self.df = pd.read_csv(self.csv_file)
+                    print(f"Данные успешно загружены: {len(self.df)} записей")
+                    print(f"Колонки: {list(self.df.columns)}")
         except Exception as e:
             print(f"Ошибка при загрузке данных: {e}")
     
+    @staticmethod
+    def source_name(path: str) -> str:
+        """Имя турнира по имени файла: xeet_signals_stats.csv -> signals"""
+        name = os.path.splitext(os.path.basename(path))[0]
+        if name.startswith('xeet_'):
+            name = name[len('xeet_'):]
+        if name.endswith('_stats'):
+            name = name[:-len('_stats')]
+        return name
+    
+    def has_data(self) -> bool:
+        """Загружены ли данные (или посчитаны потоково)"""
+        return (self.df is not None or self.table is not None or self.arrays is not None
+                or (self.streaming and self._stats is not None))
+    
+    def frame(self, columns: List[str]) -> 'pd.DataFrame':
+        """Возвращает DataFrame только с нужными колонками"""
+        if self.table is not None:
+            return self.table.select(columns).to_pandas()
+        if self.arrays is not None:
+            import pandas as pd
+            
+            return pd.DataFrame({name: self.arrays[name] for name in columns})
+        return self.df[columns]
+    
+    def column(self, name: str) -> np.ndarray:
+        """Колонка как NumPy массив (без копирования, где это возможно)"""
+        if self.table is not None:
+            return self.table.column(name).to_numpy()
+        if self.arrays is not None:
+            return self.arrays[name]
+        return self.df[name].to_numpy()
+    
+    @staticmethod
+    def iter_stats_chunks(path: str, chunk_size: int) -> Iterator[Dict[str, np.ndarray]]:
+        """Колонки статистики порциями по chunk_size строк из CSV или Arrow файла"""
+        if path.endswith('.arrow'):
+            table = read_stats_table(path, STATS_COLUMNS)
+            for batch in table.to_batches(max_chunksize=chunk_size):
+                yield {name: batch.column(name).to_numpy(zero_copy_only=False) for name in STATS_COLUMNS}
+            return
+        import pandas as pd
+        
+        for chunk in pd.read_csv(path, usecols=STATS_COLUMNS, chunksize=chunk_size):
+            yield {name: chunk[name].to_numpy() for name in STATS_COLUMNS}
+    
+    @property
+    def stats(self) -> LeaderboardStats:
+        """Сводные показатели, считаются один раз за один проход по колонкам"""
+        if self._stats is None:
+            self._stats = LeaderboardStats({name: self.column(name) for name in STATS_COLUMNS})
+        return self._stats
+    
     def basic_statistics(self) -> Dict[str, Any]:
-        """Выводит базовую статистику по данным"""
-        if self.df is None:
+        """
+        Выводит базовую статистику по данным. Топы возвращаются как DataFrame,
+        сводки score_stats / follower_stats - как Series.
+        """
+        stats = self.basic_statistics_summary()
+        if not stats:
+            return stats
+        
+        import pandas as pd
+        
+        stats['top_10_by_followers'] = pd.DataFrame(stats['top_10_by_followers'])
+        stats['top_10_by_score'] = pd.DataFrame(stats['top_10_by_score'])
+        stats['score_stats'] = pd.Series(stats['score_stats'], name='score')
+        stats['follower_stats'] = pd.Series(stats['follower_stats'], name='followerCount')
+        return stats
+    
+    def basic_statistics_summary(self) -> Dict[str, Any]:
+        """
+        То же, что basic_statistics, без pandas (для --text-only): топы - словари
+        колонок NumPy, сводки - словари describe().
+        """
+        if not self.has_data():
             return {}
         
-        # Округляем числовые поля до 2 знаков после запятой
-        self.df['score'] = self.df['score'].round(2)
-        self.df['signalScore'] = self.df['signalScore'].round(2)
-        self.df['noisePoints'] = self.df['noisePoints'].round(2)
-        
+        engine = self.stats
         stats = {
-            'total_creators': len(self.df),
-            'top_10_by_followers': self.df.nlargest(10, 'followerCount')[['rank', 'username', 'followerCount']],
-            'top_10_by_score': self.df.nlargest(10, 'score')[['rank', 'username', 'score']],
-            'avg_followers': self.df['followerCount'].mean(),
-            'median_followers': self.df['followerCount'].median(),
-            'avg_score': self.df['score'].mean(),
-            'median_score': self.df['score'].median(),
-            'score_stats': self.df['score'].describe(),
-            'follower_stats': self.df['followerCount'].describe()
+            'total_creators': engine.total,
+            'top_10_by_followers': engine.rows(engine.top_by_followers[:10], ['rank', 'username', 'followerCount']),
+            'top_10_by_score': engine.rows(engine.top_by_score[:10], ['rank', 'username', 'score']),
+            'avg_followers': engine.summary['followerCount']['mean'],
+            'median_followers': engine.summary['followerCount']['50%'],
+            'avg_score': engine.summary['score']['mean'],
+            'median_score': engine.summary['score']['50%'],
+            'score_stats': engine.summary['score'],
+            'follower_stats': engine.summary['followerCount']
         }
         
         print("\n" + "="*50)
@@ -51,165 +371,313 @@ class XeetDataAnalyzer:
         print(f"Медианный балл: {stats['median_score']:.2f}")
         
         print("\nТОП-10 ПО КОЛИЧЕСТВУ ПОДПИСЧИКОВ:")
-        print(stats['top_10_by_followers'].to_string(index=False))
+        print(format_table(stats['top_10_by_followers']))
         
         print("\nТОП-10 ПО БАЛЛУ:")
-        print(stats['top_10_by_score'].to_string(index=False))
+        print(format_table(stats['top_10_by_score']))
         
         return stats
     
     def correlation_analysis(self):
         """Анализирует корреляции между различными метриками"""
-        if self.df is None:
+        if not self.has_data():
             return
         
-        # Вычисляем корреляции
-        numeric_cols = ['followerCount', 'score', 'signalScore', 'noisePoints', 
-                       'totalEngagement', 'engagementRate', 'averageEngagementPerPost']
-        
-        correlation_matrix = self.df[numeric_cols].corr()
+        engine = self.stats
+        columns = engine.correlation_columns
         
         print("\n" + "="*50)
         print("КОРРЕЛЯЦИОННЫЙ АНАЛИЗ")
         print("="*50)
-        print(correlation_matrix.round(3))
+        print(format_table(dict(zip(columns, np.round(engine.correlation, 3).T)), index=columns))
         
         # Визуализация корреляций
-        plt.figure(figsize=(10, 8))
-        sns.heatmap(correlation_matrix, annot=True, cmap='coolwarm', center=0, 
-                   square=True, fmt='.3f')
-        plt.title('Корреляционная матрица метрик крипто-инфлюенсеров')
-        plt.tight_layout()
-        plt.savefig('correlation_heatmap.png', dpi=300, bbox_inches='tight')
-        plt.show()
+        self.render_figure(plot_correlation_heatmap, 'correlation_heatmap.png', engine.correlation, columns)
     
     def distribution_analysis(self):
         """Анализирует распределения основных метрик"""
-        if self.df is None:
+        if not self.has_data():
             return
         
-        fig, axes = plt.subplots(2, 2, figsize=(15, 12))
-        
-        # Распределение подписчиков (логарифмическая шкала)
-        axes[0, 0].hist(np.log10(self.df['followerCount'] + 1), bins=50, alpha=0.7, color='skyblue')
-        axes[0, 0].set_xlabel('log10(Количество подписчиков + 1)')
-        axes[0, 0].set_ylabel('Частота')
-        axes[0, 0].set_title('Распределение количества подписчиков')
-        axes[0, 0].grid(True, alpha=0.3)
-        
-        # Распределение баллов
-        axes[0, 1].hist(self.df['score'], bins=50, alpha=0.7, color='lightgreen')
-        axes[0, 1].set_xlabel('Балл')
-        axes[0, 1].set_ylabel('Частота')
-        axes[0, 1].set_title('Распределение баллов')
-        axes[0, 1].grid(True, alpha=0.3)
-        
-        # Распределение signal score
-        axes[1, 0].hist(self.df['signalScore'], bins=50, alpha=0.7, color='salmon')
-        axes[1, 0].set_xlabel('Signal Score')
-        axes[1, 0].set_ylabel('Частота')
-        axes[1, 0].set_title('Распределение Signal Score')
-        axes[1, 0].grid(True, alpha=0.3)
-        
-        # Распределение noise points
-        axes[1, 1].hist(self.df['noisePoints'], bins=50, alpha=0.7, color='gold')
-        axes[1, 1].set_xlabel('Noise Points')
-        axes[1, 1].set_ylabel('Частота')
-        axes[1, 1].set_title('Распределение Noise Points')
-        axes[1, 1].grid(True, alpha=0.3)
-        
-        plt.tight_layout()
-        plt.savefig('distributions.png', dpi=300, bbox_inches='tight')
-        plt.show()
+        self.render_figure(plot_distributions, 'distributions.png', self.stats.histograms)
     
     def top_performers_analysis(self):
         """Анализирует топ-перформеров"""
-        if self.df is None:
+        if not self.has_data():
             return
         
-        # Топ-20 по баллу (уже округлено в basic_statistics)
-        top_20 = self.df.nlargest(20, 'score')
+        # Топ-20 по баллу уже посчитан в LeaderboardStats
+        engine = self.stats
+        top_20 = engine.rows(engine.top_by_score[:20], ['rank', 'username', 'followerCount',
+                                                        'score', 'signalScore', 'noisePoints'])
         
         print("\n" + "="*50)
         print("АНАЛИЗ ТОП-20 ПЕРФОРМЕРОВ")
         print("="*50)
         
         print("\nТоп-20 по общему баллу:")
-        for idx, row in top_20.iterrows():
-            print(f"{row['rank']:2d}. {row['username']:<20} | "
-                  f"Подписчики: {row['followerCount']:>8,} | "
-                  f"Балл: {row['score']:>6.2f} | "
-                  f"Signal: {row['signalScore']:>6.2f} | "
-                  f"Noise: {row['noisePoints']:>6.2f}")
+        for rank, username, followers, score, signal, noise in zip(
+                top_20['rank'], top_20['username'], top_20['followerCount'],
+                top_20['score'], top_20['signalScore'], top_20['noisePoints']):
+            print(f"{int(rank):2d}. {username:<20} | "
+                  f"Подписчики: {int(followers):>8,} | "
+                  f"Балл: {score:>6.2f} | "
+                  f"Signal: {signal:>6.2f} | "
+                  f"Noise: {noise:>6.2f}")
         
         # Визуализация топ-20
-        plt.figure(figsize=(14, 8))
-        bars = plt.barh(range(20), top_20['score'], color='steelblue', alpha=0.7)
-        plt.yticks(range(20), top_20['username'])
-        plt.xlabel('Общий балл')
-        plt.title('Топ-20 крипто-инфлюенсеров по баллу')
-        plt.gca().invert_yaxis()
-        
-        # Добавляем значения на бары
-        for i, bar in enumerate(bars):
-            width = bar.get_width()
-            plt.text(width + 1, bar.get_y() + bar.get_height()/2, 
-                    f'{width:.1f}', ha='left', va='center', fontsize=9)
-        
-        plt.tight_layout()
-        plt.savefig('top_20_performers.png', dpi=300, bbox_inches='tight')
-        plt.show()
+        self.render_figure(plot_top_performers, 'top_20_performers.png',
+                           top_20['username'].tolist(), top_20['score'])
     
     def engagement_analysis(self):
         """Анализирует метрики вовлеченности"""
-        if self.df is None:
+        if not self.has_data():
             return
         
         # Проверяем, есть ли данные о вовлеченности
-        engagement_data = self.df[
-            (self.df['totalEngagement'] > 0) | 
-            (self.df['engagementRate'] > 0) | 
-            (self.df['averageEngagementPerPost'] > 0)
-        ]
-        
-        if len(engagement_data) == 0:
+        engine = self.stats
+        if engine.engagement_count == 0:
             print("\n" + "="*50)
             print("АНАЛИЗ ВОВЛЕЧЕННОСТИ")
             print("="*50)
             print("Данные о вовлеченности отсутствуют (все значения равны 0)")
             return
         
-        print(f"\nНайдено {len(engagement_data)} записей с данными о вовлеченности")
+        print(f"\nНайдено {engine.engagement_count} записей с данными о вовлеченности")
         
         # Статистика по вовлеченности
         print("\nСтатистика по вовлеченности:")
-        print(f"Средняя общая вовлеченность: {engagement_data['totalEngagement'].mean():.2f}")
-        print(f"Средний уровень вовлеченности: {engagement_data['engagementRate'].mean():.2f}")
-        print(f"Средняя вовлеченность на пост: {engagement_data['averageEngagementPerPost'].mean():.2f}")
+        print(f"Средняя общая вовлеченность: {engine.engagement_means['totalEngagement']:.2f}")
+        print(f"Средний уровень вовлеченности: {engine.engagement_means['engagementRate']:.2f}")
+        print(f"Средняя вовлеченность на пост: {engine.engagement_means['averageEngagementPerPost']:.2f}")
+    
+    @staticmethod
+    def load_source_columns(path: str, columns: List[str]) -> Tuple[List[str], np.ndarray, Dict[str, np.ndarray]]:
+        """
+        Читает username в словарном виде (уникальные значения + индексы строк)
+        и нужные числовые колонки из CSV или Arrow файла.
+        """
+        if path.endswith('.arrow'):
+            table = read_stats_table(path, ['username'] + columns)
+            usernames = table.column('username').combine_chunks()
+            values = {}
+            for name in columns:
+                column = table.column(name).to_numpy()
+                if column.dtype == np.float32:
+                    # Как в LeaderboardStats: баллы из Arrow печатаются так же, как из CSV
+                    column = np.round(column.astype(np.float64), 2)
+                values[name] = column
+            return usernames.dictionary.to_pylist(), usernames.indices.to_numpy(), values
+        
+        # Словарь username в порядке первого появления, как pd.factorize
+        values = read_csv_columns(path, ['username'] + columns)
+        codes = {}
+        indices = np.fromiter((codes.setdefault(username, len(codes)) for username in values.pop('username')),
+                              dtype=np.int64)
+        return list(codes), indices, values
     
-    def generate_report(self):
-        """Генерирует полный отчет по анализу"""
+    @property
+    def cross_index(self) -> CrossTournamentIndex:
+        """Общий индекс по username для всех источников, строится при первом обращении"""
+        if self._cross_index is None:
+            index = CrossTournamentIndex()
+            for name, path in self.sources.items():
+                dictionary, indices, columns = self.load_source_columns(path, ['rank', 'followerCount', 'score'])
+                index.add_tournament(name, dictionary, indices, columns)
+                
+                avatars_file = self.avatars_files.get(name, f'xeet_{name}_avatars.csv')
+                if os.path.exists(avatars_file):
+                    with open(avatars_file, 'r', newline='', encoding='utf-8') as f:
+                        avatars = list(csv.DictReader(f))
+                    index.add_profiles([row['username'] for row in avatars], [row['avatar'] for row in avatars],
+                                       [row['name'] for row in avatars])
+            self._cross_index = index
+        return self._cross_index
+    
+    def creator_ranks(self, username: str) -> Dict[str, Any]:
+        """Ранг автора во всех источниках (None, если его там нет)"""
+        return self.cross_index.ranks(username)
+    
+    def compare_tournaments(self, first: str = None, second: str = None) -> 'pd.DataFrame':
+        """
+        Авторы из обоих турниров: ранги, баллы и отношение баллов first / second.
+        По умолчанию сравниваются первые два источника.
+        """
+        import pandas as pd
+        
+        first, second = self._tournament_pair(first, second)
+        return pd.DataFrame(self.cross_index.compare(first, second))
+    
+    def only_in(self, first: str = None, second: str = None) -> List[str]:
+        """Авторы, которые есть в first, но отсутствуют в second"""
+        first, second = self._tournament_pair(first, second)
+        return self.cross_index.only_in(first, second)
+    
+    def _tournament_pair(self, first: str, second: str) -> Tuple[str, str]:
+        names = list(self.sources)
+        if (first is None or second is None) and len(names) < 2:
+            raise ValueError("Для сравнения нужно минимум два источника")
+        return first or names[0], second or names[1]
+    
+    def cross_tournament_analysis(self, limit: int = 10):
+        """Сравнивает первые два источника: пересечение, уникальные авторы, отношения баллов"""
+        if len(self.sources) < 2:
+            return
+        
+        first, second = self._tournament_pair(None, None)
+        comparison = self.cross_index.compare(first, second)
+        only_first = self.only_in(first, second)
+        only_second = self.only_in(second, first)
+        
+        print("\n" + "="*50)
+        print(f"СРАВНЕНИЕ ТУРНИРОВ: {first} / {second}")
+        print("="*50)
+        print(f"Авторов в обоих турнирах: {len(comparison['username'])}")
+        print(f"Только в {first}: {len(only_first)}")
+        print(f"Только в {second}: {len(only_second)}")
+        
+        if len(comparison['username']):
+            head = {name: values[:limit] for name, values in comparison.items()}
+            head['score_ratio'] = np.round(head['score_ratio'], 3)
+            print(f"\nТоп-{limit} {first} и их места в {second}:")
+            print(format_table(head))
+    
+    def render_figure(self, plot_func: Callable, filename: str, *args):
+        """
+        В интерактивном режиме рисует и показывает график сразу.
+        В headless режиме пропускает график, если его входные данные не изменились
+        с прошлой отрисовки, иначе откладывает отрисовку до render_pending_figures.
+        """
+        if self.text_only:
+            return
+        if not self.headless:
+            import matplotlib.pyplot as plt
+            
+            plot_func(*args, filename)
+            plt.show()
+            return
+        
+        key = figure_hash(plot_func, filename, args)
+        if self._load_figure_cache().get(filename) == key and os.path.exists(filename):
+            print(f"График {filename} не изменился, пропускаем отрисовку")
+            self.metrics.inc('xeet_figures_total', result='skipped')
+            return
+        self._pending_figures.append((plot_func, args, filename, key))
+    
+    def _load_figure_cache(self) -> Dict[str, str]:
+        try:
+            with open(self.figure_cache_file, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+    
+    def render_pending_figures(self, jobs: int = None):
+        """Параллельно рисует отложенные графики в процессах-воркерах и обновляет кэш"""
+        if not self._pending_figures:
+            return
+        
+        pending, self._pending_figures = self._pending_figures, []
+        cache = self._load_figure_cache()
+        workers = min(len(pending), jobs or os.cpu_count() or 1)
+        # Agg и pyplot загружаются до запуска воркеров, чтобы они получили их готовыми
+        _init_headless_worker()
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_headless_worker) as executor:
+            futures = {executor.submit(_render_figure, plot_func, args, filename): (filename, key)
+                       for plot_func, args, filename, key in pending}
+            for future, (filename, key) in futures.items():
+                try:
+                    future.result()
+                    cache[filename] = key
+                    self.metrics.inc('xeet_figures_total', result='rendered')
+                    print(f"График сохранен: {filename}")
+                except Exception as e:
+                    self.metrics.inc('xeet_figures_total', result='failed')
+                    print(f"Ошибка при отрисовке {filename}: {e}")
+        
+        with open(self.figure_cache_file, 'w', encoding='utf-8') as f:
+            json.dump(cache, f, indent=2)
+    
+    @property
+    def history(self) -> SnapshotStore:
+        """История снимков, открывается при первом обращении"""
+        if self._history is None:
+            self._history = SnapshotStore(self.history_file)
+        return self._history
+    
+    def creator_trajectory(self, username: str, tournament: str) -> 'pd.DataFrame':
+        """Ранг, балл и подписчики автора во всех снимках турнира"""
+        import pandas as pd
+        
+        return pd.DataFrame(self.history.trajectory(tournament, username))
+    
+    def rank_deltas(self, tournament: str, old: str = None, new: str = None) -> 'pd.DataFrame':
+        """Изменение ранга каждого автора между двумя снимками (по умолчанию - двумя последними)"""
+        import pandas as pd
+        
+        return pd.DataFrame(self.history.rank_deltas(tournament, old, new))
+    
+    def biggest_movers(self, tournament: str, old: str = None, new: str = None,
+                       limit: int = 10, metric: str = 'rank') -> 'pd.DataFrame':
+        """Авторы с наибольшим изменением metric между двумя снимками"""
+        import pandas as pd
+        
+        movers = pd.DataFrame(self.history.biggest_movers(tournament, old, new, limit, metric))
+        
+        print("\n" + "="*50)
+        print(f"НАИБОЛЬШИЕ ИЗМЕНЕНИЯ ({metric})")
+        print("="*50)
+        if movers.empty:
+            print("Нет общих авторов в выбранных снимках")
+        else:
+            print(movers.to_string(index=False))
+        return movers
+    
+    def generate_report(self, headless: bool = False, jobs: int = None):
+        """
+        Генерирует полный отчет по анализу.
+        headless=True - без GUI (для cron): графики рисуются через Agg, неизменившиеся
+        пропускаются, остальные рисуются параллельно в jobs процессах.
+        """
+        self.headless = headless
+        
         print("НАЧАЛО АНАЛИЗА ДАННЫХ XEET.AI")
         print("="*60)
         
+        phase = self.metrics.phase
+        
         # Базовая статистика
-        stats = self.basic_statistics()
+        with phase('basic_statistics'):
+            self.basic_statistics_summary()
         
         # Корреляционный анализ
-        self.correlation_analysis()
+        with phase('correlation'):
+            self.correlation_analysis()
         
         # Анализ распределений
-        self.distribution_analysis()
+        with phase('distributions'):
+            self.distribution_analysis()
         
         # Анализ топ-перформеров
-        self.top_performers_analysis()
+        with phase('top_performers'):
+            self.top_performers_analysis()
         
         # Анализ вовлеченности
-        self.engagement_analysis()
+        with phase('engagement'):
+            self.engagement_analysis()
+        
+        # Сравнение турниров, если источников несколько
+        with phase('cross_tournament'):
+            self.cross_tournament_analysis()
+        
+        # Отложенные графики headless режима
+        with phase('render'):
+            self.render_pending_figures(jobs)
         
         print("\n" + "="*60)
         print("АНАЛИЗ ЗАВЕРШЕН")
         print("="*60)
+        if self.text_only:
+            return
         print("Созданные файлы:")
         print("- correlation_heatmap.png")
         print("- distributions.png") 
@@ -217,8 +685,40 @@ class XeetDataAnalyzer:
 
 def main():
     """Точка входа для анализа данных"""
-    analyzer = XeetDataAnalyzer()
-    analyzer.generate_report()
+    import argparse
+    
+    arg_parser = argparse.ArgumentParser(description="Analyze Xeet.ai leaderboard data")
+    arg_parser.add_argument("data_files", nargs="*", default=["xeet_crypto_creators_stats.csv"],
+                            help="stats CSV or Arrow files, optionally as name=path; several files "
+                                 "add a cross-tournament comparison (default: xeet_crypto_creators_stats.csv)")
+    arg_parser.add_argument("--headless", action="store_true",
+                            help="no GUI: skip unchanged figures and render the rest in parallel")
+    arg_parser.add_argument("--jobs", type=int, default=None,
+                            help="worker processes for headless rendering (default: CPU count)")
+    arg_parser.add_argument("--metrics-file", default=None,
+                            help="append load/section/render timings to this JSON lines file")
+    arg_parser.add_argument("--stream", action="store_true",
+                            help="out-of-core mode: read the file in chunks with bounded memory "
+                                 "(quartiles become approximate)")
+    arg_parser.add_argument("--chunk-size", type=int, default=100000,
+                            help="rows per chunk in --stream mode (default: 100000)")
+    arg_parser.add_argument("--text-only", action="store_true",
+                            help="print the text report only: no figures, no pandas/matplotlib imports "
+                                 "(CSV is read with the csv module into NumPy arrays)")
+    args = arg_parser.parse_args()
+    
+    sources = {}
+    for source in args.data_files:
+        name, _, path = source.rpartition('=')
+        sources[name or XeetDataAnalyzer.source_name(path)] = path
+    
+    metrics = Metrics([JsonLinesSink(args.metrics_file)] if args.metrics_file else [])
+    analyzer = XeetDataAnalyzer(sources, metrics=metrics, streaming=args.stream, chunk_size=args.chunk_size,
+                                text_only=args.text_only)
+    try:
+        analyzer.generate_report(headless=args.headless, jobs=args.jobs)
+    finally:
+        metrics.close()
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,75 @@
+import csv
+import json
+
+import pytest
+
+from xeet_leaderboard_parser import XeetLeaderboardParser
+from xeet_stub_server import StubLeaderboardServer, make_fake_item
+
+
+def make_parser(url, **kwargs):
+    """Парсер signals с файлами в текущей папке, без истории, профилей и задержек"""
+    return XeetLeaderboardParser("signals", base_url=url, rate=1000, incremental=True,
+                                 history=False, profiles=False, http_cache=False, quiet=True, **kwargs)
+
+
+def read_ranks(path):
+    with open(path, 'r', newline='', encoding='utf-8') as f:
+        return [int(row['rank']) for row in csv.DictReader(f)]
+
+
+@pytest.mark.parametrize("include_pagination", [False, True])
+def test_incremental_truncates_shrunk_board(tmp_path, monkeypatch, include_pagination):
+    """Лидерборд сократился, а первые страницы не изменились: хвост снимка должен быть удален"""
+    monkeypatch.chdir(tmp_path)
+    with StubLeaderboardServer(total_records=3000, include_pagination=include_pagination) as server:
+        make_parser(server.url).run()
+        assert read_ranks("xeet_signals_stats.csv") == list(range(1, 3001))
+
+        server.total_records = 2500
+        server.last_updated = "2025-08-29T00:00:00.000Z"
+        make_parser(server.url).run()
+
+    assert read_ranks("xeet_signals_stats.csv") == list(range(1, 2501))
+    with open("xeet_signals_avatars.csv", 'r', newline='', encoding='utf-8') as f:
+        assert len(list(csv.DictReader(f))) == 2500
+    with open("xeet_signals_metadata.json", 'r', encoding='utf-8') as f:
+        metadata = json.load(f)
+    assert metadata['totalRecords'] == 2500
+    assert metadata['lastUpdated'] == "2025-08-29T00:00:00.000Z"
+
+
+class ShuffledLeaderboardServer(StubLeaderboardServer):
+    """Стаб, у которого авторы первых shuffled позиций сдвинуты на shift рангов"""
+
+    shuffled = 0
+    shift = 0
+
+    def make_item(self, rank):
+        item = make_fake_item(rank, self.last_updated)
+        if rank <= self.shuffled:
+            moved = (rank - 1 + self.shift) % self.shuffled + 1
+            item['user'] = make_fake_item(moved, self.last_updated)['user']
+        return item
+
+
+def test_incremental_keeps_files_when_pages_fail(tmp_path, monkeypatch):
+    """Страница так и не получена: старые CSV и метаданные не меняются, смешанный снимок не публикуется"""
+    monkeypatch.chdir(tmp_path)
+    with ShuffledLeaderboardServer(total_records=1000, max_limit=20) as server:
+        make_parser(server.url).run()
+        files = {}
+        for name in ("xeet_signals_stats.csv", "xeet_signals_avatars.csv", "xeet_signals_metadata.json"):
+            with open(name, 'rb') as f:
+                files[name] = f.read()
+
+        server.shuffled, server.shift = 150, 20
+        server.failing_pages = {5}
+        server.last_updated = "2025-08-29T00:00:00.000Z"
+        parser = make_parser(server.url, max_retries=0)
+        parser.run()
+
+    assert parser.failed_pages == [5]
+    for name, content in files.items():
+        with open(name, 'rb') as f:
+            assert f.read() == content, name
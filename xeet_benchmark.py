@@ -0,0 +1,375 @@
+import contextlib
+import io
+import json
+import multiprocessing
+import os
+import resource
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from typing import List, Dict, Any, Optional
+
+from xeet_stub_server import (StubLeaderboardServer, ReplayLeaderboardServer, load_fixture_items,
+                              make_fake_item, record_fixture)
+
+CASES = ['scrape', 'csv', 'analyzer', 'startup']
+DEFAULT_SIZES = [1000, 10000, 100000, 1000000]
+
+
+def percentile(values: List[float], fraction: float) -> Optional[float]:
+    """Перцентиль по ближайшему рангу (None для пустого списка)"""
+    if not values:
+        return None
+    values = sorted(values)
+    return values[min(len(values) - 1, int(fraction * len(values)))]
+
+
+def resource_usage() -> Dict[str, float]:
+    """CPU (с дочерними процессами) и пиковый RSS текущего процесса в МБ"""
+    own = resource.getrusage(resource.RUSAGE_SELF)
+    children = resource.getrusage(resource.RUSAGE_CHILDREN)
+    # ru_maxrss в килобайтах на Linux и в байтах на macOS
+    scale = 1024 * 1024 if sys.platform == 'darwin' else 1024
+    return {
+        'cpu': own.ru_utime + own.ru_stime + children.ru_utime + children.ru_stime,
+        'peak_rss_mb': max(own.ru_maxrss, children.ru_maxrss) / scale,
+    }
+
+
+def synthetic_blocks(parser, rows: int, block_size: int = 100):
+    """
+    Блоки (stats, avatars) как у парсера. Один шаблонный блок переиспользуется,
+    чтобы генерация данных не влияла на измерения записи.
+    """
+    template = parser._extract_page({'data': [make_fake_item(rank, '') for rank in range(1, block_size + 1)]})
+    for start in range(0, rows, block_size):
+        count = min(block_size, rows - start)
+        yield template[0][:count], template[1][:count]
+
+
+def write_synthetic_stats(csv_file: str, rows: int):
+    """Stats CSV из rows строк с уникальными username и разными подписчиками"""
+    from xeet_leaderboard_parser import XeetLeaderboardParser, AtomicCSVWriter
+
+    parser = XeetLeaderboardParser('signals', history=False, profiles=False, http_cache=False)
+    with AtomicCSVWriter(csv_file, parser.STATS_FIELDS) as writer:
+        rank = 0
+        for stats_rows, _ in synthetic_blocks(parser, rows):
+            for row in stats_rows:
+                rank += 1
+                writer.writerow(dict(row, rank=rank, username=f'user{rank}',
+                                     followerCount=row['followerCount'] + rank % 977))
+
+
+def bench_scrape(rows: int, options: Dict[str, Any]) -> Dict[str, Any]:
+    """parse_all_pages против локального сервера из options['url'] (см. run_case)"""
+    from xeet_leaderboard_parser import XeetLeaderboardParser, AdaptiveTokenBucket
+
+    class RecordingTokenBucket(AdaptiveTokenBucket):
+        """Ограничитель без ограничения, который запоминает задержку каждого успешного запроса"""
+
+        def __init__(self, *args, **kwargs):
+            super().__init__(*args, **kwargs)
+            self.latencies: List[float] = []
+            self.throttled = 0
+
+        def on_success(self, latency: float):
+            with self._lock:
+                self.latencies.append(latency)
+
+        def on_throttle(self):
+            with self._lock:
+                self.throttled += 1
+
+    concurrency = options['concurrency']
+    shards = options.get('shards', 1)
+    # Шарды берут токены из одного SharedTokenBucket, скопированного с этого ограничителя
+    # (from_bucket): он адаптивный, поэтому частота зафиксирована на 1e6 на все шарды вместе,
+    # а ни рост задержки, ни 429 не должны ее снижать - меряется сервер, а не ограничитель
+    limiter = RecordingTokenBucket(1e6, capacity=concurrency, min_rate=1e6, max_rate=1e6,
+                                   decrease_factor=1.0, latency_factor=float('inf'))
+    with contextlib.redirect_stdout(io.StringIO()):
+        parser = XeetLeaderboardParser('signals', concurrency=concurrency, base_url=options['url'],
+                                       rate_limiter=limiter, history=False, profiles=False,
+                                       http_cache=False, quiet=True, shards=shards)
+        parser.backoff_base = options['backoff_base']
+        parser.discover_total_pages()
+        limiter.latencies.clear()
+
+        before = resource_usage()
+        started = time.perf_counter()
+        data, _ = parser.parse_all_pages()
+        elapsed = time.perf_counter() - started
+        after = resource_usage()
+
+    if shards > 1:
+        # Задержки шардов известны только по гистограмме метрик (с точностью до корзины)
+        p50 = parser.metrics.quantile('xeet_request_seconds', 0.5)
+        p99 = parser.metrics.quantile('xeet_request_seconds', 0.99)
+        throttled = parser.metrics.counter_total('xeet_retries_total')
+    else:
+        p50 = percentile(limiter.latencies, 0.5)
+        p99 = percentile(limiter.latencies, 0.99)
+        throttled = limiter.throttled
+    return {
+        'rows': len(data),
+        'seconds': elapsed,
+        'pages_per_sec': parser.total_pages / elapsed if elapsed else None,
+        'p50_ms': (p50 or 0) * 1000,
+        'p99_ms': (p99 or 0) * 1000,
+        'throttled': throttled,
+        'failed_pages': len(parser.failed_pages),
+        'cpu': after['cpu'] - before['cpu'],
+        'peak_rss_mb': after['peak_rss_mb'],
+    }
+
+
+def bench_csv(rows: int, options: Dict[str, Any]) -> Dict[str, Any]:
+    """write_csv_files: потоковая запись stats и avatars CSV"""
+    from xeet_leaderboard_parser import XeetLeaderboardParser
+
+    with tempfile.TemporaryDirectory() as workdir:
+        config = {'url': '', 'total_pages': 1,
+                  'csv_file': os.path.join(workdir, 'stats.csv'),
+                  'avatars_file': os.path.join(workdir, 'avatars.csv'),
+                  'metadata_file': os.path.join(workdir, 'metadata.json'),
+                  'journal_file': os.path.join(workdir, 'journal.jsonl')}
+        parser = XeetLeaderboardParser('signals', config=config, history=False, profiles=False, http_cache=False)
+
+        before = resource_usage()
+        started = time.perf_counter()
+        with contextlib.redirect_stdout(io.StringIO()):
+            written = parser.write_csv_files(synthetic_blocks(parser, rows))
+        elapsed = time.perf_counter() - started
+        after = resource_usage()
+
+    return {
+        'rows': written,
+        'seconds': elapsed,
+        'cpu': after['cpu'] - before['cpu'],
+        'peak_rss_mb': after['peak_rss_mb'],
+    }
+
+
+def bench_analyzer(rows: int, options: Dict[str, Any]) -> Dict[str, Any]:
+    """XeetDataAnalyzer: загрузка CSV и полный headless отчет с графиками"""
+    with tempfile.TemporaryDirectory() as workdir:
+        csv_file = os.path.join(workdir, 'stats.csv')
+        write_synthetic_stats(csv_file, rows)
+
+        from analyze_data import XeetDataAnalyzer
+
+        cwd = os.getcwd()
+        os.chdir(workdir)
+        try:
+            before = resource_usage()
+            started = time.perf_counter()
+            with contextlib.redirect_stdout(io.StringIO()):
+                analyzer = XeetDataAnalyzer(csv_file)
+                analyzer.generate_report(headless=True, jobs=options.get('jobs'))
+            elapsed = time.perf_counter() - started
+            after = resource_usage()
+        finally:
+            os.chdir(cwd)
+
+    return {
+        'rows': rows,
+        'seconds': elapsed,
+        'cpu': after['cpu'] - before['cpu'],
+        'peak_rss_mb': after['peak_rss_mb'],
+    }
+
+
+def bench_startup(rows: int, options: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Время запуска CLI целиком, включая импорты: парсер, для которого данные уже актуальны
+    (один проверочный запрос к серверу из options['url']), и текстовый отчет анализатора
+    (--text-only) по CSV из rows строк. Медиана из options['repeat'] запусков каждого.
+    """
+    package_dir = os.path.dirname(os.path.abspath(__file__))
+
+    def median_seconds(command: List[str], workdir: str) -> float:
+        runs = []
+        for _ in range(options.get('repeat', 5)):
+            started = time.perf_counter()
+            subprocess.run(command, cwd=workdir, stdout=subprocess.DEVNULL, check=True)
+            runs.append(time.perf_counter() - started)
+        return statistics.median(runs)
+
+    with tempfile.TemporaryDirectory() as workdir:
+        write_synthetic_stats(os.path.join(workdir, 'xeet_signals_stats.csv'), rows)
+        # Сохраненная дата совпадает с датой сервера: парсер завершится после проверки
+        with open(os.path.join(workdir, 'xeet_signals_metadata.json'), 'w', encoding='utf-8') as f:
+            json.dump({'lastUpdated': options['last_updated']}, f)
+
+        before = resource_usage()
+        parser_seconds = median_seconds([sys.executable, os.path.join(package_dir, 'xeet_leaderboard_parser.py'),
+                                         'signals', '--base-url', options['url']], workdir)
+        report_seconds = median_seconds([sys.executable, os.path.join(package_dir, 'analyze_data.py'),
+                                         '--text-only', 'xeet_signals_stats.csv'], workdir)
+        after = resource_usage()
+
+    return {
+        'rows': rows,
+        'seconds': parser_seconds + report_seconds,
+        'parser_ms': parser_seconds * 1000,
+        'report_ms': report_seconds * 1000,
+        'cpu': after['cpu'] - before['cpu'],
+        'peak_rss_mb': after['peak_rss_mb'],
+    }
+
+
+BENCHMARKS = {'scrape': bench_scrape, 'csv': bench_csv, 'analyzer': bench_analyzer, 'startup': bench_startup}
+
+
+def _run_in_child(case: str, rows: int, options: Dict[str, Any], results):
+    try:
+        results.put(BENCHMARKS[case](rows, options))
+    except Exception as e:
+        results.put({'error': f'{type(e).__name__}: {e}'})
+
+
+def run_case(case: str, rows: int, options: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Запускает один замер в отдельном (spawn) процессе, чтобы пиковый RSS
+    и CPU относились только к этому замеру. Фейковый сервер для scrape и startup
+    работает в текущем процессе и в замер не входит.
+    """
+    server = None
+    if case in ('scrape', 'startup'):
+        server_options = dict(latency=options['latency'], error_rate=options['error_rate'],
+                              throttle_rate=options['throttle_rate'], retry_after=options['retry_after'])
+        if options.get('fixture'):
+            server = ReplayLeaderboardServer(load_fixture_items(options['fixture']), total_records=rows,
+                                             **server_options)
+        else:
+            server = StubLeaderboardServer(total_records=rows, **server_options)
+        options = dict(options, url=server.start().url, last_updated=server.last_updated)
+
+    context = multiprocessing.get_context('spawn')
+    results = context.Queue()
+    process = context.Process(target=_run_in_child, args=(case, rows, options, results))
+    process.start()
+    try:
+        result = results.get()
+        process.join()
+    finally:
+        if server is not None:
+            server.stop()
+    result.update(case=case, size=rows)
+    if 'rows' in result and result.get('seconds'):
+        result['rows_per_sec'] = result['rows'] / result['seconds']
+    return result
+
+
+def format_result(result: Dict[str, Any]) -> str:
+    if 'error' in result:
+        return f"{result['case']:<9} {result['size']:>9,}  ошибка: {result['error']}"
+    line = (f"{result['case']:<9} {result['size']:>9,} {result['seconds']:>9.3f} "
+            f"{result['rows_per_sec']:>12,.0f} {result['cpu']:>8.2f} {result['peak_rss_mb']:>9.1f}")
+    if result['case'] == 'scrape':
+        line += (f"  {result['pages_per_sec']:>8,.1f} стр/с  p50 {result['p50_ms']:.1f} мс"
+                 f"  p99 {result['p99_ms']:.1f} мс  429/ошибок {result['throttled']}")
+    elif result['case'] == 'startup':
+        line += f"  парсер (данные актуальны) {result['parser_ms']:.0f} мс  текстовый отчет {result['report_ms']:.0f} мс"
+    return line
+
+
+def compare_results(results: List[Dict[str, Any]], baseline_file: str, tolerance: float) -> List[str]:
+    """Замеры, в которых rows/sec упал больше чем на tolerance относительно baseline"""
+    with open(baseline_file, 'r', encoding='utf-8') as f:
+        baseline = {(item['case'], item['size']): item for item in json.load(f)}
+    regressions = []
+    for result in results:
+        previous = baseline.get((result['case'], result['size']))
+        if not previous or 'rows_per_sec' not in previous or 'rows_per_sec' not in result:
+            continue
+        ratio = result['rows_per_sec'] / previous['rows_per_sec']
+        if ratio < 1 - tolerance:
+            regressions.append(f"{result['case']} {result['size']:,}: {previous['rows_per_sec']:,.0f} -> "
+                               f"{result['rows_per_sec']:,.0f} строк/с ({ratio - 1:+.0%})")
+    return regressions
+
+
+def record(args):
+    """Записывает настоящие ответы API в фикстуру"""
+    from xeet_leaderboard_parser import XeetLeaderboardParser
+
+    parser = XeetLeaderboardParser(args.tournament, concurrency=args.concurrency, rate=args.rate,
+                                   history=False, profiles=False, http_cache=False)
+    parser.discover_total_pages()
+    total = record_fixture(parser, args.output, args.pages)
+    print(f"Фикстура {args.output}: {total} записей")
+
+
+def main():
+    """Точка входа бенчмарков"""
+    import argparse
+
+    arg_parser = argparse.ArgumentParser(description="Offline benchmarks for the Xeet scraper and analyzer")
+    commands = arg_parser.add_subparsers(dest="command")
+
+    record_command = commands.add_parser("record", help="record real API pages into a JSONL fixture")
+    record_command.add_argument("tournament", choices=["leagues", "signals"])
+    record_command.add_argument("--output", default="fixtures/signals.jsonl")
+    record_command.add_argument("--pages", type=int, default=None, help="record only the first N pages")
+    record_command.add_argument("--concurrency", type=int, default=2)
+    record_command.add_argument("--rate", type=float, default=2.0)
+
+    run_command = commands.add_parser("run", help="run benchmarks against a local fake server")
+    run_command.add_argument("--cases", nargs="+", choices=CASES, default=CASES)
+    run_command.add_argument("--sizes", nargs="+", type=int, default=DEFAULT_SIZES)
+    run_command.add_argument("--fixture", default=None,
+                             help="replay this recorded fixture instead of synthetic pages")
+    run_command.add_argument("--concurrency", type=int, default=8)
+    run_command.add_argument("--shards", type=int, default=1, help="scrape with N worker processes")
+    run_command.add_argument("--latency", type=float, default=0.0, help="server latency per request, s")
+    run_command.add_argument("--error-rate", type=float, default=0.0, help="share of 500 responses")
+    run_command.add_argument("--throttle-rate", type=float, default=0.0, help="share of 429 responses")
+    run_command.add_argument("--retry-after", type=float, default=0.01, help="Retry-After sent with 429")
+    run_command.add_argument("--backoff-base", type=float, default=0.01, help="parser retry backoff base, s")
+    run_command.add_argument("--jobs", type=int, default=None, help="figure workers for the analyzer report")
+    run_command.add_argument("--repeat", type=int, default=5,
+                             help="CLI launches per startup measurement, the median is reported (default: 5)")
+    run_command.add_argument("--json", default=None, help="write results to this JSON file")
+    run_command.add_argument("--compare", default=None, help="baseline JSON from an earlier --json run")
+    run_command.add_argument("--tolerance", type=float, default=0.2,
+                             help="allowed rows/sec drop against the baseline (default: 0.2)")
+    args = arg_parser.parse_args()
+
+    if args.command == "record":
+        record(args)
+        return
+    if args.command != "run":
+        arg_parser.print_help()
+        return
+
+    options = {'fixture': args.fixture, 'concurrency': args.concurrency, 'shards': args.shards,
+               'latency': args.latency,
+               'error_rate': args.error_rate, 'throttle_rate': args.throttle_rate,
+               'retry_after': args.retry_after, 'backoff_base': args.backoff_base, 'jobs': args.jobs,
+               'repeat': args.repeat}
+
+    print(f"{'замер':<9} {'строк':>9} {'сек':>9} {'строк/с':>12} {'CPU, с':>8} {'RSS, МБ':>9}")
+    results = []
+    for case in args.cases:
+        for size in args.sizes:
+            result = run_case(case, size, options)
+            results.append(result)
+            print(format_result(result))
+
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump(results, f, indent=2)
+    if args.compare:
+        regressions = compare_results(results, args.compare, args.tolerance)
+        for regression in regressions:
+            print(f"РЕГРЕССИЯ: {regression}")
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
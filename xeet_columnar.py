@@ -0,0 +1,153 @@
+import csv
+import os
+from typing import List, Dict, Any, Optional
+
+# pyarrow - необязательная и тяжелая зависимость: импортируется при первом обращении,
+# чтобы парсер и анализатор не платили за него, если колоночный формат не нужен
+pa = None
+ipc = None
+
+
+def columnar_available() -> bool:
+    """Установлен ли pyarrow (при первом вызове импортирует его)"""
+    global pa, ipc
+    if pa is None:
+        try:
+            import pyarrow
+            import pyarrow.ipc
+        except ImportError:
+            return False
+        pa, ipc = pyarrow, pyarrow.ipc
+    return True
+
+
+def stats_schema():
+    """
+    Компактная схема таблицы статистики: int32 для рангов и счетчиков,
+    float32 для баллов, словарное кодирование для username.
+    """
+    return pa.schema([
+        ('rank', pa.int32()),
+        ('username', pa.dictionary(pa.int32(), pa.string())),
+        ('followerCount', pa.int32()),
+        ('score', pa.float32()),
+        ('signalScore', pa.float32()),
+        ('noisePoints', pa.float32()),
+        ('totalEngagement', pa.int64()),
+        ('engagementRate', pa.float32()),
+        ('averageEngagementPerPost', pa.float32()),
+    ])
+
+
+class ArrowStatsWriter:
+    """
+    Потоковая запись статистики в Arrow IPC файл (Feather v2, без сжатия),
+    который можно открыть через memory map без копирования данных.
+    Строки буферизуются пачками по batch_size, файл пишется во временный
+    и атомарно заменяет целевой при успешном завершении (если не вызван discard()).
+    """
+
+    def __init__(self, filename: str, batch_size: int = 65536):
+        if not columnar_available():
+            raise ImportError("pyarrow не установлен: pip install pyarrow")
+        self.filename = filename
+        self.tmp_filename = filename + '.tmp'
+        self.batch_size = batch_size
+        self.schema = stats_schema()
+        self.count = 0
+        self._columns: Dict[str, List[Any]] = {field.name: [] for field in self.schema}
+        # Словарь username растет от пачки к пачке, поэтому в файл уходят только дельты
+        self._usernames: List[str] = []
+        self._username_codes: Dict[str, int] = {}
+        self._writer = None
+        self.discarded = False
+
+    def __enter__(self):
+        options = ipc.IpcWriteOptions(emit_dictionary_deltas=True)
+        self._writer = ipc.new_file(self.tmp_filename, self.schema, options=options)
+        return self
+
+    def writerow(self, row: Dict[str, Any]):
+        for name, values in self._columns.items():
+            if name == 'username':
+                username = row.get('username', '')
+                code = self._username_codes.get(username)
+                if code is None:
+                    code = self._username_codes[username] = len(self._usernames)
+                    self._usernames.append(username)
+                values.append(code)
+            else:
+                value = row.get(name)
+                values.append(0 if value in (None, '') else float(value))
+        self.count += 1
+        if len(self._columns['rank']) >= self.batch_size:
+            self._flush()
+
+    def writerows(self, rows: List[Dict[str, Any]]):
+        for row in rows:
+            self.writerow(row)
+
+    def _flush(self):
+        if not self._columns['rank']:
+            return
+        arrays = []
+        for field in self.schema:
+            values = self._columns[field.name]
+            if field.name == 'username':
+                arrays.append(pa.DictionaryArray.from_arrays(
+                    pa.array(values, type=pa.int32()), pa.array(self._usernames, type=pa.string())))
+            else:
+                # Значения накоплены как float, целые колонки приводятся без потерь
+                arrays.append(pa.array(values, type=pa.float64()).cast(field.type, safe=False))
+        self._writer.write_batch(pa.record_batch(arrays, schema=self.schema))
+        self._columns = {name: [] for name in self._columns}
+
+    def discard(self):
+        """Не заменять целевой файл: записанное удаляется при выходе из with"""
+        self.discarded = True
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self._flush()
+        self._writer.close()
+        if exc_type is None and not self.discarded:
+            os.replace(self.tmp_filename, self.filename)
+        elif os.path.exists(self.tmp_filename):
+            os.remove(self.tmp_filename)
+
+
+def read_stats_table(filename: str, columns: Optional[List[str]] = None):
+    """
+    Открывает Arrow файл через memory map. Данные не копируются и не
+    декодируются: выбранные колонки читаются с диска по мере обращения.
+    """
+    if not columnar_available():
+        raise ImportError("pyarrow не установлен: pip install pyarrow")
+    table = ipc.open_file(pa.memory_map(filename, 'r')).read_all()
+    return table.select(columns) if columns else table
+
+
+def convert_csv_to_arrow(csv_file: str, arrow_file: str) -> int:
+    """Конвертирует CSV статистики в Arrow файл, возвращает число записей"""
+    with open(csv_file, 'r', newline='', encoding='utf-8') as f, ArrowStatsWriter(arrow_file) as writer:
+        for row in csv.DictReader(f):
+            writer.writerow(row)
+    return writer.count
+
+
+def main():
+    """Конвертация существующих CSV в Arrow из командной строки"""
+    import argparse
+
+    arg_parser = argparse.ArgumentParser(description="Convert Xeet stats CSV files to Arrow IPC")
+    arg_parser.add_argument("csv_files", nargs="+")
+    args = arg_parser.parse_args()
+
+    for csv_file in args.csv_files:
+        arrow_file = os.path.splitext(csv_file)[0] + '.arrow'
+        total = convert_csv_to_arrow(csv_file, arrow_file)
+        print(f"{csv_file} -> {arrow_file}: {total} записей")
+
+
+if __name__ == "__main__":
+    main()
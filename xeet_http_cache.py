@@ -0,0 +1,144 @@
+import sqlite3
+import threading
+import time
+from typing import Dict, Any, Optional
+
+from requests.adapters import HTTPAdapter
+
+# Размер кэша тел ответов по умолчанию
+DEFAULT_MAX_BYTES = 256 * 1024 * 1024
+
+
+class HTTPBodyCache:
+    """
+    Дисковый кэш тел ответов с валидаторами (ETag / Last-Modified) по URL.
+
+    Хранится в одном SQLite файле; при превышении max_bytes удаляются
+    ответы, к которым дольше всего не обращались. Ответы без валидаторов
+    не кэшируются - их нельзя проверить условным запросом.
+    """
+
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS responses (
+            url TEXT PRIMARY KEY,
+            etag TEXT,
+            last_modified TEXT,
+            content_type TEXT,
+            body BLOB NOT NULL,
+            size INTEGER NOT NULL,
+            accessed REAL NOT NULL
+        ) WITHOUT ROWID;
+        CREATE INDEX IF NOT EXISTS responses_accessed ON responses (accessed);
+    """
+
+    def __init__(self, path: str = "xeet_http_cache.sqlite", max_bytes: int = DEFAULT_MAX_BYTES):
+        self.path = path
+        self.max_bytes = max_bytes
+        # Одно соединение на все потоки парсера, доступ под блокировкой
+        self.conn = sqlite3.connect(path, timeout=30, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.executescript(self.SCHEMA)
+        self._lock = threading.Lock()
+        self.total_bytes = self.conn.execute("SELECT COALESCE(SUM(size), 0) FROM responses").fetchone()[0]
+
+    def close(self):
+        self.conn.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+    def get(self, url: str) -> Optional[Dict[str, Any]]:
+        """Сохраненный ответ для url (etag, last_modified, content_type, body) или None"""
+        with self._lock:
+            row = self.conn.execute(
+                "SELECT etag, last_modified, content_type, body FROM responses WHERE url = ?", (url,)
+            ).fetchone()
+        if row is None:
+            return None
+        return {'etag': row[0], 'last_modified': row[1], 'content_type': row[2], 'body': row[3]}
+
+    def touch(self, url: str):
+        """Отмечает использование ответа (для вытеснения давно не использованных)"""
+        with self._lock:
+            self.conn.execute("UPDATE responses SET accessed = ? WHERE url = ?", (time.time(), url))
+            self.conn.commit()
+
+    def put(self, url: str, body: bytes, etag: Optional[str] = None,
+            last_modified: Optional[str] = None, content_type: Optional[str] = None):
+        """Сохраняет ответ; слишком большие для кэша ответы пропускаются"""
+        if len(body) > self.max_bytes:
+            return
+        with self._lock:
+            previous = self.conn.execute("SELECT size FROM responses WHERE url = ?", (url,)).fetchone()
+            self.conn.execute(
+                "INSERT OR REPLACE INTO responses (url, etag, last_modified, content_type, body, size, accessed) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (url, etag, last_modified, content_type, body, len(body), time.time())
+            )
+            self.total_bytes += len(body) - (previous[0] if previous else 0)
+            if self.total_bytes > self.max_bytes:
+                self._evict()
+            self.conn.commit()
+
+    def _evict(self):
+        """Удаляет самые давние ответы, пока кэш не станет меньше max_bytes"""
+        # Файл могут делить несколько процессов, поэтому размер пересчитываем по базе
+        self.total_bytes = self.conn.execute("SELECT COALESCE(SUM(size), 0) FROM responses").fetchone()[0]
+        if self.total_bytes <= self.max_bytes:
+            return
+        evicted = []
+        for url, size in self.conn.execute("SELECT url, size FROM responses ORDER BY accessed"):
+            if self.total_bytes <= self.max_bytes:
+                break
+            evicted.append((url,))
+            self.total_bytes -= size
+        self.conn.executemany("DELETE FROM responses WHERE url = ?", evicted)
+
+
+class CachingHTTPAdapter(HTTPAdapter):
+    """
+    HTTPAdapter с условными GET запросами поверх HTTPBodyCache.
+
+    Если для URL есть сохраненный ответ, запрос уходит с If-None-Match /
+    If-Modified-Since; ответ 304 подменяется сохраненным телом со статусом 200
+    и атрибутом from_cache = True. Новые ответы 200 с валидаторами сохраняются.
+    """
+
+    def __init__(self, cache: HTTPBodyCache, **kwargs):
+        super().__init__(**kwargs)
+        self.cache = cache
+
+    def send(self, request, stream=False, **kwargs):
+        if request.method != 'GET' or stream:
+            return super().send(request, stream=stream, **kwargs)
+
+        entry = self.cache.get(request.url)
+        if entry is not None:
+            if entry['etag']:
+                request.headers['If-None-Match'] = entry['etag']
+            if entry['last_modified']:
+                request.headers['If-Modified-Since'] = entry['last_modified']
+
+        response = super().send(request, stream=stream, **kwargs)
+        response.from_cache = False
+        if response.status_code == 304 and entry is not None:
+            # Дочитываем пустое тело 304, чтобы соединение вернулось в пул
+            response.content
+            response.status_code = 200
+            response.reason = 'OK'
+            response._content = entry['body']
+            if entry['content_type']:
+                response.headers['Content-Type'] = entry['content_type']
+            response.from_cache = True
+            self.cache.touch(request.url)
+        elif response.status_code == 200:
+            etag = response.headers.get('ETag')
+            last_modified = response.headers.get('Last-Modified')
+            if etag or last_modified:
+                self.cache.put(request.url, response.content, etag, last_modified,
+                               response.headers.get('Content-Type'))
+        return response
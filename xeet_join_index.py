@@ -0,0 +1,140 @@
+import sys
+from typing import List, Dict, Any, Optional, Sequence
+
+import numpy as np
+
+
+class UsernameDictionary:
+    """
+    Общий словарь username -> код для всех турниров.
+    Строки интернируются, поэтому каждый username хранится в памяти один раз,
+    а турниры ссылаются на него целочисленным кодом.
+    """
+
+    def __init__(self):
+        self.usernames: List[str] = []
+        self.codes: Dict[str, int] = {}
+
+    def __len__(self) -> int:
+        return len(self.usernames)
+
+    def code(self, username: str) -> int:
+        """Код username, новый username добавляется в словарь"""
+        code = self.codes.get(username)
+        if code is None:
+            username = sys.intern(username)
+            code = self.codes[username] = len(self.usernames)
+            self.usernames.append(username)
+        return code
+
+    def encode(self, dictionary: Sequence[str], indices: np.ndarray) -> np.ndarray:
+        """
+        Перекодирует словарно-закодированную колонку (локальный словарь + индексы)
+        в общие коды. Python-цикл идет только по уникальным значениям словаря.
+        """
+        remap = np.fromiter((self.code(str(username)) for username in dictionary),
+                            dtype=np.int32, count=len(dictionary))
+        return remap[np.asarray(indices)]
+
+    def lookup(self, username: str) -> Optional[int]:
+        return self.codes.get(username)
+
+
+class CrossTournamentIndex:
+    """
+    Индекс по username для нескольких турниров (например, leagues и signals).
+
+    Каждый турнир хранится колонками NumPy, строки которых ссылаются на общий
+    UsernameDictionary. Для запросов между турнирами строится плотная таблица
+    код -> строка турнира (-1, если автора в турнире нет), после чего ранги
+    в обоих лидербордах, отношения баллов и авторы только из одного турнира
+    считаются векторно, без объединения строк по username.
+    """
+
+    def __init__(self):
+        self.dictionary = UsernameDictionary()
+        self.tournaments: Dict[str, Dict[str, np.ndarray]] = {}
+        self._codes: Dict[str, np.ndarray] = {}
+        self._positions: Dict[str, np.ndarray] = {}
+        # Аватары и имена общие для всех турниров: код -> (avatar, name)
+        self.profiles: Dict[int, tuple] = {}
+
+    def add_tournament(self, name: str, dictionary: Sequence[str], indices: np.ndarray,
+                       columns: Dict[str, np.ndarray]):
+        """
+        Добавляет турнир. Username передается в словарном виде (уникальные значения
+        и индексы строк), как его отдают pd.factorize и dictionary-колонки Arrow.
+        """
+        self._codes[name] = self.dictionary.encode(dictionary, indices)
+        self.tournaments[name] = {column: np.asarray(values) for column, values in columns.items()}
+        # Словарь мог вырасти - плотные таблицы позиций строятся заново при запросе
+        self._positions.clear()
+
+    def add_profiles(self, usernames: Sequence[str], avatars: Sequence[str], names: Sequence[str]):
+        """Добавляет аватары и имена из avatars CSV (последнее значение побеждает)"""
+        for username, avatar, display_name in zip(usernames, avatars, names):
+            self.profiles[self.dictionary.code(str(username))] = (avatar, display_name)
+
+    def positions(self, name: str) -> np.ndarray:
+        """Плотная таблица: код username -> номер строки в турнире или -1"""
+        positions = self._positions.get(name)
+        if positions is None:
+            codes = self._codes[name]
+            positions = np.full(len(self.dictionary), -1, dtype=np.int64)
+            positions[codes] = np.arange(len(codes))
+            self._positions[name] = positions
+        return positions
+
+    def values_by_code(self, name: str, column: str) -> np.ndarray:
+        """Значения колонки турнира для всех кодов словаря (NaN, если автора нет)"""
+        positions = self.positions(name)
+        present = positions >= 0
+        result = np.full(len(positions), np.nan)
+        result[present] = self.tournaments[name][column][positions[present]]
+        return result
+
+    def ranks(self, username: str) -> Dict[str, Optional[int]]:
+        """Ранг автора в каждом турнире (None, если его там нет)"""
+        code = self.dictionary.lookup(username)
+        result = {}
+        for name in self.tournaments:
+            position = self.positions(name)[code] if code is not None else -1
+            result[name] = int(self.tournaments[name]['rank'][position]) if position >= 0 else None
+        return result
+
+    def profile(self, username: str) -> Optional[Dict[str, Any]]:
+        """Аватар и имя автора, если они есть в одном из avatars файлов"""
+        code = self.dictionary.lookup(username)
+        if code is None or code not in self.profiles:
+            return None
+        avatar, display_name = self.profiles[code]
+        return {'username': username, 'avatar': avatar, 'name': display_name}
+
+    def compare(self, first: str, second: str, columns: Sequence[str] = ('rank', 'score')) -> Dict[str, np.ndarray]:
+        """
+        Авторы, присутствующие в обоих турнирах, в порядке ранга в first.
+        Возвращает колонки username, <column>_<турнир> и score_ratio (first / second).
+        """
+        first_positions = self.positions(first)
+        second_positions = self.positions(second)
+        # Порядок строк first = порядок ранга
+        codes = self._codes[first]
+        codes = codes[second_positions[codes] >= 0]
+
+        usernames = np.array(self.dictionary.usernames, dtype=object)
+        result = {'username': usernames[codes]}
+        for column in columns:
+            result[f'{column}_{first}'] = self.tournaments[first][column][first_positions[codes]]
+            result[f'{column}_{second}'] = self.tournaments[second][column][second_positions[codes]]
+
+        first_score = self.tournaments[first]['score'][first_positions[codes]].astype(np.float64)
+        second_score = self.tournaments[second]['score'][second_positions[codes]].astype(np.float64)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            result['score_ratio'] = np.where(second_score != 0, first_score / second_score, np.nan)
+        return result
+
+    def only_in(self, first: str, second: str) -> List[str]:
+        """Авторы из first, которых нет в second, в порядке ранга в first"""
+        codes = self._codes[first]
+        codes = codes[self.positions(second)[codes] < 0]
+        return [self.dictionary.usernames[code] for code in codes]
@@ -0,0 +1,116 @@
+import os
+from typing import List, Dict, Any, Iterator, Set, Tuple
+
+from xeet_json import loads, dumps
+
+
+class PageJournal:
+    """
+    Append-only журнал загруженных страниц в формате JSONL.
+
+    Первая строка - заголовок с параметрами запуска (lastUpdated, limit, totalPages),
+    дальше по одной строке на каждую загруженную страницу:
+        {"page": 5, "rows": [...], "avatars": [...]}
+
+    Если процесс упал, журнал позволяет продолжить парсинг с того же места,
+    а итоговые CSV собираются из журнала в порядке страниц.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._offsets: Dict[int, int] = {}
+        self._file = None
+
+    def open(self, last_updated: str, total_pages: int, limit: int) -> Set[int]:
+        """
+        Открывает журнал для дозаписи и возвращает множество уже загруженных страниц.
+        Журнал от другого обновления лидерборда (или с другими параметрами) начинается заново.
+        """
+        header = {'lastUpdated': last_updated, 'totalPages': total_pages, 'limit': limit}
+        self._offsets = {}
+
+        if last_updated and os.path.exists(self.path) and self._read_header() == header:
+            self._index()
+            self._file = open(self.path, 'ab')
+            if self._offsets:
+                print(f"Найден журнал {self.path}: уже загружено страниц {len(self._offsets)}")
+        else:
+            self._file = open(self.path, 'wb')
+            self._write_line(header)
+
+        return set(self._offsets)
+
+    def load(self) -> Set[int]:
+        """Индексирует существующий журнал только для чтения (например, журнал другого процесса)"""
+        self._offsets = {}
+        if os.path.exists(self.path):
+            self._index()
+        return set(self._offsets)
+
+    def _read_header(self) -> Dict[str, Any]:
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                return loads(f.readline())
+        except (OSError, ValueError):
+            return {}
+
+    def _index(self):
+        """Строит индекс page -> смещение строки; оборванную последнюю строку отбрасывает"""
+        with open(self.path, 'rb') as f:
+            f.readline()
+            valid_end = f.tell()
+            while True:
+                offset = f.tell()
+                line = f.readline()
+                if not line:
+                    break
+                try:
+                    entry = loads(line)
+                except ValueError:
+                    break
+                self._offsets[entry['page']] = offset
+                valid_end = f.tell()
+
+        # Запись, оборванная при падении, обрезается, чтобы дозапись шла с целой строки
+        if valid_end < os.path.getsize(self.path):
+            with open(self.path, 'r+b') as f:
+                f.truncate(valid_end)
+
+    def _write_line(self, entry: Dict[str, Any]):
+        self._file.write(dumps(entry) + b'\n')
+        self._file.flush()
+
+    def append(self, page: int, rows: List[Dict[str, Any]], avatars: List[Dict[str, Any]]):
+        """Записывает загруженную страницу"""
+        self._offsets[page] = self._file.tell()
+        self._write_line({'page': page, 'rows': rows, 'avatars': avatars})
+
+    @property
+    def pages(self) -> Set[int]:
+        return set(self._offsets)
+
+    def iter_entries(self) -> Iterator[Tuple[int, List[Dict[str, Any]], List[Dict[str, Any]]]]:
+        """Возвращает (page, rows, avatars) всех страниц журнала в порядке номеров страниц"""
+        if self._file is not None:
+            self._file.flush()
+        with open(self.path, 'rb') as f:
+            for page in sorted(self._offsets):
+                f.seek(self._offsets[page])
+                entry = loads(f.readline())
+                yield page, entry['rows'], entry['avatars']
+
+    def iter_pages(self) -> Iterator[Tuple[List[Dict[str, Any]], List[Dict[str, Any]]]]:
+        """Возвращает (rows, avatars) всех страниц журнала в порядке номеров страниц"""
+        for _, rows, avatars in self.iter_entries():
+            yield rows, avatars
+
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    def remove(self):
+        """Удаляет журнал после успешного сохранения результатов"""
+        self.close()
+        if os.path.exists(self.path):
+            os.remove(self.path)
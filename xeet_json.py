@@ -0,0 +1,30 @@
+import json
+from typing import Any, Union
+
+try:
+    import orjson
+except ImportError:  # orjson - необязательная зависимость, без нее используется json
+    orjson = None
+
+# orjson.JSONDecodeError наследуется от json.JSONDecodeError,
+# поэтому обработчики ошибок одинаковы для обоих парсеров
+JSONDecodeError = json.JSONDecodeError
+
+
+def fast_json_available() -> bool:
+    """Установлен ли orjson"""
+    return orjson is not None
+
+
+def loads(data: Union[bytes, str]) -> Any:
+    """Разбирает JSON из bytes или str (через orjson, если он есть)"""
+    if orjson is not None:
+        return orjson.loads(data)
+    return json.loads(data)
+
+
+def dumps(value: Any) -> bytes:
+    """Сериализует значение в компактный UTF-8 JSON (bytes)"""
+    if orjson is not None:
+        return orjson.dumps(value)
+    return json.dumps(value, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
@@ -1,16 +1,274 @@
-import requests
 import csv
+import heapq
+import multiprocessing
+import threading
 import time
 import json
+import math
 import os
-from datetime import datetime
-from typing import List, Dict, Any
+import random
+from collections import deque
+from contextlib import ExitStack
+from operator import itemgetter
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+from datetime import datetime, timezone
+from typing import TYPE_CHECKING, List, Dict, Any, Iterable, Iterator, Optional, Tuple
+from xeet_journal import PageJournal
+from xeet_json import loads as json_loads
+from xeet_columnar import ArrowStatsWriter, columnar_available, convert_csv_to_arrow
+from xeet_snapshot_store import SnapshotStore
+from xeet_profile_store import ProfileStore, TournamentProfileWriter
+from xeet_metrics import Metrics, create_metrics
+
+if TYPE_CHECKING:
+    import requests
+
+# requests, asyncio и pyarrow импортируются там, где они нужны: если данные актуальны,
+# запуск ограничивается одним запросом через urllib и не платит за их загрузку
+
+
+class TokenBucket:
+    """
+    Token bucket ограничитель частоты запросов.
+    rate - сколько запросов в секунду разрешено в среднем,
+    capacity - сколько запросов можно отправить пачкой.
+    Потокобезопасен, поэтому один экземпляр можно делить между потоками.
+    """
+
+    def __init__(self, rate: float, capacity: float = 1.0):
+        self.rate = rate
+        self.capacity = capacity
+        self._tokens = capacity
+        self._updated_at = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _reserve(self) -> float:
+        """Забирает один токен и возвращает, сколько секунд нужно подождать"""
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.capacity, self._tokens + (now - self._updated_at) * self.rate)
+            self._updated_at = now
+            self._tokens -= 1
+            if self._tokens >= 0:
+                return 0.0
+            return -self._tokens / self.rate
+
+    def acquire(self):
+        """Блокирующее ожидание токена"""
+        wait = self._reserve()
+        if wait > 0:
+            time.sleep(wait)
+
+    async def acquire_async(self):
+        """Ожидание токена внутри event loop"""
+        import asyncio
+
+        wait = self._reserve()
+        if wait > 0:
+            await asyncio.sleep(wait)
+
+
+class AdaptiveTokenBucket(TokenBucket):
+    """
+    Token bucket, который подстраивает rate под поведение сервера (AIMD):
+    успешные быстрые ответы понемногу повышают частоту (аддитивно),
+    429/5xx и рост задержки резко ее снижают (мультипликативно).
+    """
+
+    def __init__(self, rate: float, capacity: float = 1.0, min_rate: float = 0.2,
+                 max_rate: Optional[float] = None, increase_step: float = 0.5,
+                 decrease_factor: float = 0.5, latency_factor: float = 2.0):
+        super().__init__(rate, capacity)
+        self.min_rate = min(min_rate, rate)
+        self.max_rate = max(max_rate or rate, rate)
+        self.increase_step = increase_step
+        self.decrease_factor = decrease_factor
+        self.latency_factor = latency_factor
+        self._latency_ewma = None
+        self._latency_baseline = None
+
+    def _set_rate(self, rate: float):
+        with self._lock:
+            self.rate = max(self.min_rate, min(self.max_rate, rate))
+
+    def on_success(self, latency: float):
+        """Учитывает успешный ответ и его задержку"""
+        if self._latency_ewma is None:
+            self._latency_ewma = latency
+        else:
+            self._latency_ewma = 0.8 * self._latency_ewma + 0.2 * latency
+        if self._latency_baseline is None or self._latency_ewma < self._latency_baseline:
+            self._latency_baseline = self._latency_ewma
+
+        if self._latency_ewma > self._latency_baseline * self.latency_factor:
+            # Сервер начал отвечать медленнее - мягко сбавляем темп
+            self._set_rate(self.rate * 0.9)
+        else:
+            # Примерно +increase_step запросов/сек за каждую секунду успешной работы
+            self._set_rate(self.rate + self.increase_step / max(self.rate, 1.0))
+
+    def on_throttle(self):
+        """Учитывает 429 / 5xx / таймаут"""
+        self._set_rate(self.rate * self.decrease_factor)
+
+
+class SharedTokenBucket(AdaptiveTokenBucket):
+    """
+    AdaptiveTokenBucket, чье состояние (rate, токены, время пополнения) лежит в общей
+    памяти под межпроцессной блокировкой. Процессы-шарды получают его при запуске
+    (initializer пула) и делят одну частоту запросов: замедление после 429 в одном
+    шарде замедляет и остальные, а общий прирост не выходит за max_rate.
+    Задержка ответов (EWMA) у каждого процесса своя.
+    """
+
+    def __init__(self, rate: float, capacity: float = 1.0, **kwargs):
+        context = multiprocessing.get_context('spawn')
+        self._state = context.Array('d', 3, lock=False)
+        super().__init__(rate, capacity, **kwargs)
+        self._lock = context.Lock()
+
+    @classmethod
+    def from_bucket(cls, bucket: TokenBucket, capacity: float) -> 'SharedTokenBucket':
+        """Общий ограничитель с текущей частотой и настройками bucket"""
+        return cls(bucket.rate, capacity,
+                   min_rate=getattr(bucket, 'min_rate', bucket.rate),
+                   max_rate=getattr(bucket, 'max_rate', bucket.rate),
+                   increase_step=getattr(bucket, 'increase_step', 0.0),
+                   decrease_factor=getattr(bucket, 'decrease_factor', 1.0),
+                   latency_factor=getattr(bucket, 'latency_factor', 2.0))
+
+    @property
+    def rate(self) -> float:
+        return self._state[0]
+
+    @rate.setter
+    def rate(self, value: float):
+        self._state[0] = value
+
+    @property
+    def _tokens(self) -> float:
+        return self._state[1]
+
+    @_tokens.setter
+    def _tokens(self, value: float):
+        self._state[1] = value
+
+    @property
+    def _updated_at(self) -> float:
+        return self._state[2]
+
+    @_updated_at.setter
+    def _updated_at(self, value: float):
+        self._state[2] = value
+
+
+class AtomicCSVWriter:
+    """
+    Потоковая запись CSV: строки пишутся во временный файл рядом с целевым,
+    который атомарно заменяет целевой только при успешном завершении.
+    При ошибке (или после discard()) временный файл удаляется, а старый CSV остается нетронутым.
+    """
+
+    def __init__(self, filename: str, fieldnames: List[str]):
+        self.filename = filename
+        self.fieldnames = fieldnames
+        self.tmp_filename = filename + '.tmp'
+        self.count = 0
+        self.discarded = False
+        self._file = None
+        self._writer = None
+        self._values = None
+
+    def __enter__(self):
+        self._file = open(self.tmp_filename, 'w', newline='', encoding='utf-8')
+        self._writer = csv.writer(self._file)
+        self._writer.writerow(self.fieldnames)
+        # Значения берутся из словаря одним itemgetter, без проверок csv.DictWriter
+        self._values = itemgetter(*self.fieldnames)
+        return self
+
+    def _row_values(self, row: Dict[str, Any]):
+        try:
+            return self._values(row)
+        except KeyError:
+            return [row.get(field, '') for field in self.fieldnames]
+
+    def writerow(self, row: Dict[str, Any]):
+        self._writer.writerow(self._row_values(row))
+        self.count += 1
+
+    def writerows(self, rows: List[Dict[str, Any]]):
+        self._writer.writerows(map(self._row_values, rows))
+        self.count += len(rows)
+
+    def discard(self):
+        """Не заменять целевой файл: записанное удаляется при выходе из with"""
+        self.discarded = True
+
+    def __exit__(self, exc_type, exc, tb):
+        self._file.close()
+        if exc_type is None and not self.discarded:
+            os.replace(self.tmp_filename, self.filename)
+        elif os.path.exists(self.tmp_filename):
+            os.remove(self.tmp_filename)
+
 
 class XeetLeaderboardParser:
-    def __init__(self, tournament_type="leagues"):
+    # Коды ответа, при которых запрос имеет смысл повторить
+    RETRY_STATUS_CODES = {429, 500, 502, 503, 504}
+    
+    # Колонки выходных CSV файлов
+    STATS_FIELDS = [
+        'rank', 'username', 'followerCount', 'score', 'signalScore',
+        'noisePoints', 'totalEngagement', 'engagementRate', 'averageEngagementPerPost'
+    ]
+    AVATAR_FIELDS = ['username', 'avatar', 'name']
+    
+    # Заголовки браузера для всех запросов к API
+    HEADERS = {
+        'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36',
+        'Accept': 'application/json, text/plain, */*',
+        'Accept-Language': 'en-US,en;q=0.9',
+        'Accept-Encoding': 'gzip, deflate, br',
+        'Connection': 'keep-alive',
+    }
+
+    def __init__(self, tournament_type="leagues", concurrency: int = 1,
+                 rate: Optional[float] = None, base_url: Optional[str] = None,
+                 max_rate: Optional[float] = None, max_retries: int = 5,
+                 incremental: bool = False, stop_after_unchanged: int = 3,
+                 config: Optional[Dict[str, Any]] = None,
+                 rate_limiter: Optional[AdaptiveTokenBucket] = None,
+                 discover: bool = True, max_limit: int = 100,
+                 columnar: bool = False, history: bool = True, profiles: bool = True,
+                 metrics: Optional[Metrics] = None, quiet: bool = False,
+                 http_cache: bool = True, http_cache_size: Optional[int] = None,
+                 shards: int = 1, proxies: Optional[List[str]] = None,
+                 source_addresses: Optional[List[str]] = None):
         """
         Initialize parser for specific tournament type
         tournament_type: "leagues" or "signals"
+        concurrency: max number of page requests in flight (1 = sequential)
+        rate: starting requests per second (default 1 / delay)
+        base_url: override leaderboard URL (e.g. local stub server)
+        max_rate: upper bound for adaptive rate ramp-up (default: rate, no ramp-up)
+        max_retries: retries per request before the page is marked as failed
+        incremental: compare pages with the previous CSVs and rewrite only changed rows
+        stop_after_unchanged: stop the incremental scan after this many identical pages in a row
+        config: tournament config (url, total_pages, output files) instead of the built-in ones
+        rate_limiter: shared rate limiter (e.g. one global limit for several tournaments)
+        discover: find the real number of pages before scraping (total_pages becomes a hint)
+        max_limit: largest page size to try during discovery
+        columnar: also write stats to a memory-mappable Arrow IPC file (requires pyarrow)
+        history: append every successful scrape to the SQLite snapshot history
+        profiles: record new and changed avatars/names in the shared deduplicated profile store
+        metrics: collect request/page/phase metrics and events here (see xeet_metrics.py)
+        quiet: no per-page and per-retry console output (it costs time at high concurrency)
+        http_cache: send conditional requests (ETag/Last-Modified) and reuse unchanged bodies from disk
+        http_cache_size: size limit of the on-disk response cache in bytes (default: 256 MB)
+        shards: split the page range across this many worker processes, each with its own connection pool
+        proxies: proxy URLs, shard i uses proxies[i % len(proxies)] (without shards - the first one)
+        source_addresses: local IP addresses to connect from, assigned to shards like proxies
         """
         self.tournament_type = tournament_type
         
@@ -21,37 +279,227 @@ class XeetLeaderboardParser:
                 "total_pages": 1797,
                 "csv_file": "xeet_leagues_stats.csv",
                 "avatars_file": "xeet_leagues_avatars.csv",
-                "metadata_file": "xeet_leagues_metadata.json"
+                "metadata_file": "xeet_leagues_metadata.json",
+                "journal_file": "xeet_leagues_journal.jsonl",
+                "arrow_file": "xeet_leagues_stats.arrow",
+                "history_file": "xeet_history.sqlite",
+                "profiles_file": "xeet_profiles.sqlite",
+                "http_cache_file": "xeet_http_cache.sqlite"
             },
             "signals": {
                 "url": "https://www.xeet.ai/api/tournaments/5ea420b7-17c1-4a9d-9501-0fcaa60387f9/leaderboard",
                 "total_pages": 431,
                 "csv_file": "xeet_signals_stats.csv",
                 "avatars_file": "xeet_signals_avatars.csv",
-                "metadata_file": "xeet_signals_metadata.json"
+                "metadata_file": "xeet_signals_metadata.json",
+                "journal_file": "xeet_signals_journal.jsonl",
+                "arrow_file": "xeet_signals_stats.arrow",
+                "history_file": "xeet_history.sqlite",
+                "profiles_file": "xeet_profiles.sqlite",
+                "http_cache_file": "xeet_http_cache.sqlite"
             }
         }
         
         # Set configuration based on tournament type
-        config = self.tournament_configs[tournament_type]
-        self.base_url = config["url"]
+        if config is None:
+            config = self.tournament_configs[tournament_type]
+        self.config = config
+        self.base_url = base_url or config["url"]
         self.csv_file = config["csv_file"]
         self.avatars_file = config["avatars_file"]
         self.metadata_file = config["metadata_file"]
+        self.journal_file = config["journal_file"]
+        self.arrow_file = config.get("arrow_file", os.path.splitext(self.csv_file)[0] + ".arrow")
+        self.history_file = config.get("history_file", "xeet_history.sqlite")
+        self.profiles_file = config.get("profiles_file", "xeet_profiles.sqlite")
+        self.http_cache_file = config.get("http_cache_file", "xeet_http_cache.sqlite")
         self.total_pages = config["total_pages"]
+        # Точное число записей, если его сообщила пагинация API (см. discover_total_pages)
+        self.total_records: Optional[int] = None
         self.limit = 20
         self.delay = 0.5
+        self.concurrency = max(1, concurrency)
+        self.max_retries = max_retries
+        self.backoff_base = 1.0
+        self.backoff_cap = 60.0
+        self.failed_pages: List[int] = []
+        self.incremental = incremental
+        self.stop_after_unchanged = stop_after_unchanged
+        self.discover = discover
+        self.max_limit = max_limit
+        self.columnar = columnar
+        self.history = history
+        self.profiles = profiles
+        self.quiet = quiet
+        self.shards = max(1, shards)
+        self.proxies = proxies or []
+        self.source_addresses = source_addresses or []
+        self.use_http_cache = http_cache
+        self.http_cache_size = http_cache_size
+        # Дата lastUpdated, полученная проверкой актуальности, - чтобы запуск не запрашивал ее второй раз
+        self._last_updated: Optional[str] = None
+        # Метрики всегда копятся в памяти; метка tournament разделяет турниры общего реестра
+        self.metrics = (metrics or Metrics()).child(tournament=tournament_type)
+        if columnar and not columnar_available():
+            print("pyarrow не установлен, колоночный формат отключен")
+            self.columnar = False
         
-        self.session = requests.Session()
+        # Token bucket вместо фиксированной задержки между запросами,
+        # частота подстраивается под ответы сервера
+        self.rate_limiter = rate_limiter or AdaptiveTokenBucket(rate or 1 / self.delay,
+                                                                capacity=self.concurrency,
+                                                                max_rate=max_rate)
+        
+        # Сессия requests и дисковый кэш ответов создаются при первом запросе через них
+        self.http_cache = None
+        self._session = None
+        self._session_lock = threading.Lock()
+    
+    @property
+    def session(self):
+        """Сессия requests с пулом соединений, создается при первом обращении"""
+        if self._session is None:
+            with self._session_lock:
+                if self._session is None:
+                    self._session = self._create_session()
+        return self._session
+    
+    def close(self):
+        """Закрывает сессию requests и дисковый кэш ответов (при следующем запросе создаются заново)"""
+        with self._session_lock:
+            session, self._session = self._session, None
+            http_cache, self.http_cache = self.http_cache, None
+        if session is not None:
+            session.close()
+        if http_cache is not None:
+            http_cache.close()
+    
+    def __enter__(self):
+        return self
+    
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+    
+    def _create_session(self):
+        import requests
+        from requests.adapters import HTTPAdapter
+        from xeet_http_cache import HTTPBodyCache, CachingHTTPAdapter, DEFAULT_MAX_BYTES
+        
+        session = requests.Session()
+        # Пул соединений должен вмещать все одновременные запросы
+        pool = dict(pool_connections=1, pool_maxsize=max(10, self.concurrency))
+        # Условные запросы: неизменившиеся страницы приходят как 304 и берутся из дискового кэша
+        if self.use_http_cache:
+            self.http_cache = HTTPBodyCache(self.http_cache_file, self.http_cache_size or DEFAULT_MAX_BYTES)
+            adapter = CachingHTTPAdapter(self.http_cache, **pool)
+        else:
+            adapter = HTTPAdapter(**pool)
+        if self.source_addresses:
+            # Новые соединения пула открываются с заданного локального адреса
+            adapter.poolmanager.connection_pool_kw['source_address'] = (self.source_addresses[0], 0)
+        session.mount('https://', adapter)
+        session.mount('http://', adapter)
+        if self.proxies:
+            session.proxies.update({'http': self.proxies[0], 'https': self.proxies[0]})
         # Add headers to mimic browser
-        self.session.headers.update({
-            'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36',
-            'Accept': 'application/json, text/plain, */*',
-            'Accept-Language': 'en-US,en;q=0.9',
-            'Accept-Encoding': 'gzip, deflate, br',
-            'Connection': 'keep-alive',
-        })
+        session.headers.update(self.HEADERS)
+        return session
+        
+    def log_progress(self, message: str):
+        """Печатает сообщение о ходе работы по странице или запросу (кроме тихого режима)"""
+        if not self.quiet:
+            print(message)
+    
+    def _retry_after(self, response: 'requests.Response') -> Optional[float]:
+        """Разбирает заголовок Retry-After (секунды или HTTP-дата)"""
+        from email.utils import parsedate_to_datetime
+        
+        value = response.headers.get('Retry-After')
+        if not value:
+            return None
+        try:
+            return max(0.0, float(value))
+        except ValueError:
+            pass
+        try:
+            retry_at = parsedate_to_datetime(value)
+            return max(0.0, (retry_at - datetime.now(timezone.utc)).total_seconds())
+        except (TypeError, ValueError):
+            return None
+    
+    def _backoff(self, attempt: int) -> float:
+        """Экспоненциальная задержка с full jitter"""
+        return random.uniform(0, min(self.backoff_cap, self.backoff_base * 2 ** attempt))
+    
+    def request_json(self, params: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        Выполняет GET запрос к API с повторами.
+        Повторяет таймауты, обрывы соединения, 429 и 5xx; при 429/503
+        ждет столько, сколько просит Retry-After. Бросает последнее
+        исключение, если все попытки исчерпаны.
+        """
+        import requests
         
+        for attempt in range(self.max_retries + 1):
+            if attempt > 0:
+                self.rate_limiter.acquire()
+            
+            started = time.monotonic()
+            wait = None
+            outcome = None
+            try:
+                response = self.session.get(self.base_url, params=params, timeout=30)
+                if getattr(response, 'from_cache', False):
+                    # Сервер ответил 304, тело взято из кэша и по сети не передавалось
+                    outcome = 304
+                    self.record_request(params, outcome, time.monotonic() - started, 0)
+                else:
+                    outcome = response.status_code
+                    self.record_request(params, outcome, time.monotonic() - started, len(response.content))
+                if response.status_code in self.RETRY_STATUS_CODES:
+                    self.rate_limiter.on_throttle()
+                    wait = self._retry_after(response)
+                response.raise_for_status()
+                # orjson, если установлен: разбор страницы в несколько раз быстрее response.json()
+                data = json_loads(response.content)
+                self.rate_limiter.on_success(time.monotonic() - started)
+                return data
+            except requests.exceptions.HTTPError as e:
+                status = e.response.status_code if e.response is not None else None
+                if status not in self.RETRY_STATUS_CODES or attempt == self.max_retries:
+                    raise
+                error = e
+            except (requests.exceptions.ConnectionError, requests.exceptions.Timeout,
+                    json.JSONDecodeError) as e:
+                if outcome is None:
+                    # Ответа не было: учитываем запрос с типом ошибки вместо кода
+                    outcome = type(e).__name__
+                    self.record_request(params, outcome, time.monotonic() - started, 0)
+                else:
+                    outcome = 'invalid_json'
+                self.rate_limiter.on_throttle()
+                if attempt == self.max_retries:
+                    raise
+                error = e
+            
+            if wait is None:
+                wait = self._backoff(attempt)
+            self.metrics.inc('xeet_retries_total', reason=outcome)
+            self.metrics.event('retry', page=params.get('page'), attempt=attempt + 1,
+                               reason=str(outcome), wait=round(wait, 3))
+            self.log_progress(f"Повтор запроса {params} через {wait:.1f} с "
+                              f"(попытка {attempt + 1}/{self.max_retries}): {error}")
+            time.sleep(wait)
+    
+    def record_request(self, params: Dict[str, Any], status: Any, latency: float, size: int):
+        """Метрики одного HTTP запроса: число по статусу, задержка, байты ответа"""
+        metrics = self.metrics
+        metrics.inc('xeet_requests_total', status=status)
+        metrics.observe('xeet_request_seconds', latency)
+        metrics.inc('xeet_response_bytes_total', size)
+        metrics.event('request', page=params.get('page'), limit=params.get('limit'),
+                      status=status, seconds=round(latency, 6), bytes=size)
+    
     def fetch_page(self, page: int) -> Dict[str, Any]:
         """Получает данные с одной страницы API"""
         params = {
@@ -59,10 +507,10 @@ class XeetLeaderboardParser:
             'limit': self.limit
         }
         
+        import requests
+        
         try:
-            response = self.session.get(self.base_url, params=params, timeout=30)
-            response.raise_for_status()
-            return response.json()
+            return self.request_json(params)
         except requests.exceptions.RequestException as e:
             print(f"Ошибка при запросе страницы {page}: {e}")
             return None
@@ -70,21 +518,132 @@ class XeetLeaderboardParser:
             print(f"Ошибка парсинга JSON для страницы {page}: {e}")
             return None
     
-    def get_last_updated_from_api(self) -> str:
-        """Получает дату последнего обновления из API (первая страница)"""
+    def get_last_updated_from_api(self, refresh: bool = False) -> str:
+        """
+        Получает дату последнего обновления из API (первая страница).
+        Результат запоминается до следующего запуска, поэтому проверка актуальности
+        и сам парсинг делят один запрос; refresh=True запрашивает дату заново.
+        """
+        if self._last_updated is not None and not refresh:
+            return self._last_updated
         try:
-            response = self.session.get(self.base_url, params={'page': 1, 'limit': 1}, timeout=30)
-            response.raise_for_status()
-            data = response.json()
+            data = self.probe_json({'page': 1, 'limit': 1})
             
             # lastUpdated находится в каждой записи, берем из первой
             if 'data' in data and len(data['data']) > 0:
-                return data['data'][0].get('lastUpdated', '')
-            return ''
+                self._last_updated = data['data'][0].get('lastUpdated', '')
+            else:
+                self._last_updated = ''
+            return self._last_updated
         except Exception as e:
             print(f"Ошибка при получении даты последнего обновления: {e}")
             return ''
     
+    def probe_json(self, params: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        Одиночный запрос для проверки актуальности. Пока сессия requests не создана,
+        он идет через urllib: если данные свежие, запуск так и не импортирует requests.
+        При любой ошибке (и с прокси / локальными адресами) - обычный request_json с повторами.
+        """
+        if self._session is not None or self.proxies or self.source_addresses:
+            return self.request_json(params)
+        
+        from urllib.parse import urlencode
+        from urllib.request import Request, urlopen
+        
+        # urllib не распаковывает gzip/br, а ответ на limit=1 и так маленький
+        headers = dict(self.HEADERS, **{'Accept-Encoding': 'identity'})
+        separator = '&' if '?' in self.base_url else '?'
+        request = Request(self.base_url + separator + urlencode(params), headers=headers)
+        started = time.monotonic()
+        try:
+            with urlopen(request, timeout=30) as response:
+                status = response.status
+                body = response.read()
+            data = json_loads(body)
+        except Exception as e:
+            self.log_progress(f"Проверочный запрос через urllib не удался ({e}), повторяем через requests")
+            return self.request_json(params)
+        self.record_request(params, status, time.monotonic() - started, len(body))
+        self.rate_limiter.on_success(time.monotonic() - started)
+        return data
+    
+    @staticmethod
+    def _total_from_metadata(data: Dict[str, Any]) -> Optional[int]:
+        """Ищет общее число записей в метаданных пагинации ответа API"""
+        for container in (data, data.get('pagination'), data.get('meta')):
+            if not isinstance(container, dict):
+                continue
+            # count не берем: в разных API это и число страниц, и длина текущей страницы
+            for key in ('total', 'totalCount', 'totalRecords'):
+                if isinstance(container.get(key), int):
+                    return container[key]
+        return None
+    
+    def _page_has_data(self, page: int) -> bool:
+        """Проверяет, есть ли записи на странице (одна проба при текущем limit)"""
+        self.rate_limiter.acquire()
+        return bool(self.request_json({'page': page, 'limit': self.limit}).get('data'))
+    
+    def discover_page_size(self) -> Dict[str, Any]:
+        """
+        Пробует запросить первую страницу с limit=max_limit. Если сервер отдал
+        больше записей, чем текущий limit, дальше используем этот размер страницы.
+        Возвращает ответ первой страницы.
+        """
+        self.rate_limiter.acquire()
+        data = self.request_json({'page': 1, 'limit': max(self.limit, self.max_limit)})
+        returned = len(data.get('data', []))
+        if returned > self.limit:
+            print(f"Сервер отдает до {returned} записей на страницу (было {self.limit})")
+            self.limit = returned
+        return data
+    
+    def discover_total_pages(self) -> int:
+        """
+        Определяет реальное количество страниц перед параллельной загрузкой.
+        Сначала смотрит на метаданные пагинации в ответе API; если их нет -
+        экспоненциальная проба от ожидаемого числа страниц, затем бинарный поиск
+        последней непустой страницы. Обновляет self.limit и self.total_pages.
+        """
+        hint_records = self.total_pages * self.limit
+        self.total_records = None
+        first_page = self.discover_page_size()
+        
+        if not first_page.get('data'):
+            print("Лидерборд пуст")
+            self.total_pages = 0
+            return 0
+        
+        total = self._total_from_metadata(first_page)
+        if total is not None:
+            self.total_records = total
+            self.total_pages = math.ceil(total / self.limit)
+            print(f"Всего записей по данным API: {total}, страниц: {self.total_pages}")
+            return self.total_pages
+        
+        # last_full - последняя известная непустая страница, first_empty - первая известная пустая
+        hint = max(1, math.ceil(hint_records / self.limit))
+        if self._page_has_data(hint):
+            last_full, step = hint, 1
+            while self._page_has_data(last_full + step):
+                last_full += step
+                step *= 2
+            first_empty = last_full + step
+        else:
+            last_full, first_empty = 1, hint
+        
+        while first_empty - last_full > 1:
+            middle = (last_full + first_empty) // 2
+            if self._page_has_data(middle):
+                last_full = middle
+            else:
+                first_empty = middle
+        
+        self.total_pages = last_full
+        print(f"Найдено страниц: {self.total_pages} (по {self.limit} записей)")
+        return self.total_pages
+    
     def load_metadata(self) -> Dict[str, Any]:
         """Загружает метаданные из файла"""
         if os.path.exists(self.metadata_file):
@@ -108,7 +667,7 @@ class XeetLeaderboardParser:
         print("Проверка необходимости обновления данных...")
         
         # Получаем текущую дату последнего обновления из API
-        current_last_updated = self.get_last_updated_from_api()
+        current_last_updated = self.get_last_updated_from_api(refresh=True)
         if not current_last_updated:
             print("Не удалось получить дату последнего обновления из API. Продолжаем парсинг...")
             return True
@@ -159,41 +718,527 @@ class XeetLeaderboardParser:
             'name': user.get('name', '')
         }
     
-    def parse_all_pages(self) -> tuple[List[Dict[str, Any]], List[Dict[str, Any]]]:
-        """Парсит все страницы и возвращает кортеж (основные данные, данные аватаров)"""
-        all_data = []
-        all_avatars = []
+    def iter_pages(self, pages: Iterable[int]) -> Iterator[Tuple[int, Optional[Dict[str, Any]]]]:
+        """Возвращает пары (номер страницы, данные) строго в порядке pages"""
+        if self.concurrency <= 1:
+            for page in pages:
+                self.rate_limiter.acquire()
+                yield page, self.fetch_page(page)
+            return
         
-        for page in range(1, self.total_pages + 1):
-            print(f"Обработка страницы {page}/{self.total_pages}...")
-            
-            # Получаем данные страницы
-            page_data = self.fetch_page(page)
+        import asyncio
+        
+        # Асинхронный режим: event loop крутится только пока ждем очередную
+        # страницу, а сами запросы идут в пуле потоков и не останавливаются
+        loop = asyncio.new_event_loop()
+        executor = ThreadPoolExecutor(max_workers=self.concurrency)
+        pages_iter = self._aiter_pages(pages, executor)
+        try:
+            while True:
+                try:
+                    yield loop.run_until_complete(pages_iter.__anext__())
+                except StopAsyncIteration:
+                    break
+        finally:
+            try:
+                loop.run_until_complete(pages_iter.aclose())
+            except RuntimeError:
+                # Генератор прерван посреди работы (например, Ctrl+C)
+                pass
+            loop.run_until_complete(self._cancel_pending_tasks())
+            loop.close()
+            executor.shutdown(wait=True, cancel_futures=True)
+    
+    @staticmethod
+    async def _cancel_pending_tasks():
+        """Отменяет и дожидается все оставшиеся задачи event loop"""
+        import asyncio
+        
+        pending = [task for task in asyncio.all_tasks() if task is not asyncio.current_task()]
+        for task in pending:
+            task.cancel()
+        await asyncio.gather(*pending, return_exceptions=True)
+    
+    async def _aiter_pages(self, pages: Iterable[int], executor: ThreadPoolExecutor):
+        """Держит в полете не более concurrency запросов и отдает результаты по порядку"""
+        import asyncio
+        
+        loop = asyncio.get_running_loop()
+        semaphore = asyncio.Semaphore(self.concurrency)
+        
+        async def fetch(page: int):
+            async with semaphore:
+                await self.rate_limiter.acquire_async()
+                return await loop.run_in_executor(executor, self.fetch_page, page)
+        
+        # Окно упорядоченных задач: ждем голову очереди, остальные продолжают работу
+        window = deque()
+        pages_iter = iter(pages)
+        try:
+            for page in pages_iter:
+                window.append((page, asyncio.ensure_future(fetch(page))))
+                if len(window) >= self.concurrency * 2:
+                    head_page, head_task = window.popleft()
+                    yield head_page, await head_task
+            while window:
+                head_page, head_task = window.popleft()
+                yield head_page, await head_task
+        finally:
+            for _, task in window:
+                task.cancel()
+            await asyncio.gather(*(task for _, task in window), return_exceptions=True)
+    
+    def _extract_page(self, page_data: Dict[str, Any]) -> tuple[List[Dict[str, Any]], List[Dict[str, Any]]]:
+        """
+        Извлекает основные данные и аватары со страницы за один проход:
+        то же, что extract_influencer_data + extract_avatar_data, но user
+        берется из записи один раз и без лишних вызовов методов на строку.
+        """
+        rows = []
+        avatars = []
+        for item in page_data.get('data', []):
+            get = item.get
+            user = get('user', {})
+            username = user.get('username', '')
+            rows.append({
+                'rank': get('rank', 0),
+                'username': username,
+                'followerCount': user.get('followerCount', 0),
+                'score': round(get('score', 0), 2),
+                'signalScore': round(get('signalScore', 0), 2),
+                'noisePoints': round(get('noisePoints', 0), 2),
+                'totalEngagement': get('totalEngagement', 0),
+                'engagementRate': get('engagementRate', 0),
+                'averageEngagementPerPost': get('averageEngagementPerPost', 0)
+            })
+            avatars.append({
+                'username': username,
+                'avatar': user.get('avatar', ''),
+                'name': user.get('name', '')
+            })
+        return rows, avatars
+    
+    def iter_page_rows(self, pages: Iterable[int], journal: Optional[PageJournal] = None) -> Iterator[Tuple[int, List[Dict[str, Any]], List[Dict[str, Any]]]]:
+        """
+        Потоковый конвейер: загрузка -> извлечение -> (журнал).
+        Возвращает (страница, данные, аватары) в порядке страниц, не накапливая их в памяти.
+        Страницы, которые не удалось получить, попадают в self.failed_pages.
+        """
+        metrics = self.metrics
+        for page, page_data in self.iter_pages(pages):
+            self.log_progress(f"Обработка страницы {page}/{self.total_pages}...")
             
             if page_data is None:
-                print(f"Пропускаем страницу {page} из-за ошибки")
+                self.log_progress(f"Страница {page} не получена, повторим в конце")
+                self.failed_pages.append(page)
+                metrics.inc('xeet_pages_total', result='failed')
                 continue
             
-            # Извлекаем список инфлюенсеров
-            influencers = page_data.get('data', [])
+            if not page_data.get('data'):
+                self.log_progress(f"Страница {page} не содержит данных")
+                metrics.inc('xeet_pages_total', result='empty')
+                continue
             
-            if not influencers:
-                print(f"Страница {page} не содержит данных")
+            started = time.perf_counter()
+            rows, avatars = self._extract_page(page_data)
+            extracted = time.perf_counter()
+            if journal is not None:
+                journal.append(page, rows, avatars)
+            journaled = time.perf_counter()
+            metrics.observe('xeet_phase_seconds', extracted - started, phase='extract')
+            metrics.observe('xeet_phase_seconds', journaled - extracted, phase='journal')
+            metrics.inc('xeet_pages_total', result='ok')
+            metrics.inc('xeet_rows_total', len(rows))
+            metrics.event('page', page=page, rows=len(rows),
+                          extract_seconds=round(extracted - started, 6),
+                          journal_seconds=round(journaled - extracted, 6))
+            self.log_progress(f"Страница {page}: получено {len(rows)} записей")
+            yield page, rows, avatars
+    
+    def iter_all_page_rows(self, journal: Optional[PageJournal] = None,
+                           pages: Optional[Iterable[int]] = None) -> Iterator[Tuple[int, List[Dict[str, Any]], List[Dict[str, Any]]]]:
+        """
+        Обходит все страницы (или только pages) кроме уже записанных в журнал, затем
+        делает финальный проход по страницам, которые не удалось получить.
+        Страницы повторного прохода идут после остальных, т.е. не по порядку.
+        """
+        self.failed_pages = []
+        done_pages = journal.pages if journal is not None else set()
+        if pages is None:
+            pages = range(1, self.total_pages + 1)
+        pages = [page for page in pages if page not in done_pages]
+        
+        yield from self.iter_page_rows(pages, journal)
+        
+        # Финальный проход: повторно запрашиваем страницы, которые не удалось получить
+        if self.failed_pages:
+            print(f"Повторная загрузка {len(self.failed_pages)} страниц: {self.failed_pages}")
+            retry_pages, self.failed_pages = self.failed_pages, []
+            yield from self.iter_page_rows(retry_pages, journal)
+        
+        if self.failed_pages:
+            print(f"⚠️ Не удалось получить страницы: {self.failed_pages}")
+    
+    def parse_all_pages(self, journal: Optional[PageJournal] = None) -> tuple[List[Dict[str, Any]], List[Dict[str, Any]]]:
+        """
+        Парсит все страницы и возвращает кортеж (основные данные, данные аватаров).
+        Держит все данные в памяти; для больших лидербордов используйте scrape_to_csv.
+        При shards > 1 страницы загружаются процессами-шардами (см. scrape_shards).
+        """
+        if self.shards > 1:
+            journals = self.scrape_shards(self._last_updated or '')
+            all_data = []
+            all_avatars = []
+            try:
+                for rows, avatars in self.iter_merged_pages(journals):
+                    all_data.extend(rows)
+                    all_avatars.extend(avatars)
+            finally:
+                for shard_journal in journals:
+                    shard_journal.remove()
+            return all_data, all_avatars
+        
+        pages_rows = {page: (rows, avatars) for page, rows, avatars in self.iter_all_page_rows(journal)}
+        
+        # Итоговые данные собираются по порядку страниц (из журнала, если он есть)
+        blocks = journal.iter_pages() if journal is not None else (pages_rows[page] for page in sorted(pages_rows))
+        all_data = []
+        all_avatars = []
+        for rows, avatars in blocks:
+            all_data.extend(rows)
+            all_avatars.extend(avatars)
+        
+        return all_data, all_avatars
+    
+    def scrape_to_csv(self, journal: PageJournal) -> int:
+        """
+        Парсит все страницы в журнал, затем потоково собирает из него оба CSV файла.
+        Память не зависит от размера лидерборда: в ней только текущая страница
+        и индекс смещений журнала. Возвращает количество записанных записей.
+        """
+        with self.metrics.phase('scrape'):
+            for _ in self.iter_all_page_rows(journal):
+                pass
+        
+        if not journal.pages:
+            print("Не удалось получить данные")
+            return 0
+        
+        with self.metrics.phase('write'):
+            return self.write_csv_files(journal.iter_pages())
+    
+    def shard_journal_file(self, shard: int) -> str:
+        """Журнал шарда: xeet_signals_journal.jsonl -> xeet_signals_journal.shard0.jsonl"""
+        base, ext = os.path.splitext(self.journal_file)
+        return f"{base}.shard{shard}{ext}"
+    
+    def shard_options(self, shard: int, shards: int, last_updated: str) -> Dict[str, Any]:
+        """
+        Параметры процесса-шарда. Шард получает каждую shards-ю страницу
+        и свой прокси / локальный адрес; ограничитель частоты общий (см. scrape_shards).
+        """
+        return {
+            'tournament_type': self.tournament_type,
+            'config': dict(self.config, journal_file=self.shard_journal_file(shard)),
+            'base_url': self.base_url,
+            'concurrency': self.concurrency,
+            'max_retries': self.max_retries,
+            'backoff_base': self.backoff_base,
+            'quiet': self.quiet,
+            'http_cache': self.use_http_cache,
+            'http_cache_size': self.http_cache_size,
+            'proxies': [self.proxies[shard % len(self.proxies)]] if self.proxies else None,
+            'source_addresses': ([self.source_addresses[shard % len(self.source_addresses)]]
+                                 if self.source_addresses else None),
+            'limit': self.limit,
+            'total_pages': self.total_pages,
+            'pages': list(range(shard + 1, self.total_pages + 1, shards)),
+            'last_updated': last_updated,
+        }
+    
+    def scrape_shards(self, last_updated: str) -> List[PageJournal]:
+        """
+        Загружает страницы в shards процессах (JSON разбор и извлечение не делят
+        один GIL). Каждый шард пишет свой журнал, который продолжается после падения
+        так же, как обычный. Возвращает журналы шардов для iter_merged_pages.
+        Все шарды берут токены из одного SharedTokenBucket: если ограничитель парсера
+        уже общий (например, у оркестратора), то из него же, иначе - из копии,
+        чья итоговая частота возвращается в ограничитель парсера.
+        """
+        shards = max(1, min(self.shards, self.total_pages))
+        options = [self.shard_options(shard, shards, last_updated) for shard in range(shards)]
+        self.failed_pages = []
+        
+        limiter = self.rate_limiter
+        if not isinstance(limiter, SharedTokenBucket):
+            limiter = SharedTokenBucket.from_bucket(self.rate_limiter, capacity=self.concurrency * shards)
+        
+        with self.metrics.phase('scrape', shards=shards):
+            context = multiprocessing.get_context('spawn')
+            with ProcessPoolExecutor(max_workers=shards, mp_context=context,
+                                     initializer=_init_shard, initargs=(limiter,)) as executor:
+                for result in executor.map(scrape_shard, options):
+                    self.failed_pages.extend(result['failed_pages'])
+                    self.metrics.merge(result['metrics'])
+        if limiter is not self.rate_limiter and isinstance(self.rate_limiter, AdaptiveTokenBucket):
+            self.rate_limiter._set_rate(limiter.rate)
+        self.failed_pages.sort()
+        if self.failed_pages:
+            print(f"⚠️ Не удалось получить страницы: {self.failed_pages}")
+        
+        journals = []
+        for shard in range(shards):
+            journal = PageJournal(self.shard_journal_file(shard))
+            journal.load()
+            journals.append(journal)
+        return journals
+    
+    @staticmethod
+    def iter_merged_pages(journals: List[PageJournal]) -> Iterator[Tuple[List[Dict[str, Any]], List[Dict[str, Any]]]]:
+        """
+        K-way слияние журналов шардов по номеру страницы, т.е. в порядке рейтинга.
+        Страница, попавшая в несколько журналов (после смены числа шардов), берется один раз.
+        """
+        previous = None
+        for page, rows, avatars in heapq.merge(*(journal.iter_entries() for journal in journals),
+                                               key=itemgetter(0)):
+            if page == previous:
+                continue
+            previous = page
+            yield rows, avatars
+    
+    def scrape_sharded_to_csv(self, last_updated: str) -> Tuple[int, List[PageJournal]]:
+        """
+        Шардированный вариант scrape_to_csv: шарды пишут свои журналы, CSV
+        собираются их слиянием. Возвращает (число записей, журналы шардов).
+        """
+        journals = self.scrape_shards(last_updated)
+        try:
+            if not any(journal.pages for journal in journals):
+                print("Не удалось получить данные")
+                return 0, journals
+            with self.metrics.phase('write'):
+                return self.write_csv_files(self.iter_merged_pages(journals)), journals
+        finally:
+            for journal in journals:
+                journal.close()
+    
+    def write_csv_files(self, blocks: Iterable[Tuple[List[Dict[str, Any]], List[Dict[str, Any]]]]) -> int:
+        """
+        Потоково пишет блоки (данные, аватары) в CSV файлы через временные файлы,
+        а в колоночном режиме - еще и в Arrow файл. Аватары идут в хранилище
+        профилей (или сразу в avatars CSV, если оно отключено, см. enter_avatars_writer).
+        """
+        try:
+            with ExitStack() as stack:
+                stats_writer = stack.enter_context(AtomicCSVWriter(self.csv_file, self.STATS_FIELDS))
+                avatars_writer = self.enter_avatars_writer(stack)
+                arrow_writer = stack.enter_context(ArrowStatsWriter(self.arrow_file)) if self.columnar else None
+                for rows, avatars in blocks:
+                    stats_writer.writerows(rows)
+                    avatars_writer.writerows(avatars)
+                    if arrow_writer is not None:
+                        arrow_writer.writerows(rows)
+                if self.failed_pages:
+                    # CSV с пропущенными страницами не должны заменять предыдущие полные
+                    for writer in (stats_writer, avatars_writer, arrow_writer):
+                        if writer is not None:
+                            writer.discard()
+        except Exception as e:
+            print(f"Ошибка при сохранении файлов: {e}")
+            return 0
+        
+        if self.failed_pages:
+            print(f"⚠️ Страницы {self.failed_pages} не получены, предыдущие файлы оставлены без изменений "
+                  f"(загруженные страницы сохранены в журнале)")
+            return stats_writer.count
+        
+        print(f"Данные успешно сохранены в файл {self.csv_file}")
+        if self.profiles:
+            self.export_avatars(avatars_writer)
+        else:
+            print(f"Данные аватаров успешно сохранены в файл {self.avatars_file}")
+        if self.columnar:
+            print(f"Колоночные данные сохранены в файл {self.arrow_file}")
+        print(f"Всего записей: {stats_writer.count}")
+        return stats_writer.count
+    
+    def enter_avatars_writer(self, stack: ExitStack):
+        """
+        Открывает в stack приемник строк аватаров. С хранилищем профилей это
+        TournamentProfileWriter: в хранилище попадают только изменения, а avatars CSV
+        потом один раз выгружается из него (export_avatars). Без хранилища - avatars CSV.
+        """
+        if self.profiles:
+            store = stack.enter_context(ProfileStore(self.profiles_file))
+            return stack.enter_context(store.tournament_writer(self.tournament_type))
+        return stack.enter_context(AtomicCSVWriter(self.avatars_file, self.AVATAR_FIELDS))
+    
+    def export_avatars(self, writer: TournamentProfileWriter):
+        """
+        Выгружает avatars CSV турнира из хранилища профилей, если изменился состав
+        турнира или профили его авторов, и обновляет устаревшие CSV других турниров.
+        """
+        try:
+            with self.metrics.phase('profiles'):
+                with ProfileStore(self.profiles_file) as store:
+                    if writer.members_changed or not store.export_is_current(self.tournament_type, self.avatars_file):
+                        total = store.export_avatars_csv(self.tournament_type, self.avatars_file)
+                        print(f"Данные аватаров выгружены из {self.profiles_file} в файл {self.avatars_file} "
+                              f"({total} записей)")
+                    else:
+                        print(f"Аватары не изменились, файл {self.avatars_file} не перезаписывается")
+                    refreshed = store.refresh_exports(exclude=[self.tournament_type])
+                    version = store.current_version()
+            print(f"Профилей изменено: {writer.changed} (версия {version}, {self.profiles_file})")
+            if refreshed:
+                print(f"Перевыгружены avatars CSV турниров с изменившимися профилями: {', '.join(refreshed)}")
+        except Exception as e:
+            print(f"Ошибка при выгрузке аватаров из хранилища профилей: {e}")
+    
+    def load_snapshot(self) -> Dict[int, Tuple[Dict[str, str], Dict[str, str]]]:
+        """
+        Загружает предыдущий снимок из CSV файлов: rank -> (основные данные, аватар).
+        Файл аватаров не содержит rank, его строки идут в том же порядке, что и в основном файле.
+        """
+        if not (os.path.exists(self.csv_file) and os.path.exists(self.avatars_file)):
+            return {}
+        
+        try:
+            with open(self.csv_file, 'r', newline='', encoding='utf-8') as stats_file, \
+                 open(self.avatars_file, 'r', newline='', encoding='utf-8') as avatars_file:
+                return {int(row['rank']): (row, avatar)
+                        for row, avatar in zip(csv.DictReader(stats_file), csv.DictReader(avatars_file))}
+        except Exception as e:
+            print(f"Ошибка при загрузке предыдущего снимка: {e}")
+            return {}
+    
+    @staticmethod
+    def _as_csv_row(row: Dict[str, Any]) -> Dict[str, str]:
+        """Приводит запись к виду, в котором она читается из CSV"""
+        return {key: str(value) for key, value in row.items()}
+    
+    def parse_incremental(self, snapshot: Dict[int, Tuple[Dict[str, str], Dict[str, str]]]) -> Tuple[Dict[int, Tuple[Dict[str, Any], Dict[str, Any]]], Optional[int]]:
+        """
+        Обходит страницы по порядку и сравнивает их с предыдущим снимком.
+        Останавливается, когда stop_after_unchanged страниц подряд совпали со снимком.
+        Возвращает (измененные строки rank -> (данные, аватар), последний rank лидерборда).
+        Если обход остановился раньше, конец лидерборда берется из пагинации API
+        или из последней страницы total_pages (она же сравнивается со снимком);
+        при пропущенных страницах он неизвестен.
+        """
+        changes = {}
+        unchanged_streak = 0
+        self.failed_pages = []
+        reached_end = True
+        last_rank = 0
+        
+        def compare_page(page_data: Dict[str, Any]) -> bool:
+            """Запоминает отличающиеся строки, возвращает True если страница не изменилась"""
+            nonlocal last_rank
+            page_unchanged = True
+            rows, avatars = self._extract_page(page_data)
+            for row, avatar in zip(rows, avatars):
+                last_rank = max(last_rank, row['rank'])
+                previous = snapshot.get(row['rank'])
+                if previous is None or previous != (self._as_csv_row(row), self._as_csv_row(avatar)):
+                    changes[row['rank']] = (row, avatar)
+                    page_unchanged = False
+            return page_unchanged
+        
+        for page, page_data in self.iter_pages(range(1, self.total_pages + 1)):
+            if page_data is None:
+                self.log_progress(f"Страница {page} не получена, повторим в конце")
+                self.failed_pages.append(page)
+                self.metrics.inc('xeet_pages_total', result='failed')
+                unchanged_streak = 0
                 continue
             
-            # Обрабатываем каждого инфлюенсера
-            for influencer in influencers:
-                extracted_data = self.extract_influencer_data(influencer)
-                avatar_data = self.extract_avatar_data(influencer)
-                all_data.append(extracted_data)
-                all_avatars.append(avatar_data)
+            if not page_data.get('data'):
+                self.log_progress(f"Страница {page} не содержит данных")
+                self.metrics.inc('xeet_pages_total', result='empty')
+                break
             
-            print(f"Страница {page}: получено {len(influencers)} записей")
+            if compare_page(page_data):
+                unchanged_streak += 1
+            else:
+                unchanged_streak = 0
+            self.metrics.inc('xeet_pages_total', result='ok')
+            self.log_progress(f"Страница {page}/{self.total_pages}: изменено записей всего {len(changes)}")
             
-            # Задержка между запросами
-            time.sleep(0.5)
+            if unchanged_streak >= self.stop_after_unchanged and page < self.total_pages:
+                print(f"✅ {unchanged_streak} страниц подряд совпали со снимком, "
+                      f"остальные {self.total_pages - page} страниц пропускаем")
+                reached_end = False
+                break
         
-        return all_data, all_avatars
+        if self.failed_pages:
+            print(f"Повторная загрузка {len(self.failed_pages)} страниц: {self.failed_pages}")
+            retry_pages, self.failed_pages = self.failed_pages, []
+            for page, page_data in self.iter_pages(retry_pages):
+                if page_data is None:
+                    self.failed_pages.append(page)
+                elif page_data.get('data'):
+                    compare_page(page_data)
+        
+        if self.failed_pages:
+            print(f"⚠️ Не удалось получить страницы: {self.failed_pages}")
+        
+        if self.failed_pages:
+            return changes, None
+        if reached_end:
+            return changes, last_rank or None
+        
+        # Обход остановился раньше: конец лидерборда нужен, чтобы удалить строки снимка
+        # за ним (лидерборд мог сократиться, а первые страницы при этом не изменились)
+        if self.total_records is not None:
+            return changes, self.total_records
+        self.rate_limiter.acquire()
+        page_data = self.fetch_page(self.total_pages)
+        if not page_data or not page_data.get('data'):
+            print(f"Не удалось получить последнюю страницу {self.total_pages}, "
+                  f"строки в конце снимка не проверяются")
+            return changes, None
+        compare_page(page_data)
+        return changes, last_rank
+    
+    def apply_changes_to_csv(self, changes: Dict[int, Tuple[Dict[str, Any], Dict[str, Any]]],
+                             last_rank: Optional[int] = None) -> int:
+        """
+        Переписывает CSV файлы, подставляя только измененные строки.
+        last_rank - последний rank лидерборда, если он известен (строки ниже удаляются).
+        Возвращает итоговое число записей.
+        """
+        pending = dict(changes)
+        
+        with ExitStack() as stack:
+            stats_in = stack.enter_context(open(self.csv_file, 'r', newline='', encoding='utf-8'))
+            avatars_in = stack.enter_context(open(self.avatars_file, 'r', newline='', encoding='utf-8'))
+            stats_writer = stack.enter_context(AtomicCSVWriter(self.csv_file, self.STATS_FIELDS))
+            avatars_writer = self.enter_avatars_writer(stack)
+            for row, avatar in zip(csv.DictReader(stats_in), csv.DictReader(avatars_in)):
+                rank = int(row['rank'])
+                if last_rank is not None and rank > last_rank:
+                    break
+                row, avatar = pending.pop(rank, (row, avatar))
+                stats_writer.writerow(row)
+                avatars_writer.writerow(avatar)
+            
+            # Новые ранги, которых не было в предыдущем снимке
+            for rank in sorted(pending):
+                row, avatar = pending[rank]
+                stats_writer.writerow(row)
+                avatars_writer.writerow(avatar)
+        
+        total = stats_writer.count
+        print(f"Обновлено записей: {len(changes)}, всего записей: {total}")
+        if self.profiles:
+            self.export_avatars(avatars_writer)
+        
+        if self.columnar:
+            convert_csv_to_arrow(self.csv_file, self.arrow_file)
+            print(f"Колоночные данные обновлены: {self.arrow_file}")
+        return total
     
     def save_to_csv(self, data: List[Dict[str, Any]], filename: str = "xeet_crypto_creators_stats.csv"):
         """Сохраняет данные в CSV файл"""
@@ -201,15 +1246,10 @@ class XeetLeaderboardParser:
             print("Нет данных для сохранения")
             return
         
-        fieldnames = [
-            'rank', 'username', 'followerCount', 'score', 'signalScore',
-            'noisePoints', 'totalEngagement', 'engagementRate', 'averageEngagementPerPost'
-        ]
+        fieldnames = self.STATS_FIELDS
         
         try:
-            with open(filename, 'w', newline='', encoding='utf-8') as csvfile:
-                writer = csv.DictWriter(csvfile, fieldnames=fieldnames)
-                writer.writeheader()
+            with AtomicCSVWriter(filename, fieldnames) as writer:
                 writer.writerows(data)
             
             print(f"Данные успешно сохранены в файл {filename}")
@@ -224,12 +1264,10 @@ class XeetLeaderboardParser:
             print("Нет данных аватаров для сохранения")
             return
         
-        fieldnames = ['username', 'avatar', 'name']
+        fieldnames = self.AVATAR_FIELDS
         
         try:
-            with open(filename, 'w', newline='', encoding='utf-8') as csvfile:
-                writer = csv.DictWriter(csvfile, fieldnames=fieldnames)
-                writer.writeheader()
+            with AtomicCSVWriter(filename, fieldnames) as writer:
                 writer.writerows(avatar_data)
             
             print(f"Данные аватаров успешно сохранены в файл {filename}")
@@ -244,19 +1282,35 @@ class XeetLeaderboardParser:
             'lastUpdated': last_updated,
             'totalRecords': total_records,
             'parsedAt': datetime.now().isoformat(),
-            'totalPages': self.total_pages
+            'totalPages': self.total_pages,
+            'limit': self.limit
         }
         self.save_metadata(metadata)
         print(f"Метаданные сохранены: {last_updated}")
     
-    def run(self):
-        """Основной метод для запуска парсера"""
+    def save_snapshot_to_history(self, last_updated: str):
+        """Добавляет сохраненный CSV как снимок в историю"""
+        try:
+            with SnapshotStore(self.history_file) as store:
+                snapshot_id = store.add_snapshot_from_csv(self.tournament_type, last_updated, self.csv_file)
+            if snapshot_id is None:
+                print(f"Снимок {last_updated} уже есть в истории {self.history_file}")
+            else:
+                print(f"Снимок {last_updated} добавлен в историю {self.history_file}")
+        except Exception as e:
+            print(f"Ошибка при сохранении снимка в историю: {e}")
+    
+    def run(self, force: bool = False):
+        """
+        Основной метод для запуска парсера.
+        force=True пропускает проверку актуальности (например, если ее уже выполнил оркестратор).
+        """
         print(f"Начинаем парсинг лидерборда Xeet.ai ({self.tournament_type.upper()})...")
         print(f"Всего страниц для обработки: {self.total_pages}")
         print("-" * 50)
         
         # Проверяем, нужно ли обновление
-        if not self.check_if_update_needed():
+        if not force and not self.check_if_update_needed():
             print("\n" + "="*50)
             print("ДАННЫЕ АКТУАЛЬНЫ")
             print("="*50)
@@ -269,41 +1323,202 @@ class XeetLeaderboardParser:
         print("НАЧИНАЕМ ОБНОВЛЕНИЕ ДАННЫХ")
         print("="*50)
         
-        # Получаем дату последнего обновления для сохранения
+        # Дату последнего обновления уже получила проверка актуальности (в том числе
+        # выполненная оркестратором); следующий запуск запросит ее заново
         last_updated = self.get_last_updated_from_api()
+        self._last_updated = None
+        
+        # Определяем реальный размер лидерборда вместо заданного в конфиге
+        if self.discover:
+            limit, total_pages = self.limit, self.total_pages
+            try:
+                with self.metrics.phase('discover'):
+                    self.discover_total_pages()
+            except Exception as e:
+                # discover_page_size мог уже увеличить limit, а число страниц из конфига
+                # посчитано для прежнего размера страницы - возвращаем оба значения
+                self.limit, self.total_pages = limit, total_pages
+                self.total_records = None
+                print(f"Не удалось определить количество страниц ({e}), используем {self.total_pages} "
+                      f"(по {self.limit} записей)")
         
-        # Парсим все страницы
-        all_data, all_avatars = self.parse_all_pages()
+        # Инкрементальный режим: сравниваем со снимком и пишем только изменения
+        if self.incremental:
+            snapshot = self.load_snapshot()
+            if snapshot:
+                self.run_incremental(snapshot, last_updated)
+                return
+            print("Предыдущий снимок не найден. Выполняем полный парсинг.")
         
-        if all_data:
-            # Сохраняем основные данные в CSV
-            self.save_to_csv(all_data, self.csv_file)
+        if self.shards > 1:
+            # Страницы делятся между процессами, у каждого свой журнал
+            total_records, journals = self.scrape_sharded_to_csv(last_updated)
+        else:
+            # Журнал загруженных страниц: после падения парсинг продолжится с того же места
+            journal = PageJournal(self.journal_file)
+            journal.open(last_updated, self.total_pages, self.limit)
+            journals = [journal]
             
-            # Сохраняем данные аватаров в отдельный файл
-            self.save_avatars_to_csv(all_avatars, self.avatars_file)
+            # Парсим все страницы, потоково записывая их в журнал и CSV
+            try:
+                total_records = self.scrape_to_csv(journal)
+            finally:
+                journal.close()
+        
+        if total_records:
+            # Сохраняем метаданные только если получены все страницы,
+            # иначе следующий запуск повторит парсинг
+            if self.failed_pages:
+                print(f"⚠️ Данные неполные ({len(self.failed_pages)} страниц пропущено), "
+                      f"метаданные не обновлены")
+            elif last_updated:
+                self.save_metadata_after_parsing(last_updated, total_records)
+                if self.history:
+                    with self.metrics.phase('history'):
+                        self.save_snapshot_to_history(last_updated)
             
-            # Сохраняем метаданные
-            if last_updated:
-                self.save_metadata_after_parsing(last_updated, len(all_data))
+            # Журналы больше не нужны, когда все страницы сохранены
+            if not self.failed_pages:
+                for journal in journals:
+                    journal.remove()
+    
+    def run_incremental(self, snapshot: Dict[int, Tuple[Dict[str, str], Dict[str, str]]], last_updated: str):
+        """Инкрементальное обновление CSV файлов относительно предыдущего снимка"""
+        with self.metrics.phase('scrape', incremental=True):
+            changes, last_rank = self.parse_incremental(snapshot)
+        
+        if self.failed_pages:
+            # Изменения с полученных страниц вместе со старыми строками неполученных дали бы
+            # смешанный снимок (например, одни и те же авторы на двух позициях)
+            print(f"⚠️ Данные неполные ({len(self.failed_pages)} страниц пропущено), "
+                  f"CSV файлы и метаданные не обновлены")
+            return
+        
+        if changes or (last_rank is not None and last_rank < max(snapshot)):
+            with self.metrics.phase('write', incremental=True):
+                total_records = self.apply_changes_to_csv(changes, last_rank)
         else:
-            print("Не удалось получить данные")
+            print("Изменений нет, CSV файлы не перезаписываются")
+            total_records = len(snapshot)
+        
+        if last_updated:
+            self.save_metadata_after_parsing(last_updated, total_records)
+            if self.history:
+                with self.metrics.phase('history'):
+                    self.save_snapshot_to_history(last_updated)
+
+# Общий ограничитель частоты процесса-шарда, передается при запуске процесса
+_shard_rate_limiter: Optional[SharedTokenBucket] = None
+
+def _init_shard(rate_limiter: SharedTokenBucket):
+    """initializer пула шардов: запоминает общий ограничитель частоты"""
+    global _shard_rate_limiter
+    _shard_rate_limiter = rate_limiter
+
+def scrape_shard(options: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Процесс-шард (см. XeetLeaderboardParser.scrape_shards): свой парсер и сессия,
+    ограничитель частоты общий для всех шардов; загруженные страницы пишутся в журнал шарда.
+    Возвращает ненайденные страницы и снимок метрик.
+    """
+    parser = XeetLeaderboardParser(options['tournament_type'], concurrency=options['concurrency'],
+                                   base_url=options['base_url'], max_retries=options['max_retries'],
+                                   config=options['config'], discover=False,
+                                   rate_limiter=_shard_rate_limiter,
+                                   history=False, profiles=False, quiet=options['quiet'],
+                                   http_cache=options['http_cache'],
+                                   http_cache_size=options['http_cache_size'],
+                                   proxies=options['proxies'], source_addresses=options['source_addresses'])
+    parser.limit = options['limit']
+    parser.total_pages = options['total_pages']
+    parser.backoff_base = options['backoff_base']
+    
+    journal = PageJournal(parser.journal_file)
+    journal.open(options['last_updated'], parser.total_pages, parser.limit)
+    try:
+        for _ in parser.iter_all_page_rows(journal, options['pages']):
+            pass
+    finally:
+        journal.close()
+        parser.close()
+    return {'failed_pages': parser.failed_pages, 'metrics': parser.metrics.export()}
 
 def main():
     """Точка входа в программу"""
-    import sys
-    
-    # Check command line arguments
-    tournament_type = "leagues"  # default
-    if len(sys.argv) > 1:
-        tournament_type = sys.argv[1].lower()
-        if tournament_type not in ["leagues", "signals"]:
-            print("Error: tournament_type must be 'leagues' or 'signals'")
-            print("Usage: python xeet_leaderboard_parser.py [leagues|signals]")
-            sys.exit(1)
-    
-    print(f"Starting parser for {tournament_type.upper()} tournament...")
-    parser = XeetLeaderboardParser(tournament_type)
-    parser.run()
+    import argparse
+    
+    arg_parser = argparse.ArgumentParser(description="Parser for Xeet.ai leaderboards")
+    arg_parser.add_argument("tournament_types", nargs="*", default=["leagues"],
+                            type=str.lower, choices=["leagues", "signals"], metavar="tournament_type",
+                            help="leagues and/or signals (default: leagues)")
+    arg_parser.add_argument("--concurrency", type=int, default=1,
+                            help="max page requests in flight (default: 1, sequential)")
+    arg_parser.add_argument("--rate", type=float, default=None,
+                            help="starting requests per second (default: 2)")
+    arg_parser.add_argument("--max-rate", type=float, default=None,
+                            help="let the rate ramp up to this many requests per second")
+    arg_parser.add_argument("--max-retries", type=int, default=5,
+                            help="retries per request with exponential backoff (default: 5)")
+    arg_parser.add_argument("--incremental", action="store_true",
+                            help="compare with the previous CSVs and rewrite only changed rows")
+    arg_parser.add_argument("--stop-after-unchanged", type=int, default=3,
+                            help="in incremental mode, stop after N unchanged pages in a row (default: 3)")
+    arg_parser.add_argument("--no-discover", action="store_true",
+                            help="use the configured page count instead of probing the API")
+    arg_parser.add_argument("--max-limit", type=int, default=100,
+                            help="largest page size to try when discovering pages (default: 100)")
+    arg_parser.add_argument("--arrow", action="store_true",
+                            help="also write stats to a memory-mappable Arrow IPC file (requires pyarrow)")
+    arg_parser.add_argument("--no-history", action="store_true",
+                            help="do not append this scrape to the SQLite snapshot history")
+    arg_parser.add_argument("--no-profiles", action="store_true",
+                            help="do not update the shared deduplicated profile store")
+    arg_parser.add_argument("--base-url", default=None,
+                            help="override leaderboard API URL (e.g. local stub server)")
+    arg_parser.add_argument("--shards", type=int, default=1,
+                            help="split pages across N worker processes, each with its own connection pool")
+    arg_parser.add_argument("--proxy", action="append", default=None, dest="proxies",
+                            help="proxy URL; repeat to give each shard its own (round-robin)")
+    arg_parser.add_argument("--source-address", action="append", default=None, dest="source_addresses",
+                            help="local IP to connect from; repeat to give each shard its own (round-robin)")
+    arg_parser.add_argument("--no-http-cache", action="store_true",
+                            help="always download full pages instead of sending conditional requests")
+    arg_parser.add_argument("--http-cache-mb", type=int, default=256,
+                            help="size limit of the on-disk response cache in MB (default: 256)")
+    arg_parser.add_argument("--quiet", action="store_true",
+                            help="no per-page and per-retry console output")
+    arg_parser.add_argument("--metrics-file", default=None,
+                            help="append request/page/phase events to this JSON lines file")
+    arg_parser.add_argument("--metrics-port", type=int, default=None,
+                            help="serve Prometheus metrics on http://127.0.0.1:PORT/metrics during the run")
+    args = arg_parser.parse_args()
+    
+    metrics, metrics_server = create_metrics(args.metrics_file, args.metrics_port)
+    
+    # Турниры обрабатываются по очереди; запись потоковая, поэтому
+    # в памяти не накапливаются таблицы всех турниров
+    try:
+        for tournament_type in args.tournament_types:
+            print(f"Starting parser for {tournament_type.upper()} tournament...")
+            parser = XeetLeaderboardParser(tournament_type, concurrency=args.concurrency,
+                                           rate=args.rate, base_url=args.base_url,
+                                           max_rate=args.max_rate, max_retries=args.max_retries,
+                                           incremental=args.incremental,
+                                           stop_after_unchanged=args.stop_after_unchanged,
+                                           discover=not args.no_discover, max_limit=args.max_limit,
+                                           columnar=args.arrow, history=not args.no_history,
+                                           profiles=not args.no_profiles,
+                                           metrics=metrics, quiet=args.quiet,
+                                           http_cache=not args.no_http_cache,
+                                           http_cache_size=args.http_cache_mb * 2 ** 20,
+                                           shards=args.shards, proxies=args.proxies,
+                                           source_addresses=args.source_addresses)
+            with parser:
+                parser.run()
+    finally:
+        if metrics_server is not None:
+            metrics_server.stop()
+        metrics.close()
 
 if __name__ == "__main__":
     main()
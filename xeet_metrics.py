@@ -0,0 +1,266 @@
+import threading
+import time
+from contextlib import contextmanager
+from typing import List, Dict, Any, Optional, Tuple
+
+from xeet_json import dumps
+
+# Границы корзин гистограмм по умолчанию, в секундах
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+MetricKey = Tuple[str, Tuple[Tuple[str, str], ...]]
+
+
+def metric_key(name: str, labels: Dict[str, Any]) -> MetricKey:
+    return name, tuple(sorted((key, str(value)) for key, value in labels.items()))
+
+
+class Histogram:
+    """Гистограмма с фиксированными корзинами (накопительные счетчики как в Prometheus)"""
+
+    __slots__ = ('buckets', 'counts', 'sum', 'count')
+
+    def __init__(self, buckets: Tuple[float, ...] = DEFAULT_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float):
+        self.sum += value
+        self.count += 1
+        for index, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.counts[index] += 1
+                break
+
+    def quantile(self, fraction: float) -> Optional[float]:
+        """Оценка квантиля сверху: граница корзины, в которую он попал (None без наблюдений)"""
+        if not self.count:
+            return None
+        target = fraction * self.count
+        cumulative = 0
+        for bound, bucket_count in zip(self.buckets, self.counts):
+            cumulative += bucket_count
+            if cumulative >= target:
+                return bound
+        return float('inf')
+
+
+class JsonLinesSink:
+    """Пишет каждое событие отдельной JSON строкой в файл"""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._file = open(path, 'ab')
+        self._lock = threading.Lock()
+
+    def emit(self, event: Dict[str, Any]):
+        line = dumps(event) + b'\n'
+        with self._lock:
+            self._file.write(line)
+            self._file.flush()
+
+    def close(self):
+        self._file.close()
+
+
+class Metrics:
+    """
+    Счетчики, гистограммы и структурированные события для парсера и анализатора.
+
+    Счетчики и гистограммы всегда копятся в памяти (это дешево) и отдаются
+    в текстовом формате Prometheus через render_prometheus() или MetricsServer.
+    События (запрос, страница, фаза) уходят в подключенные sinks, например
+    JsonLinesSink; без sinks события не формируются вовсе.
+    """
+
+    def __init__(self, sinks: Optional[List[Any]] = None, **labels):
+        self.sinks = list(sinks or [])
+        # Метки, добавляемые ко всем метрикам и событиям (например, tournament)
+        self.labels = labels
+        self._counters: Dict[MetricKey, float] = {}
+        self._histograms: Dict[MetricKey, Histogram] = {}
+        self._lock = threading.Lock()
+
+    def child(self, **labels) -> 'Metrics':
+        """Те же хранилища и sinks, но с дополнительными метками"""
+        child = Metrics.__new__(Metrics)
+        child.sinks = self.sinks
+        child.labels = dict(self.labels, **labels)
+        child._counters = self._counters
+        child._histograms = self._histograms
+        child._lock = self._lock
+        return child
+
+    def inc(self, name: str, value: float = 1, **labels):
+        key = metric_key(name, dict(self.labels, **labels))
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + value
+
+    def observe(self, name: str, value: float, **labels):
+        key = metric_key(name, dict(self.labels, **labels))
+        with self._lock:
+            histogram = self._histograms.get(key)
+            if histogram is None:
+                histogram = self._histograms[key] = Histogram()
+            histogram.observe(value)
+
+    def event(self, name: str, **fields):
+        if not self.sinks:
+            return
+        event = {'ts': time.time(), 'event': name}
+        event.update(self.labels)
+        event.update(fields)
+        for sink in self.sinks:
+            sink.emit(event)
+
+    @contextmanager
+    def phase(self, name: str, **fields):
+        """Замеряет фазу: гистограмма xeet_phase_seconds{phase=name} и событие phase"""
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = time.perf_counter() - started
+            self.observe('xeet_phase_seconds', elapsed, phase=name)
+            self.event('phase', phase=name, seconds=round(elapsed, 6), **fields)
+
+    def counter_value(self, name: str, **labels) -> float:
+        return self._counters.get(metric_key(name, dict(self.labels, **labels)), 0)
+
+    def counter_total(self, name: str) -> float:
+        """Сумма счетчика по всем значениям меток"""
+        with self._lock:
+            return sum(value for (key, _), value in self._counters.items() if key == name)
+
+    def quantile(self, name: str, fraction: float, **labels) -> Optional[float]:
+        histogram = self._histograms.get(metric_key(name, dict(self.labels, **labels)))
+        return histogram.quantile(fraction) if histogram is not None else None
+
+    def export(self) -> Dict[str, Any]:
+        """Снимок счетчиков и гистограмм, который можно передать из процесса-воркера"""
+        with self._lock:
+            return {
+                'counters': list(self._counters.items()),
+                'histograms': [(key, h.buckets, list(h.counts), h.sum, h.count)
+                               for key, h in self._histograms.items()],
+            }
+
+    def merge(self, snapshot: Dict[str, Any]):
+        """Добавляет снимок export() другого реестра (метки берутся из снимка как есть)"""
+        with self._lock:
+            for key, value in snapshot['counters']:
+                self._counters[key] = self._counters.get(key, 0) + value
+            for key, buckets, counts, total, count in snapshot['histograms']:
+                histogram = self._histograms.get(key)
+                if histogram is None:
+                    histogram = self._histograms[key] = Histogram(tuple(buckets))
+                histogram.counts = [a + b for a, b in zip(histogram.counts, counts)]
+                histogram.sum += total
+                histogram.count += count
+
+    def render_prometheus(self) -> str:
+        """Все метрики в текстовом формате Prometheus"""
+        def format_labels(labels, extra=()):
+            pairs = list(labels) + list(extra)
+            if not pairs:
+                return ''
+            return '{' + ','.join(f'{key}="{value}"' for key, value in pairs) + '}'
+
+        lines = []
+        with self._lock:
+            counters = sorted(self._counters.items())
+            histograms = sorted(self._histograms.items(), key=lambda item: item[0])
+            histograms = [(key, (h.buckets, list(h.counts), h.sum, h.count)) for key, h in histograms]
+
+        typed = set()
+        for (name, labels), value in counters:
+            if name not in typed:
+                lines.append(f'# TYPE {name} counter')
+                typed.add(name)
+            lines.append(f'{name}{format_labels(labels)} {value!r}')
+        for (name, labels), (buckets, counts, total, count) in histograms:
+            if name not in typed:
+                lines.append(f'# TYPE {name} histogram')
+                typed.add(name)
+            cumulative = 0
+            for bound, bucket_count in zip(buckets, counts):
+                cumulative += bucket_count
+                lines.append(f'{name}_bucket{format_labels(labels, [("le", f"{bound:g}")])} {cumulative}')
+            lines.append(f'{name}_bucket{format_labels(labels, [("le", "+Inf")])} {count}')
+            lines.append(f'{name}_sum{format_labels(labels)} {total:.6f}')
+            lines.append(f'{name}_count{format_labels(labels)} {count}')
+        return '\n'.join(lines) + '\n'
+
+    def close(self):
+        for sink in self.sinks:
+            sink.close()
+
+
+class MetricsServer:
+    """HTTP эндпоинт /metrics в текстовом формате Prometheus"""
+
+    def __init__(self, metrics: Metrics, host: str = "127.0.0.1", port: int = 9108):
+        # http.server импортируется только при запуске эндпоинта, а не при каждом импорте метрик
+        from http.server import ThreadingHTTPServer
+
+        self.metrics = metrics
+        self._server = ThreadingHTTPServer((host, port), self._make_handler())
+        self._server.daemon_threads = True
+        self._thread = None
+
+    @property
+    def url(self) -> str:
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}/metrics"
+
+    def _make_handler(self):
+        from http.server import BaseHTTPRequestHandler
+
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path.split('?')[0] != '/metrics':
+                    self.send_response(404)
+                    self.send_header('Content-Length', '0')
+                    self.end_headers()
+                    return
+                body = server.metrics.render_prometheus().encode('utf-8')
+                self.send_response(200)
+                self.send_header('Content-Type', 'text/plain; version=0.0.4; charset=utf-8')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        return Handler
+
+    def start(self):
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, exc_type, exc, tb):
+        self.stop()
+
+
+def create_metrics(metrics_file: Optional[str] = None, metrics_port: Optional[int] = None,
+                   **labels) -> Tuple[Metrics, Optional[MetricsServer]]:
+    """Метрики и (если задан порт) запущенный эндпоинт Prometheus для CLI"""
+    sinks = [JsonLinesSink(metrics_file)] if metrics_file else []
+    metrics = Metrics(sinks, **labels)
+    server = MetricsServer(metrics, port=metrics_port).start() if metrics_port else None
+    if server is not None:
+        print(f"Метрики Prometheus: {server.url}")
+    return metrics, server
@@ -0,0 +1,340 @@
+import heapq
+from typing import List, Dict, Any, Callable, Iterable, Tuple
+
+import numpy as np
+
+from xeet_stats import (NUMERIC_COLUMNS, STATS_COLUMNS, ROUNDED_COLUMNS, SUMMARY_COLUMNS,
+                        ENGAGEMENT_COLUMNS, DISTRIBUTION_COLUMNS, HISTOGRAM_BINS,
+                        distribution_values, valid_values)
+
+# Порция строк: колонка -> NumPy массив одинаковой длины
+Chunk = Dict[str, np.ndarray]
+
+
+class RunningMoments:
+    """
+    Количество, среднее, дисперсия (Welford), минимум и максимум без хранения значений.
+    Порции объединяются формулой Чана, поэтому цикл по строкам не нужен.
+    """
+
+    def __init__(self):
+        self.count = 0
+        self.mean = 0.0
+        self.m2 = 0.0
+        self.min = np.nan
+        self.max = np.nan
+
+    def add(self, values: np.ndarray):
+        values = valid_values(values).astype(np.float64, copy=False)
+        count = len(values)
+        if count == 0:
+            return
+        mean = float(values.mean())
+        m2 = float(((values - mean) ** 2).sum())
+        total = self.count + count
+        delta = mean - self.mean
+        self.mean += delta * count / total
+        self.m2 += m2 + delta * delta * self.count * count / total
+        self.count = total
+        self.min = float(values.min()) if np.isnan(self.min) else min(self.min, float(values.min()))
+        self.max = float(values.max()) if np.isnan(self.max) else max(self.max, float(values.max()))
+
+    @property
+    def std(self) -> float:
+        """Выборочное стандартное отклонение (ddof=1, как в pandas)"""
+        return float(np.sqrt(self.m2 / (self.count - 1))) if self.count > 1 else np.nan
+
+
+class TDigest:
+    """
+    Приближенные квантили в ограниченной памяти (merging t-digest).
+
+    Значения порции сливаются с центроидами за одну сортировку: точки
+    группируются по целой части функции масштаба k1, поэтому на хвостах
+    центроиды мелкие, а в середине крупные. Размер - около compression / 2 центроидов.
+    """
+
+    def __init__(self, compression: float = 400.0):
+        self.compression = compression
+        self.means = np.empty(0)
+        self.weights = np.empty(0)
+        self.min = np.nan
+        self.max = np.nan
+
+    @property
+    def count(self) -> float:
+        return float(self.weights.sum())
+
+    def add(self, values: np.ndarray):
+        values = valid_values(values).astype(np.float64, copy=False)
+        if len(values) == 0:
+            return
+        self.min = float(values.min()) if np.isnan(self.min) else min(self.min, float(values.min()))
+        self.max = float(values.max()) if np.isnan(self.max) else max(self.max, float(values.max()))
+
+        means = np.concatenate([self.means, values])
+        weights = np.concatenate([self.weights, np.ones(len(values))])
+        order = np.argsort(means, kind='stable')
+        means, weights = means[order], weights[order]
+
+        cumulative = np.cumsum(weights)
+        centers = (cumulative - weights / 2) / cumulative[-1]
+        scale = np.floor(self.compression / (2 * np.pi) * np.arcsin(2 * centers - 1))
+        starts = np.flatnonzero(np.r_[True, scale[1:] != scale[:-1]])
+        self.weights = np.add.reduceat(weights, starts)
+        self.means = np.add.reduceat(means * weights, starts) / self.weights
+
+    def quantile(self, fraction: float) -> float:
+        if len(self.weights) == 0:
+            return np.nan
+        if fraction <= 0:
+            return self.min
+        if fraction >= 1:
+            return self.max
+        total = self.weights.sum()
+        # Центроид отвечает середине своего веса; края интерполируем к min и max
+        positions = np.concatenate([[0.0], np.cumsum(self.weights) - self.weights / 2, [total]])
+        values = np.concatenate([[self.min], self.means, [self.max]])
+        return float(np.interp(fraction * total, positions, values))
+
+
+class StreamingTopK:
+    """
+    k строк с наибольшим значением колонки (куча размера k).
+    При равенстве выше стоит строка, встретившаяся раньше, как в nlargest;
+    если значений меньше k, список добивается строками с пропусками.
+    """
+
+    def __init__(self, column: str, k: int):
+        self.column = column
+        self.k = k
+        self._heap: List[Tuple[float, int, Dict[str, Any]]] = []
+        self._missing: List[Dict[str, Any]] = []
+
+    @staticmethod
+    def _row(chunk: Chunk, index: int) -> Dict[str, Any]:
+        return {name: values[index] for name, values in chunk.items()}
+
+    def add(self, chunk: Chunk, offset: int):
+        """offset - номер первой строки порции во всем наборе данных"""
+        values = chunk[self.column]
+        if values.dtype.kind == 'f':
+            missing = np.isnan(values)
+            if len(self._missing) < self.k and missing.any():
+                for index in np.flatnonzero(missing)[:self.k - len(self._missing)]:
+                    self._missing.append(self._row(chunk, index))
+            candidates = np.flatnonzero(~missing)
+        else:
+            candidates = np.arange(len(values))
+
+        # Кандидатами в порции могут быть только ее k лучших строк
+        if len(candidates) > self.k:
+            threshold = np.partition(values[candidates], len(candidates) - self.k)[len(candidates) - self.k]
+            candidates = candidates[values[candidates] >= threshold]
+
+        heap = self._heap
+        for index in candidates:
+            key = (float(values[index]), -(offset + int(index)))
+            if len(heap) < self.k:
+                heapq.heappush(heap, key + (self._row(chunk, index),))
+            elif key > heap[0][:2]:
+                heapq.heapreplace(heap, key + (self._row(chunk, index),))
+
+    def rows(self) -> List[Dict[str, Any]]:
+        """Строки по убыванию значения"""
+        top = [row for _, _, row in sorted(self._heap, key=lambda entry: entry[:2], reverse=True)]
+        return top + self._missing[:self.k - len(top)]
+
+
+class FixedBinHistogram:
+    """Гистограмма с заранее известным диапазоном: те же корзины, что у np.histogram(values, bins)"""
+
+    def __init__(self, bins: int, value_range: Tuple[float, float]):
+        self.bins = bins
+        self.range = value_range
+        self.counts = np.zeros(bins, dtype=np.int64)
+        self.edges = np.histogram_bin_edges(np.empty(0), bins=bins, range=value_range)
+
+    def add(self, values: np.ndarray):
+        counts, _ = np.histogram(valid_values(values), bins=self.bins, range=self.range)
+        self.counts += counts
+
+
+class CorrelationAccumulator:
+    """
+    Попарные корреляции Пирсона по порциям строк.
+
+    Для каждой пары колонок хранятся число общих значений, средние и
+    со-моменты, которые объединяются между порциями как в RunningMoments.
+    Порции без пропусков обрабатываются одним матричным умножением,
+    с пропусками - попарно по общим значениям (как pandas corr).
+    """
+
+    def __init__(self, size: int):
+        shape = (size, size)
+        self.size = size
+        self.count = np.zeros(shape)
+        self.mean_x = np.zeros(shape)
+        self.mean_y = np.zeros(shape)
+        self.comoment = np.zeros(shape)
+        self.m2_x = np.zeros(shape)
+        self.m2_y = np.zeros(shape)
+
+    def add(self, matrix: np.ndarray):
+        """matrix - колонки в строках (size x строк порции)"""
+        if np.isfinite(matrix).all():
+            count = matrix.shape[1]
+            if count == 0:
+                return
+            means = matrix.mean(axis=1)
+            centered = matrix - means[:, None]
+            comoment = centered @ centered.T
+            variances = np.diag(comoment)
+            self._merge(np.full((self.size, self.size), float(count)),
+                        np.repeat(means[:, None], self.size, axis=1),
+                        np.repeat(means[None, :], self.size, axis=0),
+                        comoment,
+                        np.repeat(variances[:, None], self.size, axis=1),
+                        np.repeat(variances[None, :], self.size, axis=0))
+            return
+
+        shape = (self.size, self.size)
+        count, mean_x, mean_y = np.zeros(shape), np.zeros(shape), np.zeros(shape)
+        comoment, m2_x, m2_y = np.zeros(shape), np.zeros(shape), np.zeros(shape)
+        finite = np.isfinite(matrix)
+        for i in range(self.size):
+            for j in range(i, self.size):
+                mask = finite[i] & finite[j]
+                n = int(mask.sum())
+                if n == 0:
+                    continue
+                x, y = matrix[i][mask], matrix[j][mask]
+                dx, dy = x - x.mean(), y - y.mean()
+                count[i, j] = count[j, i] = n
+                mean_x[i, j], mean_y[i, j] = x.mean(), y.mean()
+                mean_x[j, i], mean_y[j, i] = y.mean(), x.mean()
+                comoment[i, j] = comoment[j, i] = float(dx @ dy)
+                m2_x[i, j] = m2_y[j, i] = float(dx @ dx)
+                m2_y[i, j] = m2_x[j, i] = float(dy @ dy)
+        self._merge(count, mean_x, mean_y, comoment, m2_x, m2_y)
+
+    def _merge(self, count, mean_x, mean_y, comoment, m2_x, m2_y):
+        total = self.count + count
+        with np.errstate(invalid='ignore', divide='ignore'):
+            weight = np.where(total > 0, self.count * count / total, 0.0)
+            share = np.where(total > 0, count / total, 0.0)
+        delta_x = mean_x - self.mean_x
+        delta_y = mean_y - self.mean_y
+        self.comoment += comoment + delta_x * delta_y * weight
+        self.m2_x += m2_x + delta_x * delta_x * weight
+        self.m2_y += m2_y + delta_y * delta_y * weight
+        self.mean_x += delta_x * share
+        self.mean_y += delta_y * share
+        self.count = total
+
+    def correlation(self) -> np.ndarray:
+        with np.errstate(invalid='ignore', divide='ignore'):
+            result = self.comoment / np.sqrt(self.m2_x * self.m2_y)
+        result[self.count < 2] = np.nan
+        return result
+
+
+class StreamingLeaderboardStats:
+    """
+    То же, что LeaderboardStats, но по порциям строк в ограниченной памяти.
+
+    chunks - функция, которая каждый раз заново отдает порции (колонка -> массив).
+    Первый проход считает моменты, квантили (t-digest), топы, корреляции и
+    вовлеченность; второй - гистограммы, потому что их корзины зависят от
+    минимума и максимума. В памяти одновременно только одна порция.
+    Среднее, std, min, max, топы и корреляции совпадают с LeaderboardStats,
+    квартили - приближенные.
+    """
+
+    def __init__(self, chunks: Callable[[], Iterable[Chunk]], top_k: int = 20,
+                 compression: float = 400.0):
+        moments = {name: RunningMoments() for name in SUMMARY_COLUMNS}
+        digests = {name: TDigest(compression) for name in SUMMARY_COLUMNS}
+        ranges = {name: RunningMoments() for name in DISTRIBUTION_COLUMNS}
+        top_by_score = StreamingTopK('score', top_k)
+        top_by_followers = StreamingTopK('followerCount', top_k)
+        correlation = CorrelationAccumulator(len(NUMERIC_COLUMNS))
+        engagement_sums = {name: 0.0 for name in ENGAGEMENT_COLUMNS}
+        self.engagement_count = 0
+        self.total = 0
+
+        for chunk in chunks():
+            chunk = self._prepare(chunk)
+            for name in SUMMARY_COLUMNS:
+                moments[name].add(chunk[name])
+                digests[name].add(chunk[name])
+            for name in DISTRIBUTION_COLUMNS:
+                ranges[name].add(distribution_values(name, chunk[name]))
+            top_by_score.add(chunk, self.total)
+            top_by_followers.add(chunk, self.total)
+            correlation.add(np.vstack([chunk[name].astype(np.float64) for name in NUMERIC_COLUMNS]))
+
+            engagement_mask = np.zeros(len(chunk['rank']), dtype=bool)
+            for name in ENGAGEMENT_COLUMNS:
+                engagement_mask |= chunk[name] > 0
+            self.engagement_count += int(engagement_mask.sum())
+            for name in ENGAGEMENT_COLUMNS:
+                engagement_sums[name] += float(chunk[name][engagement_mask].sum())
+            self.total += len(chunk['rank'])
+
+        self.summary = {name: self._describe(moments[name], digests[name]) for name in SUMMARY_COLUMNS}
+        self.engagement_means = {
+            name: engagement_sums[name] / self.engagement_count if self.engagement_count else np.nan
+            for name in ENGAGEMENT_COLUMNS
+        }
+        self.correlation_columns = list(NUMERIC_COLUMNS)
+        self.correlation = correlation.correlation()
+
+        # Отобранные строки топов - единственные строки, которые хранятся целиком
+        score_rows, follower_rows = top_by_score.rows(), top_by_followers.rows()
+        retained = score_rows + follower_rows
+        self.columns = {name: np.array([row[name] for row in retained]) for name in STATS_COLUMNS}
+        self.top_by_score = np.arange(len(score_rows))
+        self.top_by_followers = np.arange(len(score_rows), len(retained))
+
+        histograms = {}
+        for name in DISTRIBUTION_COLUMNS:
+            value_range = ranges[name]
+            bounds = (0.0, 1.0) if value_range.count == 0 else (value_range.min, value_range.max)
+            histograms[name] = FixedBinHistogram(HISTOGRAM_BINS, bounds)
+        for chunk in chunks():
+            chunk = self._prepare(chunk)
+            for name in DISTRIBUTION_COLUMNS:
+                histograms[name].add(distribution_values(name, chunk[name]))
+        self.histograms = {name: (histogram.counts, histogram.edges) for name, histogram in histograms.items()}
+
+    @staticmethod
+    def _prepare(chunk: Chunk) -> Chunk:
+        """Округляет баллы так же, как LeaderboardStats"""
+        prepared = {}
+        for name in STATS_COLUMNS:
+            values = np.asarray(chunk[name])
+            if name in ROUNDED_COLUMNS:
+                values = np.round(values.astype(np.float64), 2)
+            prepared[name] = values
+        return prepared
+
+    @staticmethod
+    def _describe(moments: RunningMoments, digest: TDigest) -> Dict[str, float]:
+        if moments.count == 0:
+            return {'count': 0.0, 'mean': np.nan, 'std': np.nan, 'min': np.nan,
+                    '25%': np.nan, '50%': np.nan, '75%': np.nan, 'max': np.nan}
+        return {
+            'count': float(moments.count),
+            'mean': moments.mean,
+            'std': moments.std,
+            'min': moments.min,
+            '25%': digest.quantile(0.25),
+            '50%': digest.quantile(0.5),
+            '75%': digest.quantile(0.75),
+            'max': moments.max,
+        }
+
+    def rows(self, indices: np.ndarray, columns: List[str]) -> Dict[str, np.ndarray]:
+        """Выбранные строки только нужных колонок"""
+        return {name: self.columns[name][indices] for name in columns}
@@ -0,0 +1,157 @@
+import json
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Dict, Any, Optional
+
+from xeet_leaderboard_parser import XeetLeaderboardParser, AdaptiveTokenBucket, SharedTokenBucket
+from xeet_metrics import Metrics, create_metrics
+
+
+class XeetOrchestrator:
+    """
+    Параллельный парсинг нескольких турниров.
+
+    Турниры описываются в JSON конфиге (см. tournaments.json):
+
+        {
+          "rate": 4,
+          "max_rate": 10,
+          "tournaments": {
+            "leagues": {"url": "...", "total_pages": 1797, "concurrency": 4},
+            "signals": {"url": "...", "total_pages": 431}
+          }
+        }
+
+    Все турниры делят один глобальный ограничитель частоты запросов (включая
+    процессы-шарды турниров с shards > 1), а concurrency задается для каждого
+    турнира отдельно. Проверки актуальности выполняются параллельно до начала
+    парсинга, поэтому неизменившийся турнир стоит ровно одного запроса.
+    """
+
+    def __init__(self, config: Dict[str, Any], rate: Optional[float] = None,
+                 max_rate: Optional[float] = None, only: Optional[List[str]] = None,
+                 metrics: Optional[Metrics] = None, quiet: bool = False):
+        self.config = config
+        # Один реестр метрик на все турниры (турниры различаются меткой tournament)
+        self.metrics = metrics or Metrics()
+        self.quiet = quiet
+        self.tournaments = {
+            name: self.build_tournament_config(name, entry)
+            for name, entry in config.get('tournaments', {}).items()
+            if not only or name in only
+        }
+
+        rate = rate or config.get('rate', 2.0)
+        max_rate = max_rate or config.get('max_rate', rate)
+        max_concurrency = sum(entry['concurrency'] * entry['shards'] for entry in self.tournaments.values())
+        # С шардами ограничитель лежит в общей памяти, чтобы процессы-шарды и потоки
+        # остальных турниров брали токены из одного bucket
+        bucket = AdaptiveTokenBucket
+        if any(entry['shards'] > 1 for entry in self.tournaments.values()):
+            bucket = SharedTokenBucket
+        self.rate_limiter = bucket(rate, capacity=max(1, max_concurrency), max_rate=max_rate)
+
+    @classmethod
+    def from_file(cls, path: str, **kwargs) -> 'XeetOrchestrator':
+        """Создает оркестратор из JSON файла конфигурации"""
+        with open(path, 'r', encoding='utf-8') as f:
+            return cls(json.load(f), **kwargs)
+
+    @staticmethod
+    def build_tournament_config(name: str, entry: Dict[str, Any]) -> Dict[str, Any]:
+        """Дополняет конфиг турнира именами файлов по умолчанию"""
+        return {
+            'url': entry['url'],
+            'total_pages': entry['total_pages'],
+            'csv_file': entry.get('csv_file', f'xeet_{name}_stats.csv'),
+            'avatars_file': entry.get('avatars_file', f'xeet_{name}_avatars.csv'),
+            'metadata_file': entry.get('metadata_file', f'xeet_{name}_metadata.json'),
+            'journal_file': entry.get('journal_file', f'xeet_{name}_journal.jsonl'),
+            'arrow_file': entry.get('arrow_file', f'xeet_{name}_stats.arrow'),
+            'history_file': entry.get('history_file', 'xeet_history.sqlite'),
+            'http_cache_file': entry.get('http_cache_file', 'xeet_http_cache.sqlite'),
+            'concurrency': entry.get('concurrency', 1),
+            'shards': entry.get('shards', 1),
+            'incremental': entry.get('incremental', False),
+            'max_limit': entry.get('max_limit', 100),
+            'columnar': entry.get('columnar', False),
+        }
+
+    def create_parser(self, name: str) -> XeetLeaderboardParser:
+        config = self.tournaments[name]
+        return XeetLeaderboardParser(name, concurrency=config['concurrency'],
+                                     incremental=config['incremental'],
+                                     max_limit=config['max_limit'],
+                                     columnar=config['columnar'], shards=config['shards'],
+                                     config=config, rate_limiter=self.rate_limiter,
+                                     metrics=self.metrics, quiet=self.quiet)
+
+    def run(self) -> Dict[str, bool]:
+        """
+        Проверяет все турниры параллельно и парсит параллельно те, что устарели.
+        Возвращает словарь турнир -> был ли он обновлен.
+        """
+        if not self.tournaments:
+            print("В конфигурации нет турниров")
+            return {}
+
+        parsers = {name: self.create_parser(name) for name in self.tournaments}
+
+        try:
+            with ThreadPoolExecutor(max_workers=len(parsers)) as executor:
+                # Сначала только проверки актуальности - по одному запросу на турнир
+                checks = {name: executor.submit(parser.check_if_update_needed)
+                          for name, parser in parsers.items()}
+                stale = [name for name, future in checks.items() if future.result()]
+
+                print("\n" + "=" * 50)
+                print(f"Требуют обновления: {', '.join(stale) if stale else 'нет'}")
+                print("=" * 50)
+
+                runs = {name: executor.submit(parsers[name].run, force=True) for name in stale}
+                for name, future in runs.items():
+                    try:
+                        future.result()
+                    except Exception as e:
+                        print(f"Ошибка при парсинге турнира {name}: {e}")
+        finally:
+            # Сессии и SQLite кэши ответов парсеров больше не нужны
+            for parser in parsers.values():
+                parser.close()
+        return {name: name in stale for name in parsers}
+
+
+def main():
+    """Точка входа оркестратора"""
+    import argparse
+
+    arg_parser = argparse.ArgumentParser(description="Parallel scraper for several Xeet.ai tournaments")
+    arg_parser.add_argument("--config", default="tournaments.json",
+                            help="JSON file with tournaments (default: tournaments.json)")
+    arg_parser.add_argument("--rate", type=float, default=None,
+                            help="global starting requests per second shared by all tournaments")
+    arg_parser.add_argument("--max-rate", type=float, default=None,
+                            help="global upper bound for adaptive rate ramp-up")
+    arg_parser.add_argument("--only", nargs="+", default=None,
+                            help="scrape only these tournaments from the config")
+    arg_parser.add_argument("--quiet", action="store_true",
+                            help="no per-page and per-retry console output")
+    arg_parser.add_argument("--metrics-file", default=None,
+                            help="append request/page/phase events to this JSON lines file")
+    arg_parser.add_argument("--metrics-port", type=int, default=None,
+                            help="serve Prometheus metrics on http://127.0.0.1:PORT/metrics during the run")
+    args = arg_parser.parse_args()
+
+    metrics, metrics_server = create_metrics(args.metrics_file, args.metrics_port)
+    orchestrator = XeetOrchestrator.from_file(args.config, rate=args.rate,
+                                              max_rate=args.max_rate, only=args.only,
+                                              metrics=metrics, quiet=args.quiet)
+    try:
+        orchestrator.run()
+    finally:
+        if metrics_server is not None:
+            metrics_server.stop()
+        metrics.close()
+
+
+if __name__ == "__main__":
+    main()
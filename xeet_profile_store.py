@@ -0,0 +1,271 @@
+import csv
+import json
+import os
+import sqlite3
+from datetime import datetime
+from typing import List, Dict, Any, Iterable, Optional
+
+
+class ProfileStore:
+    """
+    Единое хранилище профилей (аватар и имя) по username для всех турниров.
+
+    Профиль записывается только когда у автора меняется avatar или name,
+    и каждое изменение получает глобальный номер версии. Турниры хранят лишь
+    список авторов в порядке рейтинга (members), а avatars CSV каждого турнира -
+    это выгрузка представления tournament_avatars поверх общих профилей.
+    Хранилище помнит, куда и на какой версии выгружен каждый турнир (exports),
+    и refresh_exports() перевыгружает только устаревшие CSV.
+    Клиент, помнящий последнюю версию, забирает только изменившиеся профили
+    через changes_since().
+    """
+
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS profile_versions (
+            version INTEGER PRIMARY KEY,
+            username TEXT NOT NULL,
+            avatar TEXT NOT NULL,
+            name TEXT NOT NULL,
+            changed_at TEXT NOT NULL
+        );
+        CREATE TABLE IF NOT EXISTS profiles (
+            username TEXT PRIMARY KEY,
+            avatar TEXT NOT NULL,
+            name TEXT NOT NULL,
+            version INTEGER NOT NULL
+        ) WITHOUT ROWID;
+        CREATE INDEX IF NOT EXISTS profiles_version ON profiles (version);
+        CREATE TABLE IF NOT EXISTS members (
+            tournament TEXT NOT NULL,
+            position INTEGER NOT NULL,
+            username TEXT NOT NULL,
+            PRIMARY KEY (tournament, position)
+        ) WITHOUT ROWID;
+        CREATE INDEX IF NOT EXISTS members_username ON members (username);
+        CREATE TABLE IF NOT EXISTS exports (
+            tournament TEXT PRIMARY KEY,
+            filename TEXT NOT NULL,
+            version INTEGER NOT NULL
+        ) WITHOUT ROWID;
+        CREATE VIEW IF NOT EXISTS tournament_avatars AS
+            SELECT m.tournament, m.position, m.username, p.avatar, p.name
+            FROM members m JOIN profiles p ON p.username = m.username;
+    """
+
+    AVATAR_FIELDS = ['username', 'avatar', 'name']
+
+    def __init__(self, path: str = "xeet_profiles.sqlite"):
+        self.path = path
+        self.conn = sqlite3.connect(path, timeout=30)
+        self.conn.row_factory = sqlite3.Row
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.executescript(self.SCHEMA)
+
+    def close(self):
+        self.conn.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+    def current_version(self) -> int:
+        """Номер последнего изменения (0 для пустого хранилища)"""
+        return self.conn.execute("SELECT COALESCE(MAX(version), 0) FROM profile_versions").fetchone()[0]
+
+    def tournament_writer(self, tournament: str) -> 'TournamentProfileWriter':
+        """Потоковая запись строк avatars турнира (см. TournamentProfileWriter)"""
+        return TournamentProfileWriter(self, tournament)
+
+    def update_tournament(self, tournament: str, rows: Iterable[Dict[str, Any]]) -> int:
+        """
+        Обновляет профили и состав турнира по строкам avatars (в порядке рейтинга).
+        Записываются только новые и изменившиеся профили. Возвращает их число.
+        """
+        with self.tournament_writer(tournament) as writer:
+            writer.writerows(rows)
+        return writer.changed
+
+    def update_tournament_from_csv(self, tournament: str, avatars_file: str) -> int:
+        """Обновляет профили из avatars CSV, читая его построчно"""
+        with open(avatars_file, 'r', newline='', encoding='utf-8') as f:
+            return self.update_tournament(tournament, csv.DictReader(f))
+
+    def profile(self, username: str) -> Optional[Dict[str, Any]]:
+        row = self.conn.execute("SELECT username, avatar, name, version FROM profiles WHERE username = ?",
+                                (username,)).fetchone()
+        return dict(row) if row else None
+
+    def profile_history(self, username: str) -> List[Dict[str, Any]]:
+        """Все версии профиля автора от старых к новым"""
+        rows = self.conn.execute(
+            "SELECT version, avatar, name, changed_at FROM profile_versions WHERE username = ? ORDER BY version",
+            (username,)).fetchall()
+        return [dict(row) for row in rows]
+
+    def changes_since(self, version: int = 0) -> List[Dict[str, Any]]:
+        """Текущие профили, изменившиеся после version"""
+        rows = self.conn.execute(
+            "SELECT username, avatar, name, version FROM profiles WHERE version > ? ORDER BY version",
+            (version,)).fetchall()
+        return [dict(row) for row in rows]
+
+    def iter_tournament_avatars(self, tournament: str) -> Iterable[Dict[str, Any]]:
+        """Строки avatars CSV турнира в порядке рейтинга"""
+        cursor = self.conn.execute(
+            "SELECT username, avatar, name FROM tournament_avatars WHERE tournament = ? ORDER BY position",
+            (tournament,))
+        for row in cursor:
+            yield dict(row)
+
+    def export_avatars_csv(self, tournament: str, filename: str) -> int:
+        """
+        Записывает avatars CSV турнира из общего хранилища и запоминает версию выгрузки.
+        Возвращает число строк.
+        """
+        version = self.current_version()
+        tmp_filename = filename + '.tmp'
+        count = 0
+        with open(tmp_filename, 'w', newline='', encoding='utf-8') as f:
+            writer = csv.DictWriter(f, fieldnames=self.AVATAR_FIELDS)
+            writer.writeheader()
+            for row in self.iter_tournament_avatars(tournament):
+                writer.writerow(row)
+                count += 1
+        os.replace(tmp_filename, filename)
+        with self.conn:
+            self.conn.execute("INSERT OR REPLACE INTO exports (tournament, filename, version) VALUES (?, ?, ?)",
+                              (tournament, filename, version))
+        return count
+
+    def export_is_current(self, tournament: str, filename: str) -> bool:
+        """Выгружен ли avatars CSV турнира в filename и не изменились ли с тех пор его профили"""
+        row = self.conn.execute("SELECT filename, version FROM exports WHERE tournament = ?",
+                                (tournament,)).fetchone()
+        if row is None or row['filename'] != filename or not os.path.exists(filename):
+            return False
+        return self.conn.execute(
+            "SELECT 1 FROM profiles p JOIN members m ON m.username = p.username "
+            "WHERE p.version > ? AND m.tournament = ? LIMIT 1", (row['version'], tournament)).fetchone() is None
+
+    def refresh_exports(self, exclude: Iterable[str] = ()) -> List[str]:
+        """
+        Перевыгружает avatars CSV турниров, у авторов которых профиль изменился
+        после их последней выгрузки (например, обновлением другого турнира).
+        Возвращает список перевыгруженных турниров.
+        """
+        refreshed = []
+        for row in self.conn.execute("SELECT tournament, filename FROM exports").fetchall():
+            if row['tournament'] in exclude or not os.path.exists(row['filename']):
+                continue
+            if not self.export_is_current(row['tournament'], row['filename']):
+                self.export_avatars_csv(row['tournament'], row['filename'])
+                refreshed.append(row['tournament'])
+        return refreshed
+
+
+class TournamentProfileWriter:
+    """
+    Принимает строки avatars турнира в порядке рейтинга тем же интерфейсом, что и
+    AtomicCSVWriter (writerows / discard), и запоминает только новые и изменившиеся
+    профили и позиции. В хранилище они пишутся одной короткой транзакцией при выходе
+    из with без ошибки, поэтому параллельные турниры не ждут друг друга всю запись.
+    """
+
+    def __init__(self, store: ProfileStore, tournament: str):
+        self.store = store
+        self.tournament = tournament
+        self.count = 0
+        # Новых и изменившихся профилей / позиций состава турнира
+        self.changed = 0
+        self.members_changed = 0
+        self.discarded = False
+        self._known: Dict[str, Any] = {}
+        self._positions: Dict[int, str] = {}
+        self._profiles: List[Any] = []
+        self._members: List[Any] = []
+
+    def __enter__(self):
+        conn = self.store.conn
+        self._known = {row['username']: (row['avatar'], row['name'])
+                       for row in conn.execute("SELECT username, avatar, name FROM profiles")}
+        self._positions = {row['position']: row['username'] for row in conn.execute(
+            "SELECT position, username FROM members WHERE tournament = ?", (self.tournament,))}
+        return self
+
+    def writerow(self, row: Dict[str, Any]):
+        self.writerows([row])
+
+    def writerows(self, rows: Iterable[Dict[str, Any]]):
+        for row in rows:
+            position = self.count
+            self.count += 1
+            username = row['username']
+            profile = (row.get('avatar') or '', row.get('name') or '')
+            # Состав турнира тоже переписывается только в изменившихся позициях
+            if self._positions.get(position) != username:
+                self._members.append((self.tournament, position, username))
+            if self._known.get(username) != profile:
+                self._known[username] = profile
+                self._profiles.append((username,) + profile)
+
+    def discard(self):
+        """Ничего не записывать в хранилище при выходе из with"""
+        self.discarded = True
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is not None or self.discarded:
+            return
+        conn = self.store.conn
+        changed_at = datetime.now().isoformat()
+        with conn:
+            for username, avatar, name in self._profiles:
+                version = conn.execute(
+                    "INSERT INTO profile_versions (username, avatar, name, changed_at) VALUES (?, ?, ?, ?)",
+                    (username, avatar, name, changed_at)).lastrowid
+                conn.execute("INSERT OR REPLACE INTO profiles (username, avatar, name, version) VALUES (?, ?, ?, ?)",
+                             (username, avatar, name, version))
+            conn.executemany("INSERT OR REPLACE INTO members (tournament, position, username) VALUES (?, ?, ?)",
+                             self._members)
+            removed = conn.execute("DELETE FROM members WHERE tournament = ? AND position >= ?",
+                                   (self.tournament, self.count)).rowcount
+        self.changed = len(self._profiles)
+        self.members_changed = len(self._members) + max(removed, 0)
+
+
+def main():
+    """Импорт avatars CSV, экспорт представлений и выгрузка изменений из командной строки"""
+    import argparse
+
+    arg_parser = argparse.ArgumentParser(description="Deduplicated Xeet profile store")
+    arg_parser.add_argument("--store", default="xeet_profiles.sqlite",
+                            help="SQLite profile store (default: xeet_profiles.sqlite)")
+    commands = arg_parser.add_subparsers(dest="command", required=True)
+
+    import_command = commands.add_parser("import", help="import a tournament avatars CSV")
+    import_command.add_argument("tournament")
+    import_command.add_argument("avatars_file")
+
+    export_command = commands.add_parser("export", help="write a tournament avatars CSV from the store")
+    export_command.add_argument("tournament")
+    export_command.add_argument("avatars_file")
+
+    changes_command = commands.add_parser("changes", help="print profiles changed after a version as JSON")
+    changes_command.add_argument("--since", type=int, default=0)
+    args = arg_parser.parse_args()
+
+    with ProfileStore(args.store) as store:
+        if args.command == "import":
+            changed = store.update_tournament_from_csv(args.tournament, args.avatars_file)
+            print(f"{args.avatars_file}: изменено профилей {changed}, версия {store.current_version()}")
+        elif args.command == "export":
+            total = store.export_avatars_csv(args.tournament, args.avatars_file)
+            print(f"{args.tournament} -> {args.avatars_file}: {total} записей")
+        else:
+            print(json.dumps({'version': store.current_version(),
+                              'profiles': store.changes_since(args.since)}, ensure_ascii=False))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,368 @@
+import bisect
+import csv
+import gzip
+import hashlib
+import json
+import os
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import List, Dict, Any, Optional, Tuple
+from urllib.parse import urlparse, parse_qs, unquote
+
+STATS_FIELDS = ['rank', 'username', 'followerCount', 'score', 'signalScore', 'noisePoints',
+                'totalEngagement', 'engagementRate', 'averageEngagementPerPost']
+INTEGER_FIELDS = {'rank', 'followerCount', 'totalEngagement'}
+NUMERIC_FIELDS = [field for field in STATS_FIELDS if field != 'username']
+
+
+def file_signature(path: str) -> Optional[Tuple[int, int]]:
+    """(mtime_ns, size) файла или None, если файла нет"""
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+    return stat.st_mtime_ns, stat.st_size
+
+
+class TournamentIndex:
+    """
+    Неизменяемый индекс одного турнира в памяти.
+
+    Каждая строка сериализуется в JSON один раз при загрузке, поэтому ответ
+    собирается склейкой готовых фрагментов. Порядки сортировки по каждому полю
+    строятся при первом запросе и кэшируются, username ищется через словарь,
+    а поиск по префиксу - бинарным поиском по отсортированному списку имен.
+    """
+
+    def __init__(self, name: str, csv_file: str, avatars_file: Optional[str] = None):
+        self.name = name
+        self.csv_file = csv_file
+        self.avatars_file = avatars_file
+        self.signature = (file_signature(csv_file),
+                          file_signature(avatars_file) if avatars_file else None)
+        self.version = hashlib.sha1(repr(self.signature).encode('utf-8')).hexdigest()[:16]
+
+        profiles = {}
+        if avatars_file and os.path.exists(avatars_file):
+            with open(avatars_file, 'r', newline='', encoding='utf-8') as f:
+                for row in csv.DictReader(f):
+                    profiles[row['username']] = (row.get('avatar', ''), row.get('name', ''))
+
+        self.values: Dict[str, List[Any]] = {field: [] for field in STATS_FIELDS}
+        self.rows: List[bytes] = []
+        with open(csv_file, 'r', newline='', encoding='utf-8') as f:
+            for row in csv.DictReader(f):
+                record = {}
+                for field in STATS_FIELDS:
+                    value = row.get(field, '')
+                    if field != 'username':
+                        value = float(value) if value not in (None, '') else 0.0
+                        if field in INTEGER_FIELDS:
+                            value = int(value)
+                    record[field] = value
+                    self.values[field].append(value)
+                avatar, display_name = profiles.get(record['username'], ('', ''))
+                record['avatar'] = avatar
+                record['name'] = display_name
+                self.rows.append(json.dumps(record, ensure_ascii=False).encode('utf-8'))
+
+        self.by_username = {username.lower(): position
+                            for position, username in enumerate(self.values['username'])}
+        self.sorted_usernames = sorted(self.by_username)
+        self._orders: Dict[Tuple[str, bool], List[int]] = {}
+
+    def __len__(self) -> int:
+        return len(self.rows)
+
+    def order(self, field: str, descending: bool) -> List[int]:
+        """Номера строк, отсортированные по field (кэшируется)"""
+        key = (field, descending)
+        order = self._orders.get(key)
+        if order is None:
+            values = self.values[field]
+            if field == 'username':
+                values = [value.lower() for value in values]
+            order = sorted(range(len(values)), key=values.__getitem__, reverse=descending)
+            self._orders[key] = order
+        return order
+
+    def query(self, sort: str = 'rank', descending: bool = False,
+              filters: Optional[Dict[str, Tuple[float, float]]] = None) -> List[int]:
+        """Номера строк в порядке сортировки, удовлетворяющие фильтрам field -> (min, max)"""
+        order = self.order(sort, descending)
+        if not filters:
+            return order
+        checks = [(self.values[field], low, high) for field, (low, high) in filters.items()]
+        return [position for position in order
+                if all(low <= values[position] <= high for values, low, high in checks)]
+
+    def lookup(self, username: str) -> Optional[int]:
+        return self.by_username.get(username.lower())
+
+    def prefix(self, prefix: str, limit: int) -> List[int]:
+        """Строки, username которых начинается с prefix (без учета регистра), по рангу"""
+        prefix = prefix.lower()
+        start = bisect.bisect_left(self.sorted_usernames, prefix)
+        positions = []
+        for username in self.sorted_usernames[start:]:
+            if not username.startswith(prefix):
+                break
+            positions.append(self.by_username[username])
+        positions.sort(key=self.values['rank'].__getitem__)
+        return positions[:limit]
+
+    def render(self, positions: List[int]) -> bytes:
+        """JSON массив строк из готовых фрагментов"""
+        return b'[' + b','.join(self.rows[position] for position in positions) + b']'
+
+
+class TournamentRegistry:
+    """
+    Набор турниров сервера с горячей перезагрузкой.
+
+    Не чаще раза в reload_interval секунд сравнивает (mtime, size) файлов
+    с загруженными. Парсер заменяет CSV атомарно (os.replace), поэтому новый
+    индекс строится по целому файлу и подменяет старый одной операцией;
+    запросы, пришедшие во время загрузки, обслуживаются старым индексом.
+    """
+
+    def __init__(self, sources: Dict[str, Tuple[str, Optional[str]]], reload_interval: float = 2.0):
+        self.sources = sources
+        self.reload_interval = reload_interval
+        self.indexes: Dict[str, TournamentIndex] = {}
+        self._checked_at = 0.0
+        self._lock = threading.Lock()
+        for name in sources:
+            self._load(name)
+
+    def _load(self, name: str):
+        csv_file, avatars_file = self.sources[name]
+        if not os.path.exists(csv_file):
+            print(f"Файл {csv_file} не найден, турнир {name} пропущен")
+            return
+        index = TournamentIndex(name, csv_file, avatars_file)
+        self.indexes[name] = index
+        print(f"Турнир {name}: загружено {len(index)} записей из {csv_file}")
+
+    def refresh(self):
+        """Перезагружает турниры, файлы которых изменились"""
+        now = time.monotonic()
+        if now - self._checked_at < self.reload_interval or not self._lock.acquire(blocking=False):
+            return
+        try:
+            self._checked_at = now
+            for name, (csv_file, avatars_file) in self.sources.items():
+                current = self.indexes.get(name)
+                signature = (file_signature(csv_file),
+                             file_signature(avatars_file) if avatars_file else None)
+                if signature[0] is not None and (current is None or current.signature != signature):
+                    try:
+                        self._load(name)
+                    except Exception as e:
+                        print(f"Ошибка при перезагрузке турнира {name}: {e}")
+        finally:
+            self._lock.release()
+
+    def get(self, name: str) -> Optional[TournamentIndex]:
+        self.refresh()
+        return self.indexes.get(name)
+
+
+class LeaderboardQueryServer:
+    """
+    HTTP API для фронтенда поверх результатов парсера:
+
+        GET /api/tournaments
+        GET /api/<tournament>/leaderboard?page=1&limit=50&sort=score&order=desc&min_followerCount=1000
+        GET /api/<tournament>/users/<username>
+        GET /api/<tournament>/search?prefix=bil&limit=10
+
+    Ответы снабжаются ETag (версия файлов + запрос) и отдаются 304 при совпадении
+    If-None-Match, а при Accept-Encoding: gzip сжимаются; у сжатого ответа ETag
+    с суффиксом -gzip.
+    """
+
+    MAX_LIMIT = 500
+    GZIP_MIN_SIZE = 1024
+
+    def __init__(self, sources: Dict[str, Tuple[str, Optional[str]]], host: str = "127.0.0.1",
+                 port: int = 8080, reload_interval: float = 2.0):
+        self.registry = TournamentRegistry(sources, reload_interval)
+        self._server = ThreadingHTTPServer((host, port), self._make_handler())
+        self._server.daemon_threads = True
+        self._thread = None
+
+    @property
+    def url(self) -> str:
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def handle(self, path: str) -> Tuple[int, Optional[str], bytes]:
+        """
+        Обрабатывает GET запрос, возвращает (статус, версия данных, тело).
+        Версия данных входит в ETag; None - ответ не кэшируется.
+        """
+        parsed = urlparse(path)
+        query = {key: values[0] for key, values in parse_qs(parsed.query).items()}
+        parts = [unquote(part) for part in parsed.path.strip('/').split('/')]
+
+        if parts == ['api', 'tournaments']:
+            self.registry.refresh()
+            body = {name: {'records': len(index), 'version': index.version}
+                    for name, index in self.registry.indexes.items()}
+            return 200, None, json.dumps(body).encode('utf-8')
+
+        if len(parts) < 3 or parts[0] != 'api':
+            return 404, None, b'{"error": "not found"}'
+        index = self.registry.get(parts[1])
+        if index is None:
+            return 404, None, b'{"error": "unknown tournament"}'
+
+        try:
+            if parts[2] == 'leaderboard' and len(parts) == 3:
+                return 200, index.version, self._leaderboard(index, query)
+            if parts[2] == 'users' and len(parts) == 4:
+                position = index.lookup(parts[3])
+                if position is None:
+                    return 404, index.version, b'{"error": "user not found"}'
+                return 200, index.version, index.rows[position]
+            if parts[2] == 'search' and len(parts) == 3:
+                prefix = query.get('prefix', '')
+                if not prefix:
+                    raise ValueError("prefix is required")
+                limit = max(1, min(int(query.get('limit', 10)), self.MAX_LIMIT))
+                return 200, index.version, index.render(index.prefix(prefix, limit))
+        except (ValueError, KeyError) as e:
+            return 400, None, json.dumps({'error': f'bad request: {e}'}).encode('utf-8')
+        return 404, None, b'{"error": "not found"}'
+
+    def _leaderboard(self, index: TournamentIndex, query: Dict[str, str]) -> bytes:
+        page = max(1, int(query.get('page', 1)))
+        limit = max(1, min(int(query.get('limit', 50)), self.MAX_LIMIT))
+        sort = query.get('sort', 'rank')
+        if sort not in STATS_FIELDS:
+            raise ValueError(f"unknown sort field {sort}")
+        descending = query.get('order', 'asc') == 'desc'
+
+        # Фильтры вида min_<поле>=... и max_<поле>=...
+        filters: Dict[str, Tuple[float, float]] = {}
+        for key, value in query.items():
+            bound, _, field = key.partition('_')
+            if bound in ('min', 'max') and field in NUMERIC_FIELDS:
+                low, high = filters.get(field, (float('-inf'), float('inf')))
+                filters[field] = (float(value), high) if bound == 'min' else (low, float(value))
+
+        positions = index.query(sort, descending, filters)
+        start = (page - 1) * limit
+        pagination = {'page': page, 'limit': limit, 'total': len(positions),
+                      'totalPages': -(-len(positions) // limit)}
+        return (b'{"data":' + index.render(positions[start:start + limit]) +
+                b',"pagination":' + json.dumps(pagination).encode('utf-8') + b'}')
+
+    def _make_handler(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+            # Заголовки и тело уходят отдельными записями: без этого keep-alive ждет delayed ACK
+            disable_nagle_algorithm = True
+
+            def do_GET(self):
+                status, version, body = server.handle(self.path)
+                gzipped = len(body) >= server.GZIP_MIN_SIZE and 'gzip' in self.headers.get('Accept-Encoding', '')
+                etag = None
+                if version is not None and status == 200:
+                    # У сжатого и несжатого представления разные байты, поэтому и ETag разные
+                    digest = hashlib.sha1(f"{version}:{self.path}".encode('utf-8')).hexdigest()[:20]
+                    etag = f'"{digest}-gzip"' if gzipped else f'"{digest}"'
+                    if_none_match = [tag.strip() for tag in self.headers.get('If-None-Match', '').split(',')]
+                    if etag in if_none_match or 'W/' + etag in if_none_match:
+                        self.send_response(304)
+                        self.send_header('ETag', etag)
+                        self.send_header('Vary', 'Accept-Encoding')
+                        self.send_header('Cache-Control', 'no-cache')
+                        self.send_header('Content-Length', '0')
+                        self.end_headers()
+                        return
+
+                if gzipped:
+                    body = gzip.compress(body, compresslevel=5)
+
+                self.send_response(status)
+                self.send_header('Content-Type', 'application/json; charset=utf-8')
+                self.send_header('Content-Length', str(len(body)))
+                self.send_header('Access-Control-Allow-Origin', '*')
+                self.send_header('Vary', 'Accept-Encoding')
+                if gzipped:
+                    self.send_header('Content-Encoding', 'gzip')
+                if etag:
+                    self.send_header('ETag', etag)
+                    self.send_header('Cache-Control', 'no-cache')
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        return Handler
+
+    def start(self):
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, exc_type, exc, tb):
+        self.stop()
+
+
+def load_sources(config_file: str) -> Dict[str, Tuple[str, Optional[str]]]:
+    """Файлы турниров из конфига оркестратора (те же имена по умолчанию)"""
+    with open(config_file, 'r', encoding='utf-8') as f:
+        config = json.load(f)
+    return {
+        name: (entry.get('csv_file', f'xeet_{name}_stats.csv'),
+               entry.get('avatars_file', f'xeet_{name}_avatars.csv'))
+        for name, entry in config.get('tournaments', {}).items()
+    }
+
+
+def main():
+    """Запуск сервера запросов из командной строки"""
+    import argparse
+
+    arg_parser = argparse.ArgumentParser(description="Query API over scraped Xeet leaderboards")
+    arg_parser.add_argument("--config", default="tournaments.json",
+                            help="JSON file with tournaments (default: tournaments.json)")
+    arg_parser.add_argument("--source", action="append", default=[],
+                            help="extra tournament as name=stats.csv[,avatars.csv]")
+    arg_parser.add_argument("--host", default="127.0.0.1")
+    arg_parser.add_argument("--port", type=int, default=8080)
+    arg_parser.add_argument("--reload-interval", type=float, default=2.0,
+                            help="seconds between checks for a new scrape (default: 2)")
+    args = arg_parser.parse_args()
+
+    sources = load_sources(args.config) if os.path.exists(args.config) else {}
+    for source in args.source:
+        name, _, files = source.partition('=')
+        csv_file, _, avatars_file = files.partition(',')
+        sources[name] = (csv_file, avatars_file or None)
+
+    server = LeaderboardQueryServer(sources, host=args.host, port=args.port,
+                                    reload_interval=args.reload_interval)
+    print(f"Сервер запросов запущен: {server.url}/api/tournaments")
+    try:
+        server._server.serve_forever()
+    except KeyboardInterrupt:
+        server.stop()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,169 @@
+import csv
+import sqlite3
+from datetime import datetime
+from typing import List, Dict, Any, Iterable, Optional, Tuple
+
+
+class SnapshotStore:
+    """
+    История снимков лидербордов в SQLite.
+
+    Каждый успешный парсинг добавляет снимок с ключом (турнир, lastUpdated из API).
+    Записи хранятся в таблице entries с первичным ключом (snapshot_id, username)
+    и индексами (username, snapshot_id) и (snapshot_id, rank), поэтому траектория
+    одного автора и сравнение двух снимков не требуют чтения всей истории.
+    """
+
+    METRICS = ['rank', 'followerCount', 'score', 'signalScore', 'noisePoints',
+               'totalEngagement', 'engagementRate', 'averageEngagementPerPost']
+
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS snapshots (
+            id INTEGER PRIMARY KEY,
+            tournament TEXT NOT NULL,
+            last_updated TEXT NOT NULL,
+            parsed_at TEXT NOT NULL,
+            total_records INTEGER NOT NULL DEFAULT 0,
+            UNIQUE (tournament, last_updated)
+        );
+        CREATE TABLE IF NOT EXISTS entries (
+            snapshot_id INTEGER NOT NULL REFERENCES snapshots(id) ON DELETE CASCADE,
+            username TEXT NOT NULL,
+            rank INTEGER NOT NULL,
+            followerCount INTEGER,
+            score REAL,
+            signalScore REAL,
+            noisePoints REAL,
+            totalEngagement INTEGER,
+            engagementRate REAL,
+            averageEngagementPerPost REAL,
+            PRIMARY KEY (snapshot_id, username)
+        ) WITHOUT ROWID;
+        CREATE INDEX IF NOT EXISTS entries_username ON entries (username, snapshot_id);
+        CREATE INDEX IF NOT EXISTS entries_rank ON entries (snapshot_id, rank);
+    """
+
+    def __init__(self, path: str = "xeet_history.sqlite"):
+        self.path = path
+        self.conn = sqlite3.connect(path, timeout=30)
+        self.conn.row_factory = sqlite3.Row
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA foreign_keys=ON")
+        self.conn.executescript(self.SCHEMA)
+
+    def close(self):
+        self.conn.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+    def has_snapshot(self, tournament: str, last_updated: str) -> bool:
+        row = self.conn.execute(
+            "SELECT 1 FROM snapshots WHERE tournament = ? AND last_updated = ?",
+            (tournament, last_updated)).fetchone()
+        return row is not None
+
+    def add_snapshot(self, tournament: str, last_updated: str, rows: Iterable[Dict[str, Any]]) -> Optional[int]:
+        """
+        Добавляет снимок. Повторный снимок того же lastUpdated пропускается.
+        Возвращает id снимка или None, если он уже был.
+        Если автор встречается в снимке дважды, снимок не добавляется (ValueError):
+        в истории он разошелся бы с CSV, из которого построен.
+        """
+        if self.has_snapshot(tournament, last_updated):
+            return None
+
+        columns = ['snapshot_id', 'username'] + self.METRICS
+        insert = f"INSERT INTO entries ({', '.join(columns)}) VALUES ({', '.join('?' * len(columns))})"
+        seen = set()
+
+        def entries(snapshot_id: int):
+            for row in rows:
+                username = row['username']
+                if username in seen:
+                    raise ValueError(f"Автор {username} встречается в снимке {tournament} "
+                                     f"{last_updated} дважды (rank {row.get('rank')})")
+                seen.add(username)
+                yield [snapshot_id, username] + [row.get(metric) for metric in self.METRICS]
+
+        with self.conn:
+            snapshot_id = self.conn.execute(
+                "INSERT INTO snapshots (tournament, last_updated, parsed_at) VALUES (?, ?, ?)",
+                (tournament, last_updated, datetime.now().isoformat())).lastrowid
+            self.conn.executemany(insert, entries(snapshot_id))
+            total = self.conn.execute("SELECT COUNT(*) FROM entries WHERE snapshot_id = ?",
+                                      (snapshot_id,)).fetchone()[0]
+            self.conn.execute("UPDATE snapshots SET total_records = ? WHERE id = ?", (total, snapshot_id))
+        return snapshot_id
+
+    def add_snapshot_from_csv(self, tournament: str, last_updated: str, csv_file: str) -> Optional[int]:
+        """Добавляет снимок из CSV файла статистики, читая его построчно"""
+        with open(csv_file, 'r', newline='', encoding='utf-8') as f:
+            return self.add_snapshot(tournament, last_updated, csv.DictReader(f))
+
+    def list_snapshots(self, tournament: str) -> List[Dict[str, Any]]:
+        """Снимки турнира от старых к новым"""
+        rows = self.conn.execute(
+            "SELECT id, last_updated, parsed_at, total_records FROM snapshots "
+            "WHERE tournament = ? ORDER BY last_updated", (tournament,)).fetchall()
+        return [dict(row) for row in rows]
+
+    def resolve_snapshots(self, tournament: str, old: Optional[str] = None,
+                          new: Optional[str] = None) -> Tuple[int, int]:
+        """
+        Находит id двух снимков по lastUpdated.
+        По умолчанию - два последних снимка турнира.
+        """
+        snapshots = self.list_snapshots(tournament)
+        by_key = {snapshot['last_updated']: snapshot['id'] for snapshot in snapshots}
+        if len(snapshots) < 2 and (old is None or new is None):
+            raise ValueError(f"Для турнира {tournament} нужно минимум два снимка")
+        old_id = by_key[old] if old is not None else snapshots[-2]['id']
+        new_id = by_key[new] if new is not None else snapshots[-1]['id']
+        return old_id, new_id
+
+    def trajectory(self, tournament: str, username: str) -> List[Dict[str, Any]]:
+        """Значения метрик автора во всех снимках турнира"""
+        rows = self.conn.execute(
+            f"SELECT s.last_updated, {', '.join('e.' + metric for metric in self.METRICS)} "
+            "FROM entries e JOIN snapshots s ON s.id = e.snapshot_id "
+            "WHERE e.username = ? AND s.tournament = ? ORDER BY s.last_updated",
+            (username, tournament)).fetchall()
+        return [dict(row) for row in rows]
+
+    def rank_deltas(self, tournament: str, old: Optional[str] = None,
+                    new: Optional[str] = None) -> List[Dict[str, Any]]:
+        """
+        Изменение ранга, балла и подписчиков каждого автора между двумя снимками.
+        rank_delta > 0 означает подъем в рейтинге. Авторы, которых нет в старом
+        снимке, возвращаются с old_rank = None.
+        """
+        old_id, new_id = self.resolve_snapshots(tournament, old, new)
+        rows = self.conn.execute(
+            "SELECT n.username, o.rank AS old_rank, n.rank AS new_rank, "
+            "o.rank - n.rank AS rank_delta, n.score - o.score AS score_delta, "
+            "n.followerCount - o.followerCount AS follower_delta "
+            "FROM entries n LEFT JOIN entries o ON o.snapshot_id = ? AND o.username = n.username "
+            "WHERE n.snapshot_id = ? ORDER BY n.rank",
+            (old_id, new_id)).fetchall()
+        return [dict(row) for row in rows]
+
+    def biggest_movers(self, tournament: str, old: Optional[str] = None, new: Optional[str] = None,
+                       limit: int = 10, metric: str = 'rank') -> List[Dict[str, Any]]:
+        """
+        Авторы с наибольшим изменением metric между двумя снимками
+        (для rank - наибольший подъем, для остальных метрик - наибольший рост).
+        """
+        if metric not in self.METRICS:
+            raise ValueError(f"Неизвестная метрика: {metric}")
+        old_id, new_id = self.resolve_snapshots(tournament, old, new)
+        delta = f"o.{metric} - n.{metric}" if metric == 'rank' else f"n.{metric} - o.{metric}"
+        rows = self.conn.execute(
+            f"SELECT n.username, o.{metric} AS old_value, n.{metric} AS new_value, {delta} AS delta "
+            "FROM entries n JOIN entries o ON o.snapshot_id = ? AND o.username = n.username "
+            "WHERE n.snapshot_id = ? ORDER BY delta DESC LIMIT ?",
+            (old_id, new_id, limit)).fetchall()
+        return [dict(row) for row in rows]
@@ -0,0 +1,145 @@
+from typing import List, Dict
+
+import numpy as np
+
+NUMERIC_COLUMNS = ['followerCount', 'score', 'signalScore', 'noisePoints',
+                   'totalEngagement', 'engagementRate', 'averageEngagementPerPost']
+STATS_COLUMNS = ['rank', 'username'] + NUMERIC_COLUMNS
+# Баллы в отчете показываются с точностью до 2 знаков
+ROUNDED_COLUMNS = ['score', 'signalScore', 'noisePoints']
+# describe() нужен отчету только для подписчиков и балла: квантили - самая дорогая часть прохода
+SUMMARY_COLUMNS = ['followerCount', 'score']
+ENGAGEMENT_COLUMNS = ['totalEngagement', 'engagementRate', 'averageEngagementPerPost']
+# Гистограммы раздела распределений (подписчики - в логарифмической шкале)
+DISTRIBUTION_COLUMNS = ['followerCount', 'score', 'signalScore', 'noisePoints']
+HISTOGRAM_BINS = 50
+
+
+def valid_values(values: np.ndarray) -> np.ndarray:
+    """Значения без NaN (пропуски в CSV)"""
+    if values.dtype.kind == 'f':
+        return values[~np.isnan(values)]
+    return values
+
+
+def distribution_values(name: str, values: np.ndarray) -> np.ndarray:
+    """Значения для гистограммы колонки: log10(x + 1) для подписчиков, остальные как есть"""
+    if name == 'followerCount':
+        return np.log10(values + 1)
+    return values
+
+
+def describe(values: np.ndarray) -> Dict[str, float]:
+    """
+    То же, что pandas describe(): count, mean, std, min, квартили, max.
+    Все квантили берутся одним вызовом np.quantile.
+    """
+    values = valid_values(values)
+    if len(values) == 0:
+        return {'count': 0.0, 'mean': np.nan, 'std': np.nan, 'min': np.nan,
+                '25%': np.nan, '50%': np.nan, '75%': np.nan, 'max': np.nan}
+    quantiles = np.quantile(values, [0.0, 0.25, 0.5, 0.75, 1.0])
+    return {
+        'count': float(len(values)),
+        'mean': float(values.mean()),
+        'std': float(values.std(ddof=1)) if len(values) > 1 else np.nan,
+        'min': float(quantiles[0]),
+        '25%': float(quantiles[1]),
+        '50%': float(quantiles[2]),
+        '75%': float(quantiles[3]),
+        'max': float(quantiles[4]),
+    }
+
+
+def top_k_indices(values: np.ndarray, k: int) -> np.ndarray:
+    """
+    Индексы k наибольших значений по убыванию без полной сортировки.
+    При равенстве значений порядок исходных строк сохраняется, как в nlargest.
+    """
+    if values.dtype.kind == 'f':
+        candidates = np.flatnonzero(~np.isnan(values))
+    else:
+        candidates = np.arange(len(values))
+    candidate_values = values[candidates]
+
+    if k < len(candidates):
+        # Порог k-го значения за O(n), дальше сортируются только кандидаты
+        threshold = np.partition(candidate_values, len(candidates) - k)[len(candidates) - k]
+        keep = candidate_values >= threshold
+        candidates, candidate_values = candidates[keep], candidate_values[keep]
+
+    order = np.argsort(-candidate_values, kind='stable')[:k]
+    top = candidates[order]
+    if len(top) < k and values.dtype.kind == 'f':
+        # Как nlargest: если значений не хватает, добиваем пропусками в исходном порядке
+        top = np.concatenate([top, np.flatnonzero(np.isnan(values))[:k - len(top)]])
+    return top
+
+
+def correlation_matrix(matrix: np.ndarray) -> np.ndarray:
+    """
+    Корреляции Пирсона между строками matrix.
+    Без пропусков - один вызов np.corrcoef, иначе попарно по общим значениям (как pandas corr).
+    """
+    if np.isfinite(matrix).all():
+        with np.errstate(invalid='ignore', divide='ignore'):
+            return np.corrcoef(matrix)
+
+    size = matrix.shape[0]
+    result = np.full((size, size), np.nan)
+    for i in range(size):
+        for j in range(i, size):
+            mask = np.isfinite(matrix[i]) & np.isfinite(matrix[j])
+            if mask.sum() > 1:
+                with np.errstate(invalid='ignore', divide='ignore'):
+                    result[i, j] = result[j, i] = np.corrcoef(matrix[i][mask], matrix[j][mask])[0, 1]
+    return result
+
+
+class LeaderboardStats:
+    """
+    Все сводные показатели отчета за один проход по колонкам таблицы.
+
+    Колонки передаются как NumPy массивы и не изменяются: округленные баллы
+    хранятся в отдельных копиях. Результат считается один раз при создании,
+    поэтому разделы отчета только читают готовые значения.
+    """
+
+    def __init__(self, columns: Dict[str, np.ndarray], top_k: int = 20):
+        self.columns: Dict[str, np.ndarray] = {}
+        for name, values in columns.items():
+            values = np.asarray(values)
+            if name in ROUNDED_COLUMNS:
+                # float32 из Arrow приводим к float64, чтобы баллы печатались так же, как из CSV
+                values = np.round(values.astype(np.float64), 2)
+            self.columns[name] = values
+        self.total = len(self.columns['rank'])
+
+        self.summary = {name: describe(self.columns[name]) for name in SUMMARY_COLUMNS}
+
+        self.top_by_score = top_k_indices(self.columns['score'], top_k)
+        self.top_by_followers = top_k_indices(self.columns['followerCount'], top_k)
+
+        matrix = np.vstack([self.columns[name].astype(np.float64) for name in NUMERIC_COLUMNS])
+        self.correlation_columns = list(NUMERIC_COLUMNS)
+        self.correlation = correlation_matrix(matrix)
+
+        engagement_mask = np.zeros(self.total, dtype=bool)
+        for name in ENGAGEMENT_COLUMNS:
+            engagement_mask |= self.columns[name] > 0
+        self.engagement_count = int(engagement_mask.sum())
+        self.engagement_means = {
+            name: float(self.columns[name][engagement_mask].mean()) if self.engagement_count else np.nan
+            for name in ENGAGEMENT_COLUMNS
+        }
+
+        # (counts, edges) как у plt.hist(values, bins=50)
+        self.histograms = {
+            name: np.histogram(valid_values(distribution_values(name, self.columns[name])), bins=HISTOGRAM_BINS)
+            for name in DISTRIBUTION_COLUMNS
+        }
+
+    def rows(self, indices: np.ndarray, columns: List[str]) -> Dict[str, np.ndarray]:
+        """Выбранные строки только нужных колонок"""
+        return {name: self.columns[name][indices] for name in columns}
+
@@ -0,0 +1,249 @@
+import hashlib
+import json
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, Any, List, Optional
+from urllib.parse import urlparse, parse_qs
+
+
+def make_fake_item(rank: int, last_updated: str) -> Dict[str, Any]:
+    """Создает фейковую запись лидерборда в формате API xeet.ai"""
+    return {
+        'rank': rank,
+        'score': 1000.0 / rank + 0.123456,
+        'signalScore': 700.0 / rank + 0.654321,
+        'noisePoints': 300.0 / rank + 0.111111,
+        'totalEngagement': 0,
+        'engagementRate': 0,
+        'averageEngagementPerPost': 0,
+        'lastUpdated': last_updated,
+        'user': {
+            'username': f'user{rank}',
+            'followerCount': 1000000 // rank,
+            'avatar': f'https://pbs.twimg.com/profile_images/{rank}/avatar_400x400.jpg',
+            'name': f'User {rank}'
+        }
+    }
+
+
+class StubLeaderboardServer:
+    """
+    Локальный HTTP сервер, отдающий фейковые страницы лидерборда.
+    Используется для проверки парсера без обращения к xeet.ai:
+
+        with StubLeaderboardServer(total_records=200) as server:
+            parser = XeetLeaderboardParser("signals", base_url=server.url)
+    """
+
+    def __init__(self, total_records: int = 1000, latency: float = 0.0,
+                 last_updated: str = "2025-08-28T18:28:00.062Z",
+                 host: str = "127.0.0.1", port: int = 0,
+                 error_rate: float = 0.0, throttle_rate: float = 0.0,
+                 retry_after: float = 1.0, max_limit: int = 100,
+                 include_pagination: bool = False, etags: bool = True,
+                 failing_pages: Optional[List[int]] = None):
+        self.total_records = total_records
+        self.latency = latency
+        # Доли запросов, на которые отвечаем 500 и 429 соответственно
+        self.error_rate = error_rate
+        self.throttle_rate = throttle_rate
+        # Страницы, на которые всегда отвечаем 500
+        self.failing_pages = set(failing_pages or [])
+        self.retry_after = retry_after
+        # Максимальный размер страницы и отдавать ли блок pagination в ответе
+        self.max_limit = max_limit
+        self.include_pagination = include_pagination
+        # Отдавать ETag и отвечать 304 на совпавший If-None-Match
+        self.etags = etags
+        self.not_modified_count = 0
+        self.last_updated = last_updated
+        self.request_count = 0
+        self._lock = threading.Lock()
+        self._server = ThreadingHTTPServer((host, port), self._make_handler())
+        self._server.daemon_threads = True
+        self._thread = None
+
+    @property
+    def url(self) -> str:
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}/api/tournaments/stub/leaderboard"
+
+    def make_item(self, rank: int) -> Dict[str, Any]:
+        return make_fake_item(rank, self.last_updated)
+
+    def build_page(self, page: int, limit: int) -> Dict[str, Any]:
+        """Формирует тело ответа для страницы page"""
+        limit = min(limit, self.max_limit)
+        start = (page - 1) * limit + 1
+        end = min(start + limit, self.total_records + 1)
+        items: List[Dict[str, Any]] = [self.make_item(rank) for rank in range(start, end)]
+        response: Dict[str, Any] = {'data': items}
+        if self.include_pagination:
+            response['pagination'] = {
+                'page': page,
+                'limit': limit,
+                'total': self.total_records,
+                'totalPages': -(-self.total_records // limit)
+            }
+        return response
+
+    def _make_handler(self):
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                with stub._lock:
+                    stub.request_count += 1
+                query = parse_qs(urlparse(self.path).query)
+                page = int(query.get('page', ['1'])[0])
+                limit = int(query.get('limit', ['20'])[0])
+
+                if stub.latency:
+                    time.sleep(stub.latency)
+
+                roll = random.random()
+                if roll < stub.throttle_rate:
+                    self.send_response(429)
+                    self.send_header('Retry-After', f'{stub.retry_after:g}')
+                    self.send_header('Content-Length', '0')
+                    self.end_headers()
+                    return
+                if roll < stub.throttle_rate + stub.error_rate or page in stub.failing_pages:
+                    self.send_response(500)
+                    self.send_header('Content-Length', '0')
+                    self.end_headers()
+                    return
+
+                body = json.dumps(stub.build_page(page, limit)).encode('utf-8')
+                if stub.etags:
+                    etag = '"' + hashlib.sha1(body).hexdigest()[:16] + '"'
+                    if self.headers.get('If-None-Match') == etag:
+                        with stub._lock:
+                            stub.not_modified_count += 1
+                        self.send_response(304)
+                        self.send_header('ETag', etag)
+                        self.end_headers()
+                        return
+                self.send_response(200)
+                self.send_header('Content-Type', 'application/json')
+                if stub.etags:
+                    self.send_header('ETag', etag)
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        return Handler
+
+    def start(self):
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, exc_type, exc, tb):
+        self.stop()
+
+
+def record_fixture(parser, path: str, max_pages: Optional[int] = None) -> int:
+    """
+    Сохраняет настоящие ответы API в JSONL фикстуру (одна строка на страницу),
+    чтобы потом воспроизводить их через ReplayLeaderboardServer без сети.
+    Возвращает число сохраненных записей.
+    """
+    pages = parser.total_pages if max_pages is None else min(parser.total_pages, max_pages)
+    total = 0
+    with open(path, 'w', encoding='utf-8') as f:
+        for page, data in parser.iter_pages(range(1, pages + 1)):
+            if not data or not data.get('data'):
+                break
+            f.write(json.dumps({'page': page, 'limit': parser.limit, 'body': data}, ensure_ascii=False) + '\n')
+            total += len(data['data'])
+    return total
+
+
+def load_fixture_items(path: str) -> List[Dict[str, Any]]:
+    """Записи лидерборда из JSONL фикстуры в порядке страниц"""
+    pages = []
+    with open(path, 'r', encoding='utf-8') as f:
+        for line in f:
+            if line.strip():
+                record = json.loads(line)
+                pages.append((record['page'], record['body'].get('data', [])))
+    return [item for _, items in sorted(pages, key=lambda page: page[0]) for item in items]
+
+
+class ReplayLeaderboardServer(StubLeaderboardServer):
+    """
+    Stub сервер, отдающий записанные ответы API (см. record_fixture).
+
+    Записи нарезаются на страницы заново, поэтому работает любой limit.
+    Если total_records больше записанного, записи повторяются по кругу
+    с новыми rank и username - так из одной фикстуры получается лидерборд
+    любого размера. Задержка, 500 и 429 настраиваются как у StubLeaderboardServer.
+    """
+
+    def __init__(self, items: List[Dict[str, Any]], total_records: Optional[int] = None, **kwargs):
+        if not items:
+            raise ValueError("Фикстура не содержит записей")
+        self.items = items
+        kwargs.setdefault('last_updated', items[0].get('lastUpdated', ''))
+        super().__init__(total_records=total_records or len(items), **kwargs)
+
+    @classmethod
+    def from_fixture(cls, path: str, **kwargs) -> 'ReplayLeaderboardServer':
+        return cls(load_fixture_items(path), **kwargs)
+
+    def make_item(self, rank: int) -> Dict[str, Any]:
+        cycle, offset = divmod(rank - 1, len(self.items))
+        item = self.items[offset]
+        if cycle == 0:
+            return item
+        user = dict(item.get('user', {}))
+        user['username'] = f"{user.get('username', '')}_{cycle}"
+        return dict(item, rank=rank, user=user)
+
+
+def main():
+    """Запуск stub сервера из командной строки"""
+    import argparse
+
+    arg_parser = argparse.ArgumentParser(description="Локальный stub сервер лидерборда Xeet")
+    arg_parser.add_argument("--port", type=int, default=8765)
+    arg_parser.add_argument("--records", type=int, default=None,
+                            help="board size (default: 1000, or the fixture size with --fixture)")
+    arg_parser.add_argument("--latency", type=float, default=0.0)
+    arg_parser.add_argument("--error-rate", type=float, default=0.0)
+    arg_parser.add_argument("--throttle-rate", type=float, default=0.0)
+    arg_parser.add_argument("--max-limit", type=int, default=100)
+    arg_parser.add_argument("--pagination", action="store_true")
+    arg_parser.add_argument("--fixture", default=None,
+                            help="replay recorded API responses from this JSONL fixture")
+    args = arg_parser.parse_args()
+
+    options = dict(latency=args.latency, port=args.port,
+                   error_rate=args.error_rate, throttle_rate=args.throttle_rate,
+                   max_limit=args.max_limit, include_pagination=args.pagination)
+    if args.fixture:
+        server = ReplayLeaderboardServer.from_fixture(args.fixture, total_records=args.records, **options)
+    else:
+        server = StubLeaderboardServer(total_records=args.records or 1000, **options)
+    print(f"Stub сервер запущен: {server.url}")
+    try:
+        server._server.serve_forever()
+    except KeyboardInterrupt:
+        server.stop()
+
+
+if __name__ == "__main__":
+    main()
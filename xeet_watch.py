@@ -0,0 +1,278 @@
+import os
+import random
+import shlex
+import subprocess
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Dict, Optional
+
+from xeet_leaderboard_parser import XeetLeaderboardParser
+from xeet_metrics import create_metrics
+from xeet_orchestrator import XeetOrchestrator
+
+ANALYZER_SCRIPT = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'analyze_data.py')
+
+
+class WatchedTournament:
+    """Состояние одного турнира в режиме наблюдения"""
+
+    __slots__ = ('name', 'parser', 'interval', 'next_poll', 'running', 'pending')
+
+    def __init__(self, name: str, parser: XeetLeaderboardParser, interval: float):
+        self.name = name
+        # Парсер живет все время работы демона: его сессия requests и пул соединений
+        # переиспользуются и проверками, и парсингом
+        self.parser = parser
+        self.interval = interval
+        self.next_poll = 0.0
+        # running - идет парсинг; pending - за это время пришел еще один запрос на обновление
+        self.running = False
+        self.pending = False
+
+
+class XeetWatcher(XeetOrchestrator):
+    """
+    Режим демона: периодически опрашивает lastUpdated всех турниров конфига
+    и запускает парсинг (и, по желанию, анализатор), как только дата изменилась.
+
+    Интервал опроса у каждого турнира свой: после изменения он сбрасывается
+    до min_interval, пока данные не меняются - растет в backoff раз до max_interval.
+    Одновременно идет не больше одного парсинга турнира: запросы на обновление,
+    пришедшие во время парсинга, схлопываются в один повторный запуск после него.
+    Пока турнир парсится, его lastUpdated не опрашивается.
+    """
+
+    def __init__(self, config, min_interval: float = 30.0, max_interval: float = 900.0,
+                 backoff: float = 1.5, analyze: bool = False,
+                 analyzer_args: Optional[List[str]] = None,
+                 analyzer_dir: str = "xeet_{tournament}_report", **kwargs):
+        super().__init__(config, **kwargs)
+        self.min_interval = min_interval
+        self.max_interval = max(max_interval, min_interval)
+        self.backoff = backoff
+        self.analyze = analyze
+        self.analyzer_args = ['--headless'] if analyzer_args is None else analyzer_args
+        # Папка отчета турнира: графики у всех турниров называются одинаково
+        self.analyzer_dir = analyzer_dir
+        self.states: Dict[str, WatchedTournament] = {}
+        # RLock: обработчик сигнала выполняется в главном потоке и может прервать его внутри блокировки
+        self._lock = threading.RLock()
+        self._requested = set()
+        self._stop = threading.Event()
+        self._wakeup = threading.Event()
+        # Анализаторы запускаются по одному: каждый сам занимает все ядра отрисовкой графиков
+        self._analyzer_lock = threading.Lock()
+        self._executor: Optional[ThreadPoolExecutor] = None
+
+    def jittered(self, interval: float) -> float:
+        """Интервал со случайным разбросом ±10%, чтобы опросы турниров не совпадали"""
+        return interval * random.uniform(0.9, 1.1)
+
+    def poll(self, state: WatchedTournament):
+        """Один опрос lastUpdated турнира; при изменении запускает парсинг"""
+        parser = state.parser
+        current = parser.get_last_updated_from_api(refresh=True)
+        saved = parser.load_metadata().get('lastUpdated', '')
+
+        if not current:
+            result = 'error'
+            state.interval = min(self.max_interval, state.interval * self.backoff)
+        elif current != saved:
+            result = 'changed'
+            state.interval = self.min_interval
+            print(f"[{state.name}] lastUpdated изменился: {saved or 'нет данных'} -> {current}")
+            # Дата уже запомнена парсером, проверку актуальности повторять не нужно
+            self.trigger(state, force=True)
+        else:
+            result = 'unchanged'
+            state.interval = min(self.max_interval, state.interval * self.backoff)
+
+        parser.metrics.inc('xeet_polls_total', result=result)
+        parser.metrics.event('poll', result=result, last_updated=current, interval=round(state.interval, 1))
+        state.next_poll = time.monotonic() + self.jittered(state.interval)
+
+    def request_update(self, name: Optional[str] = None):
+        """
+        Просит проверить турнир (или все турниры) на ближайшем тике планировщика.
+        Можно вызывать из любого потока и из обработчика сигнала.
+        """
+        with self._lock:
+            self._requested.update([name] if name else self.states)
+        self._wakeup.set()
+
+    def trigger(self, state: WatchedTournament, force: bool = False) -> bool:
+        """
+        Запускает парсинг турнира в пуле потоков.
+        Если парсинг уже идет, запрос схлопывается в один повторный запуск после него.
+        """
+        with self._lock:
+            if state.running:
+                state.pending = True
+                result = 'coalesced'
+            else:
+                state.running = True
+                result = 'started'
+        state.parser.metrics.inc('xeet_triggers_total', result=result)
+        if result == 'started':
+            self._executor.submit(self._update, state, force)
+        return result == 'started'
+
+    def _update(self, state: WatchedTournament, force: bool):
+        """Парсинг турнира с повторными запусками для схлопнутых запросов"""
+        parser = state.parser
+        while True:
+            saved = parser.load_metadata().get('lastUpdated', '')
+            try:
+                parser.run(force=force)
+            except Exception as e:
+                print(f"Ошибка при парсинге турнира {state.name}: {e}")
+            updated = parser.load_metadata().get('lastUpdated', '') != saved
+            if updated and self.analyze:
+                self.run_analyzer(state)
+
+            with self._lock:
+                if not state.pending or self._stop.is_set():
+                    state.running = False
+                    state.pending = False
+                    break
+                state.pending = False
+            # Повторный запуск сам проверит, не устарели ли только что скачанные данные
+            force = False
+
+        # Сразу после парсинга проверяем, не обновился ли лидерборд еще раз
+        state.next_poll = time.monotonic() + self.jittered(self.min_interval)
+        self._wakeup.set()
+
+    def run_analyzer(self, state: WatchedTournament):
+        """
+        Отчет по обновленному CSV в отдельном процессе: демон не держит в памяти
+        pandas и matplotlib, а графики не строятся из рабочих потоков.
+        Анализатор запускается в папке отчета турнира, поэтому графики и их кэш
+        у разных турниров не перезаписывают друг друга.
+        """
+        report_dir = self.analyzer_dir.format(tournament=state.name)
+        os.makedirs(report_dir, exist_ok=True)
+        command = ([sys.executable, ANALYZER_SCRIPT, os.path.abspath(state.parser.csv_file)]
+                   + self.analyzer_args)
+        with self._analyzer_lock:
+            print(f"[{state.name}] Запуск анализатора в {report_dir}: {' '.join(command[1:])}")
+            with state.parser.metrics.phase('analyze'):
+                returncode = subprocess.call(command, cwd=report_dir)
+        if returncode != 0:
+            print(f"[{state.name}] Анализатор завершился с кодом {returncode}")
+
+    def stop(self):
+        """Останавливает планировщик; текущие парсинги доводятся до конца"""
+        self._stop.set()
+        self._wakeup.set()
+
+    def watch(self):
+        """Главный цикл демона. Возвращается после stop()"""
+        if not self.tournaments:
+            print("В конфигурации нет турниров")
+            return
+
+        for name in self.tournaments:
+            parser = self.create_parser(name)
+            # Сессия создается сразу, чтобы проверки шли через общий пул соединений
+            # и HTTP кэш (304 на неизменившийся ответ), а не через разовый urllib запрос
+            parser.session
+            self.states[name] = WatchedTournament(name, parser, self.min_interval)
+
+        print(f"Наблюдение за турнирами: {', '.join(self.states)} "
+              f"(интервал {self.min_interval:g}-{self.max_interval:g} с)")
+
+        self._stop.clear()
+        with ThreadPoolExecutor(max_workers=len(self.states)) as executor:
+            self._executor = executor
+            while not self._stop.is_set():
+                self._wakeup.clear()
+
+                with self._lock:
+                    requested, self._requested = self._requested, set()
+                for name in requested:
+                    if name in self.states:
+                        self.trigger(self.states[name])
+
+                for state in self.states.values():
+                    if self._stop.is_set():
+                        break
+                    if not state.running and state.next_poll <= time.monotonic():
+                        self.poll(state)
+
+                waits = [state.next_poll - time.monotonic()
+                         for state in self.states.values() if not state.running]
+                self._wakeup.wait(max(0.0, min(waits, default=self.max_interval)))
+
+            running = [state.name for state in self.states.values() if state.running]
+            if running:
+                print(f"Остановка: ждем завершения парсинга {', '.join(running)}")
+        self._executor = None
+        for state in self.states.values():
+            state.parser.close()
+        print("Наблюдение остановлено")
+
+
+def main():
+    """Точка входа режима демона"""
+    import argparse
+    import signal
+
+    arg_parser = argparse.ArgumentParser(
+        description="Daemon that polls lastUpdated of Xeet.ai tournaments and scrapes on change")
+    arg_parser.add_argument("--config", default="tournaments.json",
+                            help="JSON file with tournaments (default: tournaments.json)")
+    arg_parser.add_argument("--rate", type=float, default=None,
+                            help="global starting requests per second shared by all tournaments")
+    arg_parser.add_argument("--max-rate", type=float, default=None,
+                            help="global upper bound for adaptive rate ramp-up")
+    arg_parser.add_argument("--only", nargs="+", default=None,
+                            help="watch only these tournaments from the config")
+    arg_parser.add_argument("--min-interval", type=float, default=30.0,
+                            help="poll interval in seconds right after a change (default: 30)")
+    arg_parser.add_argument("--max-interval", type=float, default=900.0,
+                            help="upper bound for the poll interval while nothing changes (default: 900)")
+    arg_parser.add_argument("--backoff", type=float, default=1.5,
+                            help="poll interval multiplier after each unchanged poll (default: 1.5)")
+    arg_parser.add_argument("--analyze", action="store_true",
+                            help="run analyze_data.py on the tournament CSV after each update")
+    arg_parser.add_argument("--analyzer-args", default="--headless",
+                            help="extra analyze_data.py arguments (default: --headless)")
+    arg_parser.add_argument("--analyzer-dir", default="xeet_{tournament}_report",
+                            help="directory the analyzer runs in and writes figures to, "
+                                 "per tournament (default: xeet_{tournament}_report)")
+    arg_parser.add_argument("--quiet", action="store_true",
+                            help="no per-page and per-retry console output")
+    arg_parser.add_argument("--metrics-file", default=None,
+                            help="append request/page/phase events to this JSON lines file")
+    arg_parser.add_argument("--metrics-port", type=int, default=None,
+                            help="serve Prometheus metrics on http://127.0.0.1:PORT/metrics while watching")
+    args = arg_parser.parse_args()
+
+    metrics, metrics_server = create_metrics(args.metrics_file, args.metrics_port)
+    watcher = XeetWatcher.from_file(args.config, min_interval=args.min_interval,
+                                    max_interval=args.max_interval, backoff=args.backoff,
+                                    analyze=args.analyze,
+                                    analyzer_args=shlex.split(args.analyzer_args),
+                                    analyzer_dir=args.analyzer_dir,
+                                    rate=args.rate, max_rate=args.max_rate, only=args.only,
+                                    metrics=metrics, quiet=args.quiet)
+
+    # SIGINT / SIGTERM - мягкая остановка, SIGHUP - внеочередная проверка всех турниров
+    signal.signal(signal.SIGINT, lambda signum, frame: watcher.stop())
+    signal.signal(signal.SIGTERM, lambda signum, frame: watcher.stop())
+    if hasattr(signal, 'SIGHUP'):
+        signal.signal(signal.SIGHUP, lambda signum, frame: watcher.request_update())
+
+    try:
+        watcher.watch()
+    finally:
+        if metrics_server is not None:
+            metrics_server.stop()
+        metrics.close()
+
+
+if __name__ == "__main__":
+    main()